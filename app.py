@@ -9,6 +9,17 @@ import time
 import plotly.graph_objects as go
 from plotly.subplots import make_subplots
 import stock_logic
+import orderbook_recorder
+import market_data
+import data_layer
+import signal_ledger
+import cache_manager
+import trigger_prices
+import trading_calendar
+import risk_matrix
+import warmup
+import screener
+import watchlist
 import pytz 
 
 # 1. --- 基礎設定 ---
@@ -72,22 +83,29 @@ def show_score_rules():
     """)
 
 # 2. --- 狀態管理 ---
-WATCHLIST_FILE = "watchlist.json"
+HOLDINGS_FILE = "holdings.json"
 
-def load_watchlist():
-    if os.path.exists(WATCHLIST_FILE):
-        with open(WATCHLIST_FILE, "r", encoding="utf-8") as f:
+def load_holdings():
+    # {代號: 張數}
+    if os.path.exists(HOLDINGS_FILE):
+        with open(HOLDINGS_FILE, "r", encoding="utf-8") as f:
             return json.load(f)
-    return ["2330", "2408", "2454", "1519"]
+    return {}
 
-def save_watchlist(watchlist):
-    with open(WATCHLIST_FILE, "w", encoding="utf-8") as f:
-        json.dump(watchlist, f)
+def save_holdings(holdings):
+    with open(HOLDINGS_FILE, "w", encoding="utf-8") as f:
+        json.dump(holdings, f)
 
-if 'watchlist' not in st.session_state: st.session_state.watchlist = load_watchlist()
+if 'watchlist' not in st.session_state: st.session_state.watchlist = watchlist.load_watchlist(watchlist.DEFAULT_WATCHLIST)
+if 'holdings' not in st.session_state: st.session_state.holdings = load_holdings()
 if 'current_page' not in st.session_state: st.session_state.current_page = "📊 戰情總覽"
 if 'target_stock' not in st.session_state: st.session_state.target_stock = "2408"
-if 'stock_names' not in st.session_state: st.session_state.stock_names = {}
+
+# 全行程共用的有限快取 (容量上限見 cache_manager.CACHE_BUDGETS)
+stock_names = cache_manager.manager.cache("stock_names")
+
+# 開盤前 / 收盤後自動預熱關注清單 (全行程只啟動一次)
+warmup_worker = warmup.start(API_KEY)
 
 def go_to_analysis(symbol):
     st.session_state.target_stock = symbol
@@ -95,92 +113,21 @@ def go_to_analysis(symbol):
 
 # 3. --- API 功能 ---
 def get_realtime_quote_full(symbol_id):
-    try:
-        url = f"https://api.fugle.tw/marketdata/v1.0/stock/intraday/quote/{symbol_id}"
-        headers = { "X-API-KEY": API_KEY }
-        response = requests.get(url, headers=headers, verify=False)
-        if response.status_code != 200: return None
-        data = response.json()
-        
-        price = data.get("lastTrade", {}).get("price") or data.get("lastTrial", {}).get("price")
-        name = data.get("name", "")
-        if not name: name = symbol_id
-        st.session_state.stock_names[symbol_id] = name 
-
-        order_book = data.get("order", {})
-        bids = order_book.get("bids", []) 
-        asks = order_book.get("asks", []) 
-
-        if price:
-            return {
-                "symbol": symbol_id, "name": name, "price": float(price),
-                "change": data.get("change", 0), "change_percent": data.get("changePercent", 0),
-                "prev_close": data.get("previousClose", 0),
-                "bids": bids, "asks": asks
-            }
-        return None
-    except: return None
-
-@st.cache_data(ttl=300)
+    data = data_layer.get_quote(symbol_id, API_KEY)
+    if data: stock_names.put(symbol_id, data["name"])
+    return data
+
 def get_historical_data(symbol_id):
-    try:
-        today = datetime.date.today().isoformat()
-        start_date = (datetime.date.today() - datetime.timedelta(days=360)).isoformat()
-        fields = "open,high,low,close,volume,turnover,change"
-        url = f"https://api.fugle.tw/marketdata/v1.0/stock/historical/candles/{symbol_id}?from={start_date}&to={today}&fields={fields}"
-        headers = { "X-API-KEY": API_KEY }
-        response = requests.get(url, headers=headers, verify=False)
-        
-        if response.status_code != 200: return None
-        json_data = response.json()
-        if "data" not in json_data or len(json_data["data"]) == 0: return None
-        
-        df = pd.DataFrame(json_data["data"])
-        df["date"] = pd.to_datetime(df["date"])
-        df = df.set_index("date").sort_index()
-        cols = ["open", "high", "low", "close", "volume"]
-        df[cols] = df[cols].astype(float)
-        df.rename(columns={c: c.capitalize() for c in cols}, inplace=True)
-        return df
-    except: return None
+    # 與戰情總覽共用資料層：收盤後 / 休市日直接讀快取
+    return data_layer.get_candles(symbol_id, API_KEY)
 
-# 4. --- 核心運算 ---
-def merge_realtime_data(df, realtime_data):
-    if df is None or realtime_data is None: return df
-    
-    df_merged = df.copy()
-    last_date = df_merged.index[-1]
-    
-    tz = pytz.timezone('Asia/Taipei')
-    today = datetime.datetime.now(tz).date()
-    today_ts = pd.Timestamp(today) 
-    
-    current_price = realtime_data['price']
-    
-    if last_date.date() < today:
-        new_row = pd.DataFrame({
-            "Open": [current_price], 
-            "High": [current_price], 
-            "Low": [current_price], 
-            "Close": [current_price], 
-            "Volume": [0] 
-        }, index=[today_ts])
-        
-        df_merged = pd.concat([df_merged, new_row])
-    
-    target_date = df_merged.index[-1]
-    df_merged.loc[target_date, 'Close'] = current_price
-    
-    if current_price > df_merged.loc[target_date, 'High']:
-        df_merged.loc[target_date, 'High'] = current_price
-        
-    if current_price < df_merged.loc[target_date, 'Low']:
-        df_merged.loc[target_date, 'Low'] = current_price
-            
-    return df_merged
+def get_intraday_data(symbol_id, timeframe):
+    # 盤中分K：共用滾動快取，只補抓新 K 棒
+    return market_data.intraday_cache.get_timeframe(symbol_id, API_KEY, timeframe)
 
+# 4. --- 核心運算 ---
 def resample_timeframe(df, timeframe):
-    if timeframe == '日線':
+    if timeframe == '日線' or timeframe in market_data.INTRADAY_TIMEFRAMES:
         return df
     
     agg_dict = {
@@ -198,10 +145,201 @@ def resample_timeframe(df, timeframe):
     except:
         return df
 
+def analyze_watch_symbol(symbol, threshold):
+    # 與背景預熱、評分 API 共用同一份結果快取 (見 watchlist.analyze_watch_symbol)
+    return watchlist.analyze_watch_symbol(symbol, API_KEY, threshold)
+
 # 5. --- 介面顯示區 ---
 
+@st.fragment
+def watchlist_editor():
+    # 輸入框與多選只重跑這一區；清單真的變動才重跑整頁 (其他股票走結果快取)
+    col1, col2 = st.columns([0.7, 0.3])
+    new_symbol = col1.text_input("新增代號", placeholder="2408", label_visibility="collapsed")
+    if col2.button("➕"):
+        if new_symbol and new_symbol not in st.session_state.watchlist:
+            st.session_state.watchlist.append(new_symbol)
+            watchlist.save_watchlist(st.session_state.watchlist)
+            st.rerun()
+    remove_symbol = st.multiselect("移除股票", st.session_state.watchlist)
+    if st.button("🗑️ 移除"):
+        for s in remove_symbol: st.session_state.watchlist.remove(s)
+        watchlist.save_watchlist(st.session_state.watchlist)
+        st.rerun()
+
+@st.fragment
+def backtest_panel(df_final, bt_threshold):
+    # 出場規則與回測按鈕只重跑這一區，不重抓行情、不重算指標
+    st.subheader("🧪 策略時光機 (歷史回測)")
+    st.caption("驗證過去 60 個交易日，若依照 AI 建議 (分數≥2) 於「隔日開盤」買進的績效。")
+
+    with st.expander("⚙️ 出場規則模擬 (ATR 停損 / 停利 / 持有上限)"):
+        ex_col1, ex_col2, ex_col3, ex_col4 = st.columns(4)
+        atr_mult = ex_col1.number_input("ATR 停損倍數", min_value=0.5, max_value=5.0, value=2.0, step=0.5)
+        trail_mult = ex_col2.number_input("移動停損 (ATR倍數, 0=關閉)", min_value=0.0, max_value=6.0, value=0.0, step=0.5)
+        take_profit = ex_col3.number_input("停利 (%, 0=關閉)", min_value=0.0, max_value=100.0, value=0.0, step=1.0)
+        max_hold = ex_col4.number_input("最長持有 (K棒)", min_value=1, max_value=120, value=20, step=1)
+        st.caption("含手續費 0.1425% (買賣各一次) 與證交稅 0.3%。")
+
+    if st.button("🚀 開始回測驗證"):
+        with st.spinner("正在穿越時空，計算歷史績效..."):
+            # 逐日重放 analyze_strategy 只做一次，報酬統計與出場模擬共用同一組訊號
+            signals = stock_logic.find_signal_days(df_final, days_to_test=60, threshold=bt_threshold)
+            logs = stock_logic.run_backtest(df_final, days_to_test=60, threshold=bt_threshold, signals=signals)
+            if logs:
+                df_bt = pd.DataFrame(logs)
+                st.write(f"📊 過去 60 天內，AI 共發出 **{len(df_bt)}** 次偏多訊號")
+                            
+                valid_trades = df_bt.dropna(subset=['後5日漲幅'])
+                if not valid_trades.empty:
+                    bt = stock_logic.bootstrap_stats(valid_trades['後5日漲幅'])
+                    col_res1, col_res2 = st.columns(2)
+                    col_res1.metric("短線勝率 (5日)", f"{bt['win_rate']:.1f}%")
+                    col_res2.metric("平均報酬 (5日)", f"{bt['mean']:.2f}%")
+                    ci = f"{stock_logic.BOOTSTRAP_CI:.0%}"
+                    col_res1.caption(f"{ci} 區間 {bt['win_lo']:.0f}%–{bt['win_hi']:.0f}%")
+                    col_res2.caption(f"{ci} 區間 {bt['mean_lo']:.2f}%–{bt['mean_hi']:.2f}%")
+                    if bt["low_confidence"]:
+                        st.warning(f"⚠️ 只有 {bt['trades']} 筆完成交易，勝率區間過寬，參考價值有限。")
+                            
+                def highlight_ret(val):
+                    if val is None or pd.isna(val): return ''
+                    color = 'red' if val > 0 else 'green'
+                    return f'color: {color}'
+
+                st.dataframe(df_bt.style.map(highlight_ret, subset=['後5日漲幅', '後10日漲幅', '後20日漲幅']).format("{:.2f}%", subset=['後5日漲幅', '後10日漲幅', '後20日漲幅']), width='stretch')
+
+                df_exit = stock_logic.run_exit_backtest(
+                    df_final, days_to_test=60, threshold=bt_threshold, signals=signals,
+                    atr_mult=atr_mult, trail_mult=trail_mult or None,
+                    take_profit=(take_profit / 100) or None, max_hold=int(max_hold)
+                )
+                if not df_exit.empty:
+                    st.markdown("##### 🛡️ 出場規則模擬結果 (淨報酬)")
+                    closed = df_exit[df_exit['出場原因'] != "持有中"]
+                    ex_res1, ex_res2, ex_res3 = st.columns(3)
+                    if not closed.empty:
+                        ex_res1.metric("勝率", f"{(closed['淨報酬(%)'] > 0).mean() * 100:.1f}%")
+                        ex_res2.metric("平均淨報酬", f"{closed['淨報酬(%)'].mean():.2f}%")
+                    ex_res3.metric("平均持有", f"{df_exit['持有天數'].mean():.1f} 根")
+                    st.dataframe(df_exit.style.map(highlight_ret, subset=['淨報酬(%)']).format("{:.2f}", subset=['買入成本', '出場價']).format("{:.2f}%", subset=['淨報酬(%)']), width='stretch')
+            else:
+                st.warning("過去 60 天內，AI 沒有出現過買進訊號。")
+
+
+def card_html(data):
+    symbol = data["symbol"]
+    name = data["name"]
+    price = data["price"]
+    change = data["change"]
+    pct = data["pct"]
+    signal_text = data["signal"]
+    signal_color = data["color"]
+    win_rate = data["win_rate"]
+    freshness = data["freshness"]
+
+    trades = data.get("trades", 0)
+
+    # 樣本太少時區間很寬，不上紅綠色，只標示筆數
+    if data.get("low_confidence"):
+        win_color = "#888888"
+        win_icon = "⚠️"
+    elif win_rate >= 60: 
+        win_color = "#FF4B4B"
+        win_icon = "🔥"
+    elif win_rate <= 40: 
+        win_color = "#00C853"
+        win_icon = "❄️"
+    else: 
+        win_color = "#888888"
+        win_icon = "⚖️"
+    
+    if not trades: win_text = "尚無交易"
+    elif data.get("low_confidence"): win_text = f"{win_icon} {win_rate:.0f}% (僅{trades}筆)"
+    else: win_text = f"{win_icon} 勝率 {win_rate:.0f}%"
+    win_range = f"{data['win_lo']:.0f}–{data['win_hi']:.0f}% · {trades}筆" if trades else ""
+    price_color = "#FF0000" if change > 0 else "#008000" if change < 0 else "#666666"
+    
+    # 🔥 關鍵修正：移除 HTML 字串的縮排，解決代碼區塊顯示問題
+    html = f"""
+<div style="border:1px solid #444; padding:12px; border-radius:12px; margin-bottom:15px; background-color:#1E1E1E; box-shadow: 2px 2px 5px rgba(0,0,0,0.3);">
+    <div style="font-size:16px; font-weight:bold; color:#FFF; margin-bottom:4px;">
+        {symbol} {name}
+    </div>
+    <div style="display:flex; justify-content:space-between; align-items:center; margin-bottom:8px;">
+        <span style="background-color:{signal_color}; color:white; padding:3px 8px; border-radius:4px; font-size:12px; font-weight:bold;">
+            {signal_text}
+        </span>
+        <span style="color:#AAA; font-size:12px;">
+            {data['score']}分 · {freshness}
+        </span>
+    </div>
+    <div style="font-size:26px; font-weight:bold; color:{price_color}; line-height:1.2;">
+        {price}
+    </div>
+    <div style="font-size:14px; color:{price_color}; margin-bottom:10px;">
+        {change} ({pct}%)
+    </div>
+    <div style="border-top:1px solid #333; padding-top:8px; margin-top:8px; display:flex; justify-content:space-between; align-items:center;">
+        <span style="color:#DDD; font-size:13px;">歷史回測 <span style="color:#777; font-size:11px;">{win_range}</span></span>
+        <span style="color:{win_color}; font-weight:bold; font-size:14px; background-color:rgba(255,255,255,0.1); padding:2px 6px; border-radius:4px;">
+            {win_text}
+        </span>
+    </div>
+</div>
+"""
+    return html.strip()
+
+CARD_SORTS = {"AI總分": "score", "勝率(半年)": "win_rate", "漲跌幅": "pct", "代號": "symbol"}
+
+@st.fragment
+def card_wall(results):
+    # 排序 / 篩選 / 換頁只重跑這一區；整頁卡片組成一個 HTML grid 一次送出
+    st.subheader("🃏 個股詳細卡片")
+    f_col1, f_col2, f_col3, f_col4, f_col5 = st.columns([1.2, 0.8, 2, 1, 1])
+    sort_label = f_col1.selectbox("排序", list(CARD_SORTS), key="card_sort")
+    descending = f_col2.toggle("由大到小", value=True, key="card_desc")
+    signals = sorted({r["signal"] for r in results})
+    sel_signals = f_col3.multiselect("訊號", signals, key="card_signals", placeholder="全部訊號")
+    min_score = f_col4.number_input("最低分數", value=-20, step=1, key="card_min_score")
+    min_win = f_col5.number_input("最低勝率(%)", min_value=0, max_value=100, value=0, step=5, key="card_min_win")
+
+    df_cards = pd.DataFrame(results)
+    mask = (df_cards["score"] >= min_score) & (df_cards["win_rate"] >= min_win)
+    if sel_signals: mask &= df_cards["signal"].isin(sel_signals)
+    df_cards = df_cards[mask].sort_values(CARD_SORTS[sort_label], ascending=not descending, kind="stable")
+
+    if df_cards.empty:
+        st.info("沒有符合條件的股票")
+        return
+
+    p_col1, p_col2, p_col3 = st.columns([1, 1, 3])
+    page_size = p_col1.selectbox("每頁", [12, 24, 48, 96], key="card_page_size")
+    total_pages = max(1, -(-len(df_cards) // page_size))
+    if st.session_state.get("card_page", 1) > total_pages: st.session_state.card_page = total_pages
+    page_no = p_col2.number_input(f"頁次 (共 {total_pages} 頁)", min_value=1, max_value=total_pages, step=1, key="card_page")
+    visible = df_cards.iloc[(page_no - 1) * page_size: page_no * page_size]
+    p_col3.caption(f"符合 {len(df_cards)} / {len(results)} 檔，顯示第 {(page_no - 1) * page_size + 1}–{(page_no - 1) * page_size + len(visible)} 檔")
+
+    cards = "".join(card_html(data) for data in visible.to_dict("records"))
+    st.markdown(f'<div style="display:grid; grid-template-columns:repeat(auto-fill, minmax(240px, 1fr)); gap:0 15px;">{cards}</div>', unsafe_allow_html=True)
+
+    d_col1, d_col2 = st.columns([3, 1])
+    names = dict(zip(visible["symbol"], visible["name"]))
+    detail = d_col1.selectbox("查看個股", list(names), format_func=lambda s: f"{s} {names[s]}", key="card_detail", label_visibility="collapsed")
+    if d_col2.button("🔍 詳細診斷", on_click=go_to_analysis, args=(detail,)):
+        st.rerun()
+
+@st.fragment(run_every=3)
+def overview_live_refresh():
+    # 只比對資料版本，有新資料落地才重跑整頁
+    seen = st.session_state.get("overview_versions", {})
+    if any(data_layer.data_version(s) != v for s, v in seen.items()):
+        st.rerun()
+
 st.sidebar.title("🎛️ 戰情控制台")
-page = st.sidebar.radio("選擇模式", ["📊 戰情總覽", "🔍 個股深度診斷"], key="current_page")
+st.sidebar.caption(f"🕘 台股{trading_calendar.market_state()} · {trading_calendar.now():%m-%d %H:%M}")
+page = st.sidebar.radio("選擇模式", ["📊 戰情總覽", "🔍 個股深度診斷", "⚖️ 持股風險", "🧮 選股篩選"], key="current_page")
 
 # 🔥 新增：回測嚴格度拉桿
 st.sidebar.markdown("---")
@@ -216,18 +354,37 @@ bt_threshold = st.sidebar.slider(
 st.sidebar.markdown("---")
 st.sidebar.subheader("📝 關注清單")
 
-col1, col2 = st.sidebar.columns([0.7, 0.3])
-new_symbol = col1.text_input("新增代號", placeholder="2408", label_visibility="collapsed")
-if col2.button("➕"):
-    if new_symbol and new_symbol not in st.session_state.watchlist:
-        st.session_state.watchlist.append(new_symbol)
-        save_watchlist(st.session_state.watchlist)
-        st.rerun()
-remove_symbol = st.sidebar.multiselect("移除股票", st.session_state.watchlist)
-if st.sidebar.button("🗑️ 移除"):
-    for s in remove_symbol: st.session_state.watchlist.remove(s)
-    save_watchlist(st.session_state.watchlist)
-    st.rerun()
+with st.sidebar:
+    watchlist_editor()
+
+@st.fragment
+def cache_stats_panel():
+    df_cache = cache_manager.manager.stats_frame()
+    total_mb = df_cache["MB"].sum()
+    with st.expander(f"🧠 快取狀態 ({total_mb:.1f} MB)"):
+        st.button("🔄 更新統計", key="refresh_cache_stats")
+        df_show = df_cache[["name", "entries", "MB", "上限MB", "hit_rate", "evictions"]].rename(
+            columns={"name": "快取", "entries": "筆數", "hit_rate": "命中率", "evictions": "淘汰"})
+        st.dataframe(df_show.style.format({"MB": "{:.1f}", "上限MB": "{:.0f}", "命中率": "{:.0f}%"}, na_rep="-"), hide_index=True, width='stretch')
+
+@st.fragment(run_every=5)
+def warmup_status_panel():
+    status = warmup_worker.status
+    if status["state"] == "running":
+        total = max(status["total"], 1)
+        st.progress(status["done"] / total, text=f"🔥 預熱中 ({status['phase']})：{status['step']} {status['done']}/{status['total']}")
+    elif status["finished_at"] is not None:
+        msg = f"🔥 上次預熱 {status['finished_at']:%m-%d %H:%M} ({status['phase']})，{status['total']} 檔 {status['duration']:.1f}s"
+        if status["errors"]: msg += f"，失敗：{', '.join(status['errors'])}"
+        st.caption(msg)
+    if status["next_run"] is not None:
+        st.caption(f"⏰ 下次預熱 {status['next_run']:%m-%d %H:%M} ({status['next_label']})")
+    st.button("🔥 立即預熱", key="warmup_now", on_click=warmup_worker.run_now, disabled=status["state"] == "running")
+
+with st.sidebar:
+    st.markdown("---")
+    warmup_status_panel()
+    cache_stats_panel()
 
 st.sidebar.markdown("---")
 if st.sidebar.button("❓ 評分標準說明"):
@@ -237,76 +394,25 @@ if page == "📊 戰情總覽":
     st.title("📊 多檔股票戰情總覽")
     if not st.session_state.watchlist: st.info("清單是空的")
     else:
-        # 1. 批次資料處理
-        progress_bar = st.progress(0, text="正在啟動戰情掃描雷達...")
-        results_cache = [] 
-        total_stocks = len(st.session_state.watchlist)
-        
-        for i, symbol in enumerate(st.session_state.watchlist):
-            # 更新進度條
-            percent = int(((i) / total_stocks) * 100)
-            progress_bar.progress(percent, text=f"正在分析 {symbol} ({i+1}/{total_stocks})...")
-            
-            time.sleep(0.5) 
-            
-            real_data = get_realtime_quote_full(symbol)
-            stock_result = {
-                "symbol": symbol,
-                "name": symbol,
-                "price": 0.0,
-                "change": 0.0,
-                "pct": 0.0,
-                "score": 0,
-                "signal": "資料不足",
-                "color": "#888",
-                "stop_loss": None,
-                "raw_real": None,
-                "win_rate": 0.0
-            }
-            
-            if real_data:
-                stock_result["name"] = real_data['name']
-                stock_result["price"] = real_data['price']
-                stock_result["change"] = real_data['change']
-                stock_result["pct"] = real_data['change_percent']
-                stock_result["raw_real"] = real_data
-                
-                hist_data = get_historical_data(symbol)
-                if hist_data is not None:
-                    try:
-                        df_merged = merge_realtime_data(hist_data, real_data)
-                        df_final = stock_logic.calculate_indicators(df_merged, symbol)
-                        logic_res = stock_logic.analyze_strategy(df_final)
-                        
-                        stock_result["score"] = logic_res["score"]
-                        stock_result["signal"] = logic_res["decision"]
-                        stock_result["color"] = logic_res["color"]
-                        stock_result["stop_loss"] = logic_res["stop_loss"]
-
-                        # --- 🔥 回測運算 ---
-                        bt_logs = stock_logic.run_backtest(df_final, days_to_test=180, threshold=bt_threshold)
-                        valid_trades = [log for log in bt_logs if log['後5日漲幅'] is not None]
-                        
-                        if valid_trades:
-                            win_count = sum(1 for log in valid_trades if log['後5日漲幅'] > 0)
-                            win_rate = (win_count / len(valid_trades)) * 100
-                            stock_result["win_rate"] = win_rate
-                        else:
-                            stock_result["win_rate"] = 0.0
-
-                    except Exception as e:
-                        print(f"Error analyzing {symbol}: {e}")
-            
-            results_cache.append(stock_result)
+        # 1. 批次資料處理 (先回傳上一份資料，過期的在背景更新；資料版本沒變就直接用上次結果)
+        data_layer.prefetch(st.session_state.watchlist, API_KEY)
+        results_cache = [analyze_watch_symbol(symbol, bt_threshold) for symbol in st.session_state.watchlist]
+        seen_versions = {r["symbol"]: r["version"] for r in results_cache}
 
-        progress_bar.empty()
+        # 背景更新完成後自動重繪
+        st.session_state.overview_versions = seen_versions
+        overview_live_refresh()
 
         # 2. 顯示戰情總表
         st.subheader("📋 全域戰情排行榜")
         if results_cache:
             df_summary = pd.DataFrame(results_cache)
-            display_df = df_summary[["symbol", "name", "price", "pct", "score", "signal", "win_rate"]].copy()
-            display_df.columns = ["代號", "名稱", "現價", "漲跌幅(%)", "AI總分", "訊號", "勝率(半年)"]
+            df_summary["win_range"] = [
+                f"{r['win_lo']:.0f}–{r['win_hi']:.0f}%{' ⚠️' if r['low_confidence'] else ''}" if r["trades"] else "-"
+                for r in results_cache
+            ]
+            display_df = df_summary[["symbol", "name", "price", "pct", "score", "signal", "win_rate", "win_range", "trades", "freshness"]].copy()
+            display_df.columns = ["代號", "名稱", "現價", "漲跌幅(%)", "AI總分", "訊號", "勝率(半年)", "勝率區間", "交易數", "資料狀態"]
             
             st.dataframe(
                 display_df.style.background_gradient(subset=["AI總分"], cmap="RdYlGn"), 
@@ -317,70 +423,14 @@ if page == "📊 戰情總覽":
                     "漲跌幅(%)": st.column_config.NumberColumn(format="%.2f%%"),
                     "AI總分": st.column_config.NumberColumn(help="越高分越好"),
                     "勝率(半年)": st.column_config.NumberColumn(format="%.1f%%"),
+                    "勝率區間": st.column_config.TextColumn(help=f"Wilson {stock_logic.BOOTSTRAP_CI:.0%} 信賴區間；⚠️ 表示交易筆數太少、區間過寬"),
                 }
             )
 
         st.divider()
 
-        # 3. 顯示卡片牆
-        st.subheader("🃏 個股詳細卡片")
-        cols = st.columns(4)
-        
-        for i, data in enumerate(results_cache):
-            with cols[i % 4]:
-                symbol = data["symbol"]
-                name = data["name"]
-                price = data["price"]
-                change = data["change"]
-                pct = data["pct"]
-                signal_text = data["signal"]
-                signal_color = data["color"]
-                win_rate = data["win_rate"]
-
-                if win_rate >= 60: 
-                    win_color = "#FF4B4B"
-                    win_icon = "🔥"
-                elif win_rate <= 40: 
-                    win_color = "#00C853"
-                    win_icon = "❄️"
-                else: 
-                    win_color = "#888888"
-                    win_icon = "⚖️"
-                
-                win_text = "尚無交易" if win_rate == 0 else f"{win_icon} 勝率 {win_rate:.0f}%"
-                price_color = "#FF0000" if change > 0 else "#008000" if change < 0 else "#666666"
-                
-                # 🔥 關鍵修正：移除 HTML 字串的縮排，解決代碼區塊顯示問題
-                card_html = f"""
-<div style="border:1px solid #444; padding:12px; border-radius:12px; margin-bottom:15px; background-color:#1E1E1E; box-shadow: 2px 2px 5px rgba(0,0,0,0.3);">
-    <div style="font-size:16px; font-weight:bold; color:#FFF; margin-bottom:4px;">
-        {symbol} {name}
-    </div>
-    <div style="display:flex; justify-content:space-between; align-items:center; margin-bottom:8px;">
-        <span style="background-color:{signal_color}; color:white; padding:3px 8px; border-radius:4px; font-size:12px; font-weight:bold;">
-            {signal_text}
-        </span>
-        <span style="color:#AAA; font-size:12px;">
-            {data['score']}分
-        </span>
-    </div>
-    <div style="font-size:26px; font-weight:bold; color:{price_color}; line-height:1.2;">
-        {price}
-    </div>
-    <div style="font-size:14px; color:{price_color}; margin-bottom:10px;">
-        {change} ({pct}%)
-    </div>
-    <div style="border-top:1px solid #333; padding-top:8px; margin-top:8px; display:flex; justify-content:space-between; align-items:center;">
-        <span style="color:#DDD; font-size:13px;">歷史回測</span>
-        <span style="color:{win_color}; font-weight:bold; font-size:14px; background-color:rgba(255,255,255,0.1); padding:2px 6px; border-radius:4px;">
-            {win_text}
-        </span>
-    </div>
-</div>
-"""
-                st.markdown(card_html, unsafe_allow_html=True)
-                
-                st.button(f"🔍 詳細 {name}", key=f"btn_{symbol}", on_click=go_to_analysis, args=(symbol,))
+        # 3. 顯示卡片牆 (分頁，只產生目前頁面的卡片)
+        card_wall(results_cache)
 
 
 elif page == "🔍 個股深度診斷":
@@ -389,24 +439,31 @@ elif page == "🔍 個股深度診斷":
     except: idx = 0
     
     col1, col2 = st.columns([1, 1])
-    def fmt(s): return f"{s} {st.session_state.stock_names.get(s,'')}"
+    def fmt(s): return f"{s} {stock_names.get(s, '', count=False)}"
     sel = col1.selectbox("從清單選擇", st.session_state.watchlist, index=idx, format_func=fmt)
     man = col2.text_input("或輸入代號")
     target = man if man else sel
     
     if target:
         st.session_state.target_stock = target
-        timeframe = st.radio("⏳ 選擇K線週期", ["日線", "週線", "月線"], index=0, horizontal=True)
+        timeframe = st.radio("⏳ 選擇K線週期", ["日線", "週線", "月線"] + list(market_data.INTRADAY_TIMEFRAMES), index=0, horizontal=True)
+        is_intraday = timeframe in market_data.INTRADAY_TIMEFRAMES
         
         with st.spinner(f'正在分析：{target} ({timeframe})...'):
-            df_h = get_historical_data(target)
             real = get_realtime_quote_full(target)
+            if is_intraday:
+                df_src = get_intraday_data(target, timeframe)
+            else:
+                df_h = get_historical_data(target)
+                df_src = stock_logic.merge_realtime_data(df_h, real)
             
-            if df_h is not None:
-                df_merged = merge_realtime_data(df_h, real)
-                df_resampled = resample_timeframe(df_merged, timeframe)
+            if df_src is not None and len(df_src) < 3:
+                st.warning(f"{timeframe} K 棒數量不足，請稍後再試。")
+            elif df_src is not None:
+                df_resampled = resample_timeframe(df_src, timeframe)
                 
-                df_final = stock_logic.calculate_indicators(df_resampled, target)
+                # 分K 無對應的日頻籌碼資料，只算技術指標
+                df_final = stock_logic.calculate_indicators(df_resampled, None if is_intraday else target)
                 result = stock_logic.analyze_strategy(df_final, timeframe)
                 
                 curr = df_final.iloc[-1]
@@ -481,7 +538,23 @@ elif page == "🔍 個股深度診斷":
                             else:
                                 st.markdown(r)
 
-                        if not reports: st.write("目前技術面呈現盤整。")    
+                        if not reports: st.write("目前技術面呈現盤整。")
+
+                    if timeframe == "日線":
+                        triggers = trigger_prices.TriggerTable.from_frame(df_final)
+                        if triggers.rows:
+                            with st.expander("🎯 今日關鍵價位 (價格型訊號翻轉點)"):
+                                df_trig = triggers.to_frame(curr['Close'])[["price", "rule", "above", "below", "distance"]]
+                                df_trig.columns = ["價位", "規則", "高於時", "低於時", "距現價(%)"]
+                                st.dataframe(df_trig.iloc[::-1].fillna("-").style.format({"價位": "{:.2f}", "距現價(%)": "{:+.2f}%"}), hide_index=True, width='stretch')
+                                st.caption("以昨日收盤前的資料解出；KD、ADX、量能與籌碼規則不在此表。")
+
+                        fired = signal_ledger.ledger.last_fired(target)
+                        if fired:
+                            with st.expander("🗂️ 訊號帳本 (各規則最後觸發日)"):
+                                df_fired = pd.DataFrame(sorted(fired.items(), key=lambda x: x[1], reverse=True), columns=["規則", "最後觸發"])
+                                df_fired["最後觸發"] = df_fired["最後觸發"].dt.strftime('%Y-%m-%d')
+                                st.dataframe(df_fired, hide_index=True, width='stretch')
 
                 with order_col:
                     st.markdown("##### ⚡ 五檔掛單")
@@ -493,12 +566,18 @@ elif page == "🔍 個股深度診斷":
                             st.markdown(f"<div style='display:flex; justify-content:space-between; color:#FF0000;'><span>買 {bid['price']}</span> <span>{bid['volume']} 張</span></div>", unsafe_allow_html=True)
                     else: st.caption("盤後或無掛單資料")
 
+                    imbalance = orderbook_recorder.recorder.imbalance_series(target)
+                    if len(imbalance) >= 2:
+                        st.markdown("##### ⚖️ 五檔買賣力道", help="**委買/委賣失衡度**\n\n(委買張數 - 委賣張數) / 五檔總張數\n* **> 0**：買盤掛單較厚\n* **< 0**：賣壓較重")
+                        st.line_chart(imbalance, height=180)
+                        st.caption(f"盤中取樣 {len(imbalance)} 筆，最新 {imbalance.iloc[-1]:+.2f}")
+
                 st.subheader(f"📈 {timeframe} 技術圖表")
                 tab1, tab2 = st.tabs(["主圖 (K線+籌碼+融資)", "副圖 (MACD & KD)"])
                 
                 with tab1:
                     df_plot = df_final.tail(150).copy()
-                    df_plot['DateStr'] = df_plot.index.strftime('%Y-%m-%d')
+                    df_plot['DateStr'] = df_plot.index.strftime('%m-%d %H:%M' if is_intraday else '%Y-%m-%d')
                     df_plot['Color'] = df_plot.apply(lambda x: '#FF0000' if x['Close'] >= x['Open'] else '#008000', axis=1)
 
                     fig = make_subplots(
@@ -567,31 +646,133 @@ elif page == "🔍 個股深度診斷":
                         st.bar_chart(macd_plot[['多方', '空方']], color=["#FF0000", "#008000"])
 
                 st.markdown("---")
-                st.subheader("🧪 策略時光機 (歷史回測)")
-                st.caption("驗證過去 60 個交易日，若依照 AI 建議 (分數≥2) 於「隔日開盤」買進的績效。")
-
-                if st.button("🚀 開始回測驗證"):
-                    with st.spinner("正在穿越時空，計算歷史績效..."):
-                        logs = stock_logic.run_backtest(df_final, days_to_test=60, threshold=bt_threshold)
-                        if logs:
-                            df_bt = pd.DataFrame(logs)
-                            st.write(f"📊 過去 60 天內，AI 共發出 **{len(df_bt)}** 次偏多訊號")
-                            
-                            valid_trades = df_bt.dropna(subset=['後5日漲幅'])
-                            if not valid_trades.empty:
-                                win_count = len(valid_trades[valid_trades['後5日漲幅'] > 0])
-                                win_rate = (win_count / len(valid_trades)) * 100
-                                avg_return = valid_trades['後5日漲幅'].mean()
-                                col_res1, col_res2 = st.columns(2)
-                                col_res1.metric("短線勝率 (5日)", f"{win_rate:.1f}%")
-                                col_res2.metric("平均報酬 (5日)", f"{avg_return:.2f}%")
-                            
-                            def highlight_ret(val):
-                                if val is None or pd.isna(val): return ''
-                                color = 'red' if val > 0 else 'green'
-                                return f'color: {color}'
-
-                            st.dataframe(df_bt.style.map(highlight_ret, subset=['後5日漲幅', '後10日漲幅', '後20日漲幅']).format("{:.2f}%", subset=['後5日漲幅', '後10日漲幅', '後20日漲幅']), width='stretch')
-                        else:
-                            st.warning("過去 60 天內，AI 沒有出現過買進訊號。")
-            else: st.error("查無資料")
\ No newline at end of file
+                backtest_panel(df_final, bt_threshold)
+            else: st.error("查無資料")
+elif page == "⚖️ 持股風險":
+    st.title("⚖️ 持股風險矩陣")
+    st.caption(f"以最近 {risk_matrix.RISK_WINDOW} 個交易日的日報酬計算相關係數，每根新收盤 K 棒增量更新。")
+
+    with st.expander("📝 編輯持股 (張)", expanded=not st.session_state.holdings):
+        df_hold = pd.DataFrame(list(st.session_state.holdings.items()), columns=["代號", "張數"])
+        edited = st.data_editor(
+            df_hold, num_rows="dynamic", hide_index=True, width='stretch',
+            column_config={"代號": st.column_config.TextColumn(required=True),
+                           "張數": st.column_config.NumberColumn(min_value=0, step=1, required=True)}
+        )
+        if st.button("💾 儲存持股"):
+            holdings = {str(r["代號"]).strip(): float(r["張數"]) for r in edited.to_dict("records")
+                        if pd.notna(r["代號"]) and str(r["代號"]).strip() and pd.notna(r["張數"]) and r["張數"] > 0}
+            st.session_state.holdings = holdings
+            save_holdings(holdings)
+            st.rerun()
+
+    holdings = st.session_state.holdings
+    universe = list(dict.fromkeys(st.session_state.watchlist + list(holdings)))
+    data_layer.prefetch(universe, API_KEY)
+    state = risk_matrix.tracker.update({s: get_historical_data(s) for s in universe})
+    if risk_matrix.tracker.stale:
+        st.warning("⚠️ 日K 長期未更新 (停牌 / 下市?)，之後的日期以缺資料計入相關係數：" +
+                   "、".join(f"{s} (最後 {d:%Y-%m-%d})" for s, d in risk_matrix.tracker.stale.items()))
+
+    if holdings:
+        quotes = {s: analyze_watch_symbol(s, bt_threshold) for s in holdings}
+        df_pos, totals = risk_matrix.portfolio_risk(holdings, quotes, state)
+
+        r_col1, r_col2, r_col3, r_col4 = st.columns(4)
+        mv = totals["market_value"]
+        r_col1.metric("總市值", f"{mv:,.0f}")
+        r_col2.metric("停損總風險", f"{totals['stop_risk']:,.0f}", f"{totals['stop_risk'] / mv * 100:.1f}% 市值" if mv else None, delta_color="off")
+        r_col3.metric("ATR 風險 (相關性調整)", f"{totals['atr_risk']:,.0f}", f"簡單加總 {totals['atr_risk_sum']:,.0f}", delta_color="off")
+        r_col4.metric("單日 95% 風險值", f"{totals['var_95']:,.0f}" if totals["var_95"] is not None else "-")
+
+        df_pos.insert(1, "名稱", [quotes[s]["name"] for s in df_pos["代號"]])
+        df_pos["佔比(%)"] = df_pos["市值"] / mv * 100 if mv else 0.0
+        st.dataframe(
+            df_pos.style.format({"現價": "{:.2f}", "市值": "{:,.0f}", "ATR": "{:.2f}", "ATR風險": "{:,.0f}",
+                                 "停損價": "{:.2f}", "停損風險": "{:,.0f}", "佔比(%)": "{:.1f}"}, na_rep="-"),
+            hide_index=True, width='stretch'
+        )
+
+        if state is not None and len(holdings) > 1:
+            df_corr = state.corr_frame()
+            held = [s for s in holdings if s in df_corr.index]
+            if len(held) > 1:
+                sub = df_corr.loc[held, held]
+                fig = go.Figure(go.Heatmap(z=sub.values, x=held, y=held, zmin=-1, zmax=1, colorscale="RdBu_r",
+                                           text=sub.round(2).values, texttemplate="%{text}"))
+                fig.update_layout(height=120 + 40 * len(held), margin=dict(l=20, r=20, t=30, b=20), title="持股相關係數")
+                st.plotly_chart(fig, width='stretch')
+    else:
+        st.info("尚未設定持股，先在上方輸入代號與張數。")
+
+    st.subheader("🔗 關注清單高相關組合")
+    if state is None: st.info("尚無日K資料")
+    else:
+        st.caption(f"共 {len(state.symbols)} 檔，資料至 {state.last_date:%Y-%m-%d}" if state.last_date is not None else f"共 {len(state.symbols)} 檔")
+        st.dataframe(risk_matrix.tracker.top_pairs(20).style.format({"相關係數": "{:.2f}"}), hide_index=True, width='stretch')
+
+elif page == "🧮 選股篩選":
+    st.title("🧮 全市場選股篩選")
+    df_all = screener.snapshot.frame()
+    if df_all is None:
+        st.info("尚無選股快照。關注清單會在預熱 / 開頁時自動寫入；全市場請執行 `python screener.py --build`。")
+    else:
+        st.caption(f"快照共 {len(df_all)} 檔，最新資料日 {df_all['date'].max():%Y-%m-%d}")
+        screens = screener.load_screens()
+
+        s_col1, s_col2 = st.columns([1, 3])
+        screen_name = s_col1.selectbox("已存條件", ["(自訂)"] + list(screens), key="screen_name")
+        if screen_name != "(自訂)" and st.session_state.get("screen_loaded") != screen_name:
+            st.session_state.screen_expr = screens[screen_name]
+            st.session_state.screen_loaded = screen_name
+        expr = s_col2.text_input("篩選條件", key="screen_expr", placeholder="K < 20 and 投信連三買 and 位階 < 20")
+
+        with st.expander("📖 可用欄位"):
+            st.markdown("語法：`and` / `or` / `not`、`<` `>` `==`，欄位可直接用中文別名或規則名稱。")
+            st.markdown("**數值別名**：" + "、".join(f"`{a}`" for a in screener.NUMERIC_ALIASES))
+            st.markdown("**條件別名**：" + "、".join(f"`{a}` ({e})" for a, e in screener.CONDITION_ALIASES.items()))
+            st.markdown("**評分規則 (今日觸發)**：" + "、".join(f"`{r}`" for r in screener.SCORE_RULES))
+            st.markdown("**原始指標**：" + "、".join(f"`{c}`" for c in screener.NUMERIC_COLUMNS))
+
+        o_col1, o_col2, o_col3 = st.columns([1, 1, 1])
+        sort_label = o_col1.selectbox("排序", list(screener.NUMERIC_ALIASES), index=list(screener.NUMERIC_ALIASES).index("分數"), key="screen_sort")
+        ascending = o_col2.toggle("由小到大", value=False, key="screen_asc")
+        limit = o_col3.number_input("最多顯示", min_value=10, max_value=2000, value=100, step=10, key="screen_limit")
+
+        try:
+            hits, total, elapsed_ms = screener.snapshot.query(expr or "", screener.NUMERIC_ALIASES[sort_label], ascending, int(limit))
+        except ValueError as e:
+            st.error(str(e))
+            hits, total, elapsed_ms = None, 0, 0.0
+
+        if hits is not None:
+            st.caption(f"符合 {total} 檔 (顯示 {len(hits)} 檔)，查詢 {elapsed_ms:.1f} ms")
+            view = hits.reset_index()[["symbol", "name", "date", "收盤", "漲跌幅", "分數", "decision", "K", "位階", "量比", "投信買超", "rules"]]
+            view["rules"] = view["rules"].apply("、".join)
+            view.columns = ["代號", "名稱", "資料日", "收盤", "漲跌幅(%)", "AI總分", "訊號", "K", "位階", "量比", "投信買超", "觸發規則"]
+            st.dataframe(
+                view.style.format({"收盤": "{:.2f}", "漲跌幅(%)": "{:.2f}", "K": "{:.0f}", "位階": "{:.0f}", "量比": "{:.1f}", "投信買超": "{:.0f}"}, na_rep="-"),
+                hide_index=True, width='stretch',
+                column_config={"資料日": st.column_config.DateColumn(format="MM-DD")}
+            )
+
+            a_col1, a_col2 = st.columns([3, 1])
+            new_hits = [sym for sym in hits.index if sym not in st.session_state.watchlist]
+            picked = a_col1.multiselect("加入關注清單", new_hits, default=new_hits[:10], key="screen_pick")
+            if a_col2.button("➕ 加入關注", disabled=not picked):
+                st.session_state.watchlist.extend(picked)
+                watchlist.save_watchlist(st.session_state.watchlist)
+                st.success(f"已加入 {len(picked)} 檔")
+
+        with st.expander("💾 儲存 / 刪除條件"):
+            sv_col1, sv_col2, sv_col3 = st.columns([2, 1, 1])
+            save_name = sv_col1.text_input("條件名稱", value="" if screen_name == "(自訂)" else screen_name, key="screen_save_name")
+            if sv_col2.button("💾 儲存", disabled=not (save_name and expr)):
+                screens[save_name] = expr
+                screener.save_screens(screens)
+                st.success(f"已儲存「{save_name}」")
+            if sv_col3.button("🗑️ 刪除", disabled=screen_name == "(自訂)"):
+                screens.pop(screen_name, None)
+                screener.save_screens(screens)
+                st.session_state.pop("screen_loaded", None)
+                st.rerun()
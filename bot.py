@@ -6,6 +6,7 @@ import urllib3
 import json
 import time
 import stock_logic # 🔥 匯入共用邏輯
+import trading_calendar
 
 # 嘗試匯入 streamlit 來讀取 secrets
 try:
@@ -105,6 +106,10 @@ def analyze_stock_for_bot(symbol, df):
 
 # --- 5. 主程式 ---
 if __name__ == "__main__":
+    if not trading_calendar.is_trading_day(trading_calendar.now()):
+        print("💤 今日休市，不執行掃描。")
+        exit()
+
     print("🚀 開始執行 AI 股市掃描 (模組化版)...")
     message_buffer = []
 
@@ -0,0 +1,152 @@
+import sys
+import time
+import threading
+from collections import OrderedDict
+import numpy as np
+import pandas as pd
+
+# --- 🔥 統一快取管理 (容量上限 + LRU 淘汰 + 命中統計) ---
+# 每個快取有自己的記憶體預算與筆數上限，超過時從最久沒用到的開始淘汰。
+# 全行程共用，側邊欄可看到各快取的用量與命中率。
+MB = 1024 * 1024
+
+# name -> (記憶體上限 bytes, 筆數上限, ttl 秒 / None)
+CACHE_BUDGETS = {
+    "quotes":      (8 * MB, 3000, None),
+    "swr_quote":   (8 * MB, 3000, None),
+    "swr_candles": (96 * MB, 800, None),
+    "swr_chips":   (96 * MB, 800, None),
+    "indicators":  (192 * MB, 300, None),
+    "live_bars":   (96 * MB, 800, None),
+    "stock_names": (1 * MB, 5000, None),
+}
+DEFAULT_BUDGET = (32 * MB, 500, None)
+
+
+def estimate_size(obj):
+    """估算物件佔用的記憶體 (DataFrame / ndarray 以實際資料大小計)。"""
+    if obj is None: return 0
+    if isinstance(obj, pd.DataFrame): return int(obj.memory_usage(deep=True).sum())
+    if isinstance(obj, pd.Series): return int(obj.memory_usage(deep=True))
+    if isinstance(obj, np.ndarray): return obj.nbytes
+    if isinstance(obj, dict): return sys.getsizeof(obj) + sum(estimate_size(k) + estimate_size(v) for k, v in obj.items())
+    if isinstance(obj, (list, tuple, set)): return sys.getsizeof(obj) + sum(estimate_size(v) for v in obj)
+    return sys.getsizeof(obj)
+
+_MISSING = object()
+
+
+class BoundedCache:
+    def __init__(self, name, max_bytes, max_entries, ttl=None, sizeof=estimate_size):
+        self.name = name
+        self.max_bytes = max_bytes
+        self.max_entries = max_entries
+        self.ttl = ttl
+        self.sizeof = sizeof
+        self._data = OrderedDict()   # key -> (value, size, stored_at)
+        self._bytes = 0
+        self._lock = threading.Lock()
+        self.stats = {"hits": 0, "misses": 0, "evictions": 0, "expired": 0}
+
+    def __len__(self):
+        return len(self._data)
+
+    def __contains__(self, key):
+        return self.get(key, _MISSING, count=False) is not _MISSING
+
+    def get(self, key, default=None, count=True):
+        with self._lock:
+            item = self._data.get(key)
+            if item is not None and self.ttl is not None and time.time() - item[2] > self.ttl:
+                self._remove(key)
+                self.stats["expired"] += 1
+                item = None
+            if item is None:
+                if count: self.stats["misses"] += 1
+                return default
+            self._data.move_to_end(key)
+            if count: self.stats["hits"] += 1
+            return item[0]
+
+    def put(self, key, value):
+        size = self.sizeof(value)
+        with self._lock:
+            if key in self._data: self._remove(key)
+            self._data[key] = (value, size, time.time())
+            self._bytes += size
+            # 至少保留剛放進來的這筆
+            while len(self._data) > 1 and (self._bytes > self.max_bytes or len(self._data) > self.max_entries):
+                old_key = next(iter(self._data))
+                self._remove(old_key)
+                self.stats["evictions"] += 1
+        return value
+
+    def setdefault(self, key, value):
+        existing = self.get(key, _MISSING, count=False)
+        if existing is not _MISSING: return existing
+        return self.put(key, value)
+
+    def get_or_load(self, key, loader):
+        value = self.get(key, _MISSING)
+        if value is _MISSING:
+            value = loader()
+            if value is not None: self.put(key, value)
+        return value
+
+    def pop(self, key, default=None):
+        with self._lock:
+            item = self._data.get(key)
+            if item is None: return default
+            self._remove(key)
+            return item[0]
+
+    def clear(self):
+        with self._lock:
+            self._data.clear()
+            self._bytes = 0
+
+    def _remove(self, key):
+        _, size, _ = self._data.pop(key)
+        self._bytes -= size
+
+    def info(self):
+        with self._lock:
+            lookups = self.stats["hits"] + self.stats["misses"]
+            return {
+                "name": self.name, "entries": len(self._data), "max_entries": self.max_entries,
+                "bytes": self._bytes, "max_bytes": self.max_bytes,
+                "hit_rate": self.stats["hits"] / lookups * 100 if lookups else None,
+                **self.stats,
+            }
+
+
+class CacheManager:
+    def __init__(self, budgets=CACHE_BUDGETS):
+        self.budgets = dict(budgets)
+        self._caches = {}
+        self._lock = threading.Lock()
+
+    def cache(self, name, sizeof=estimate_size):
+        """取得 (或建立) 指定名稱的快取；預算依 CACHE_BUDGETS 設定。"""
+        with self._lock:
+            cache = self._caches.get(name)
+            if cache is None:
+                max_bytes, max_entries, ttl = self.budgets.get(name, DEFAULT_BUDGET)
+                cache = self._caches[name] = BoundedCache(name, max_bytes, max_entries, ttl, sizeof)
+            return cache
+
+    def stats_frame(self):
+        with self._lock:
+            caches = list(self._caches.values())
+        rows = [c.info() for c in caches]
+        df = pd.DataFrame(rows, columns=["name", "entries", "max_entries", "bytes", "max_bytes", "hit_rate", "hits", "misses", "evictions", "expired"])
+        df["MB"] = df["bytes"] / MB
+        df["上限MB"] = df["max_bytes"] / MB
+        return df
+
+    def total_bytes(self):
+        with self._lock:
+            return sum(c.info()["bytes"] for c in self._caches.values())
+
+
+manager = CacheManager()
@@ -0,0 +1,183 @@
+import os
+import json
+import argparse
+import threading
+import datetime
+import pandas as pd
+from FinMind.data import DataLoader
+import trading_calendar
+
+# --- 🔥 全市場籌碼批次匯入 (依交易日) ---
+# 每個交易日只發 2 個請求 (三大法人、融資融券)，一次拿到全市場資料，
+# 再拆成每檔一份的本地資料，calculate_indicators 會優先讀這裡。
+# 註：FinMind 不帶 stock_id 的全市場查詢需要贊助會員 token (FINMIND_API_TOKEN)。
+CHIP_STORE_DIR = os.path.join(".cache", "chip_store")
+MANIFEST_FILE = "manifest.json"
+STORE_COLUMNS = ["Trust_Net", "Foreign_Net", "Margin_Balance", "Margin_Limit"]
+FLUSH_EVERY_DAYS = 20
+
+_lock = threading.Lock()
+_symbol_cache = {}  # symbol -> (mtime, DataFrame)
+
+
+def _symbol_dir():
+    return os.path.join(CHIP_STORE_DIR, "symbols")
+
+def _symbol_path(symbol):
+    return os.path.join(_symbol_dir(), f"{symbol}.pkl")
+
+def load_manifest():
+    path = os.path.join(CHIP_STORE_DIR, MANIFEST_FILE)
+    if os.path.exists(path):
+        with open(path, "r", encoding="utf-8") as f:
+            return json.load(f)
+    return {"dates": []}
+
+def save_manifest(manifest):
+    os.makedirs(CHIP_STORE_DIR, exist_ok=True)
+    path = os.path.join(CHIP_STORE_DIR, MANIFEST_FILE)
+    with open(path + ".tmp", "w", encoding="utf-8") as f:
+        json.dump(manifest, f)
+    os.replace(path + ".tmp", path)
+
+
+def _get_loader():
+    return DataLoader(token=os.environ.get("FINMIND_API_TOKEN", ""))
+
+def fetch_market_day(date, dl=None):
+    """抓取單一交易日的全市場法人與融資資料，回傳以 (stock_id, date) 為 index 的寬表。"""
+    dl = dl or _get_loader()
+    day = pd.Timestamp(date).strftime('%Y-%m-%d')
+    chip_data = dl.taiwan_stock_institutional_investors(start_date=day, end_date=day)
+    margin_data = dl.taiwan_stock_margin_purchase_short_sale(start_date=day, end_date=day)
+    return to_store_frame(chip_data, margin_data)
+
+def to_store_frame(chip_data, margin_data):
+    """FinMind 法人 / 融資原始資料 (全市場或單檔皆可) -> (stock_id, date) 為 index 的 STORE_COLUMNS 寬表。"""
+    frames = []
+    if chip_data is not None and not chip_data.empty:
+        chip_data['date'] = pd.to_datetime(chip_data['date'])
+        chip_data['net'] = (chip_data['buy'] - chip_data['sell']) / 1000
+        pivot_df = chip_data.pivot_table(index=['stock_id', 'date'], columns='name', values='net', aggfunc='sum').fillna(0)
+        inst = pd.DataFrame(index=pivot_df.index)
+        inst['Trust_Net'] = pivot_df.get('Investment_Trust', 0.0)
+        inst['Foreign_Net'] = pivot_df.get('Foreign_Investor', 0.0)
+        frames.append(inst)
+
+    if margin_data is not None and not margin_data.empty:
+        margin_data['date'] = pd.to_datetime(margin_data['date'])
+        margin = margin_data.set_index(['stock_id', 'date'])
+        m = pd.DataFrame(index=margin.index)
+        m['Margin_Balance'] = margin['MarginPurchaseTodayBalance'] / 1000
+        m['Margin_Limit'] = margin['MarginPurchaseLimit'] / 1000 if 'MarginPurchaseLimit' in margin.columns else 0.0
+        frames.append(m)
+
+    if not frames: return None
+    wide = pd.concat(frames, axis=1)
+    for col in STORE_COLUMNS:
+        if col not in wide.columns: wide[col] = float('nan')
+    return wide[STORE_COLUMNS]
+
+
+def _write_symbols(wide):
+    # wide: index (stock_id, date)，依股票拆開後併入各自的檔案
+    os.makedirs(_symbol_dir(), exist_ok=True)
+    for symbol, rows in wide.groupby(level='stock_id'):
+        rows = rows.droplevel('stock_id')
+        path = _symbol_path(symbol)
+        if os.path.exists(path):
+            old = pd.read_pickle(path)
+            rows = pd.concat([old[~old.index.isin(rows.index)], rows]).sort_index()
+        rows.to_pickle(path + ".tmp")
+        os.replace(path + ".tmp", path)
+        _symbol_cache.pop(symbol, None)
+
+
+def ingest_trade_dates(dates, dl=None, force=False):
+    """
+    依日期批次匯入；已匯入的日期會跳過。回傳實際匯入的日期清單。
+    當天 (資料可能尚未公布) 的空結果不記錄，之後會再試。
+    """
+    dl = dl or _get_loader()
+    with _lock:
+        manifest = load_manifest()
+        done = set(manifest["dates"])
+        today = datetime.date.today()
+        ingested = []
+        batch = []
+
+        for date in pd.to_datetime(list(dates)):
+            day = date.strftime('%Y-%m-%d')
+            if day in done and not force: continue
+            try:
+                wide = fetch_market_day(date, dl)
+            except Exception as e:
+                print(f"❌ 全市場籌碼匯入失敗 {day}: {e}")
+                continue
+            if wide is None and date.date() >= today: continue
+            if wide is not None: batch.append(wide)
+            done.add(day)
+            ingested.append(day)
+            print(f"📥 {day}: {0 if wide is None else len(wide)} 檔")
+
+            # 每 20 天落地一次，中斷後可接續
+            if len(batch) >= FLUSH_EVERY_DAYS:
+                _flush(batch, manifest, done)
+                batch = []
+
+        _flush(batch, manifest, done)
+    return ingested
+
+def _flush(batch, manifest, done):
+    if batch: _write_symbols(pd.concat(batch))
+    manifest["dates"] = sorted(done)
+    save_manifest(manifest)
+
+def ingest_range(start, end=None, dl=None):
+    end = end or datetime.date.today()
+    return ingest_trade_dates(pd.bdate_range(start, end), dl)
+
+
+def last_published_day(at=None):
+    """最近一個籌碼資料已公布 (定案) 的交易日。"""
+    return trading_calendar.last_settled_at("chips", at).date()
+
+def missing_days(at=None):
+    """manifest 最後一天之後、到最近籌碼定案日為止還沒匯入的交易日。"""
+    dates = load_manifest()["dates"]
+    if not dates: return []
+    first = pd.Timestamp(dates[-1]) + pd.Timedelta(days=1)
+    return [d.date() for d in pd.date_range(first, last_published_day(at)) if trading_calendar.is_trading_day(d.date())]
+
+def covers(start):
+    """本地資料是否從 start 開始就有；最新幾天可能還沒匯入，缺的部分用 missing_days 補抓。"""
+    dates = load_manifest()["dates"]
+    return bool(dates) and pd.Timestamp(dates[0]) <= pd.Timestamp(start)
+
+def ingest_latest(dl=None):
+    """匯入 manifest 之後已公布的交易日 (預熱排程呼叫；尚未做過初次回補時不動作)。"""
+    days = missing_days()
+    return ingest_trade_dates(days, dl) if days else []
+
+def load_symbol(symbol, start=None):
+    path = _symbol_path(symbol)
+    if not os.path.exists(path): return None
+    mtime = os.path.getmtime(path)
+    cached = _symbol_cache.get(symbol)
+    if cached is None or cached[0] != mtime:
+        cached = _symbol_cache[symbol] = (mtime, pd.read_pickle(path))
+    df = cached[1]
+    if start is not None: df = df[df.index >= pd.Timestamp(start)]
+    return df
+
+
+if __name__ == "__main__":
+    parser = argparse.ArgumentParser(description="全市場籌碼批次匯入 (每交易日 2 個 FinMind 請求)")
+    parser.add_argument("--days", type=int, default=400, help="往回匯入的日曆天數")
+    parser.add_argument("--start", help="起始日期 YYYY-MM-DD (優先於 --days)")
+    parser.add_argument("--end", help="結束日期 YYYY-MM-DD (預設今天)")
+    args = parser.parse_args()
+
+    start = args.start or (datetime.date.today() - datetime.timedelta(days=args.days)).isoformat()
+    days = ingest_range(start, args.end)
+    print(f"✅ 完成，本次匯入 {len(days)} 個交易日")
@@ -0,0 +1,283 @@
+import os
+import pickle
+import threading
+import time
+from concurrent.futures import ThreadPoolExecutor, TimeoutError as FuturesTimeout
+import pandas as pd
+import cache_manager
+import market_data
+import stock_logic
+import trading_calendar
+
+# --- 🔥 Stale-While-Revalidate 資料層 ---
+# 有舊資料就立刻回傳 (附上資料年齡)，過期的部分丟到背景執行緒更新；
+# 每次成功抓取都寫到磁碟，重啟後第一次開頁也不用等 API。
+# 記憶體中的資料放在 cache_manager 的有限快取 (swr_<kind>)，被淘汰的下次從磁碟讀回。
+# 收盤後 / 休市日，已在定案時間之後抓過的資料不再更新 (見 trading_calendar.is_stale)。
+SWR_CACHE_DIR = os.path.join(".cache", "swr")
+SWR_MAX_WORKERS = 4
+FIRST_LOAD_TIMEOUT = 5    # 完全沒有資料時最多同步等待幾秒，逾時改在背景繼續抓
+
+# 各類資料多久算過期 (秒)
+MAX_AGE = {"quote": 15, "candles": 300, "chips": 3600}
+HISTORY_DAYS = 360
+
+QUOTE_TTL = 5            # 跨 session 共用報價的有效秒數
+QUOTE_NEGATIVE_TTL = 2   # 抓取失敗也短暫快取，避免每次重跑都重打
+
+
+class Entry:
+    __slots__ = ("value", "fetched_at")
+
+    def __init__(self, value, fetched_at):
+        self.value = value
+        self.fetched_at = fetched_at
+
+    @property
+    def version(self):
+        # 以抓取時間當版本：從 LRU 淘汰後由磁碟讀回、或其他行程寫入的新資料都不會撞號
+        return self.fetched_at
+
+    @property
+    def age(self):
+        return time.time() - self.fetched_at
+
+
+def _entry_size(entry):
+    return cache_manager.estimate_size(entry.value)
+
+
+class StaleWhileRevalidateStore:
+    def __init__(self, cache_dir=SWR_CACHE_DIR, max_workers=SWR_MAX_WORKERS):
+        self.cache_dir = cache_dir
+        self._in_flight = {}   # key -> Future
+        self._errors = {}
+        self._lock = threading.Lock()
+        self._executor = ThreadPoolExecutor(max_workers=max_workers, thread_name_prefix="swr")
+
+    def _entries(self, key):
+        return cache_manager.manager.cache(f"swr_{key[0]}", sizeof=_entry_size)
+
+    def _path(self, key):
+        return os.path.join(self.cache_dir, "_".join(str(k) for k in key) + ".pkl")
+
+    def peek(self, key):
+        entry = self._entries(key).get(key)
+        if entry is not None: return entry
+
+        # 記憶體沒有就找磁碟上的上一份
+        path = self._path(key)
+        if not os.path.exists(path): return None
+        try:
+            with open(path, "rb") as f:
+                value, fetched_at = pickle.load(f)
+        except Exception as e:
+            print(f"⚠️ 讀取快取失敗 {path}: {e}")
+            return None
+        with self._lock:
+            entry = self._entries(key).setdefault(key, Entry(value, fetched_at))
+        return entry
+
+    def _load(self, key, loader):
+        try:
+            value = loader()
+        except Exception as e:
+            value = None
+            print(f"❌ 背景更新失敗 {key}: {e}")
+        with self._lock:
+            self._in_flight.pop(key, None)
+            if value is None:
+                self._errors[key] = time.time()
+                return self._entries(key).get(key, count=False)
+            self._errors.pop(key, None)
+            entry = Entry(value, time.time())
+            self._entries(key).put(key, entry)
+        try:
+            os.makedirs(self.cache_dir, exist_ok=True)
+            tmp = self._path(key) + ".tmp"
+            with open(tmp, "wb") as f:
+                pickle.dump((entry.value, entry.fetched_at), f)
+            os.replace(tmp, self._path(key))
+        except Exception as e:
+            print(f"⚠️ 寫入快取失敗 {key}: {e}")
+        return entry
+
+    def refresh_async(self, key, loader):
+        # 同一個 key 同時只會有一個背景更新
+        with self._lock:
+            fut = self._in_flight.get(key)
+            if fut is None:
+                fut = self._executor.submit(self._load, key, loader)
+                self._in_flight[key] = fut
+        return fut
+
+    def get(self, key, loader, max_age):
+        """
+        回傳 Entry (可能是舊資料)，過期就在背景更新；
+        完全沒有資料時 (第一次載入) 才會等待抓取結果，最多 FIRST_LOAD_TIMEOUT 秒，
+        逾時或最近才抓失敗 (代號打錯、開盤前尚未成交…) 就回傳 None，不讓畫面卡在 API 上。
+        """
+        entry = self.peek(key)
+        if entry is None:
+            if self._recently_failed(key, max_age): return None
+            try:
+                return self.refresh_async(key, loader).result(timeout=FIRST_LOAD_TIMEOUT)
+            except FuturesTimeout:
+                return None
+        if entry.age > max_age and trading_calendar.is_stale(entry.fetched_at, key[0]) \
+                and not self._recently_failed(key, max_age):
+            self.refresh_async(key, loader)
+        return entry
+
+    def _recently_failed(self, key, max_age):
+        failed_at = self._errors.get(key)
+        return failed_at is not None and time.time() - failed_at < max_age
+
+    def has_failed(self, key):
+        """最近一次背景更新是否失敗 (成功抓到資料後清除)。"""
+        with self._lock:
+            return key in self._errors
+
+    def is_refreshing(self, key):
+        with self._lock:
+            return key in self._in_flight
+
+    def version(self, key):
+        # 被淘汰時從磁碟讀回，版本不會因為淘汰而歸零
+        entry = self._entries(key).get(key, count=False) or self.peek(key)
+        return entry.version if entry else 0
+
+
+store = StaleWhileRevalidateStore()
+
+
+# --- 🔥 Single-flight 報價快取 (全行程共用) ---
+class _Call:
+    __slots__ = ("event", "value")
+
+    def __init__(self):
+        self.event = threading.Event()
+        self.value = None
+
+
+class SingleFlightCache:
+    """
+    短 TTL 快取 + 請求合併：同一個 key 同時間只會有一個對外請求，
+    其他 session / 執行緒等它完成後共用結果。對外流量只跟「不同的代號數」有關。
+    """
+
+    def __init__(self, ttl, negative_ttl=0, name="quotes"):
+        self.ttl = ttl
+        self.negative_ttl = negative_ttl
+        self._values = cache_manager.manager.cache(name)   # key -> (value, expires_at)
+        self._calls = {}    # key -> _Call
+        self._lock = threading.Lock()
+        self.stats = self._values.stats
+        self.stats.setdefault("coalesced", 0)
+
+    def get(self, key, loader):
+        with self._lock:
+            hit = self._values.get(key, count=False)
+            if hit is not None and hit[1] > time.time():
+                self.stats["hits"] += 1
+                return hit[0]
+            call = self._calls.get(key)
+            leader = call is None
+            if leader:
+                call = self._calls[key] = _Call()
+                self.stats["misses"] += 1
+            else:
+                self.stats["coalesced"] += 1
+
+        if not leader:
+            call.event.wait()
+            return call.value
+
+        value = None
+        try:
+            value = loader()
+        except Exception as e:
+            print(f"❌ 抓取失敗 {key}: {e}")
+        finally:
+            with self._lock:
+                ttl = (self.ttl() if callable(self.ttl) else self.ttl) if value is not None else self.negative_ttl
+                if ttl > 0: self._values.put(key, (value, time.time() + ttl))
+                self._calls.pop(key, None)
+            call.value = value
+            call.event.set()
+        return value
+
+
+def quote_ttl():
+    # 盤中 5 秒；收盤定案後抓到的報價一路用到下次開盤
+    if not trading_calendar.is_stale(time.time(), "quote"):
+        return max(trading_calendar.seconds_until_open(), QUOTE_TTL)
+    return QUOTE_TTL
+
+quote_cache = SingleFlightCache(quote_ttl, QUOTE_NEGATIVE_TTL)
+
+def get_quote(symbol, api_key):
+    return quote_cache.get(symbol, lambda: market_data.fetch_quote(symbol, api_key))
+
+
+# --- 各類資料的讀取入口 ---
+def _history_start():
+    return pd.Timestamp.today().normalize() - pd.Timedelta(days=HISTORY_DAYS)
+
+def _loader(kind, symbol, api_key):
+    if kind == "quote": return lambda: get_quote(symbol, api_key)
+    if kind == "candles": return lambda: market_data.fetch_historical_candles(symbol, api_key, HISTORY_DAYS)
+    if kind == "chips": return lambda: stock_logic.fetch_chip_data(symbol, _history_start())
+    raise ValueError(kind)
+
+def prefetch(symbols, api_key, kinds=("quote", "candles", "chips")):
+    # 先把所有缺資料的 key 一起丟進背景，第一次載入時可以並行等待
+    for symbol in symbols:
+        for kind in kinds:
+            if store.peek((kind, symbol)) is None:
+                store.refresh_async((kind, symbol), _loader(kind, symbol, api_key))
+
+def warm(symbols, api_key, kinds=("quote", "candles", "chips")):
+    """
+    預熱用：缺資料或已過定案時間 (可能有新資料) 的 key 一起丟進背景並等待完成。
+    回傳更新失敗的 key。
+    """
+    futures = {}
+    for symbol in symbols:
+        for kind in kinds:
+            key = (kind, symbol)
+            entry = store.peek(key)
+            if entry is None or trading_calendar.is_stale(entry.fetched_at, kind):
+                futures[key] = store.refresh_async(key, _loader(kind, symbol, api_key))
+    for fut in futures.values(): fut.result()
+    return [key for key in futures if store.has_failed(key)]
+
+def get_symbol_data(symbol, api_key):
+    """回傳 {kind: Entry 或 None}，過期的資料會在背景更新。"""
+    return {
+        kind: store.get((kind, symbol), _loader(kind, symbol, api_key), MAX_AGE[kind])
+        for kind in ("quote", "candles", "chips")
+    }
+
+def get_candles(symbol, api_key):
+    entry = store.get(("candles", symbol), _loader("candles", symbol, api_key), MAX_AGE["candles"])
+    return entry.value if entry else None
+
+def is_refreshing(symbol):
+    return any(store.is_refreshing((kind, symbol)) for kind in ("quote", "candles", "chips"))
+
+def data_version(symbol):
+    return tuple(store.version((kind, symbol)) for kind in ("quote", "candles", "chips"))
+
+def staleness_badge(entries, refreshing=False):
+    ages = [e.age for e in entries.values() if e is not None]
+    if not ages: return "⚪ 無資料"
+    if not trading_calendar.is_session_open() and not any(
+            trading_calendar.is_stale(e.fetched_at, kind) for kind, e in entries.items() if e is not None):
+        return "🌙 收盤資料" + (" 🔄" if refreshing else "")
+    age = max(ages)
+    if age < 60: badge = "🟢 即時"
+    elif age < 3600: badge = f"🟡 {int(age // 60)} 分鐘前"
+    elif age < 86400: badge = f"🟠 {int(age // 3600)} 小時前"
+    else: badge = f"🔴 {int(age // 86400)} 天前"
+    return badge + (" 🔄" if refreshing else "")
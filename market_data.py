@@ -0,0 +1,213 @@
+import datetime
+import threading
+import time
+import requests
+import pandas as pd
+import orderbook_recorder
+import trading_calendar
+
+# --- 🔥 Fugle 行情資料 (不依賴 Streamlit，app / bot / 背景工作共用) ---
+FUGLE_BASE_URL = "https://api.fugle.tw/marketdata/v1.0/stock"
+
+# 盤中分K：以 1 分K 為底，其餘週期由本地 resample 產生
+INTRADAY_TIMEFRAMES = {"1分": None, "5分": "5min", "15分": "15min", "60分": "60min"}
+INTRADAY_REFRESH_SEC = 10     # 同一檔最短重新抓取間隔
+INTRADAY_MAX_BARS = 1500      # 約 5 個交易日的 1 分K (270 根/日)
+SHARES_PER_LOT = 1000         # 盤中報價 / 逐筆成交量以「張」計，日K 成交量以「股」計
+
+
+def fetch_quote(symbol_id, api_key):
+    try:
+        url = f"{FUGLE_BASE_URL}/intraday/quote/{symbol_id}"
+        headers = { "X-API-KEY": api_key }
+        response = requests.get(url, headers=headers, verify=False)
+        if response.status_code != 200: return None
+        data = response.json()
+
+        price = data.get("lastTrade", {}).get("price") or data.get("lastTrial", {}).get("price")
+        name = data.get("name", "")
+        if not name: name = symbol_id
+
+        order_book = data.get("order", {})
+        bids = order_book.get("bids", [])
+        asks = order_book.get("asks", [])
+        orderbook_recorder.recorder.record(symbol_id, bids, asks, data.get("lastUpdated"))
+
+        if price:
+            return {
+                "symbol": symbol_id, "name": name, "price": float(price),
+                "change": data.get("change", 0), "change_percent": data.get("changePercent", 0),
+                "prev_close": data.get("previousClose", 0),
+                "bids": bids, "asks": asks,
+                "bar": intraday_bars.update_quote(symbol_id, data, float(price))
+            }
+        return None
+    except: return None
+
+
+def fetch_historical_candles(symbol_id, api_key, days=360):
+    try:
+        today = datetime.date.today().isoformat()
+        start_date = (datetime.date.today() - datetime.timedelta(days=days)).isoformat()
+        fields = "open,high,low,close,volume,turnover,change"
+        url = f"{FUGLE_BASE_URL}/historical/candles/{symbol_id}?from={start_date}&to={today}&fields={fields}"
+        headers = { "X-API-KEY": api_key }
+        response = requests.get(url, headers=headers, verify=False)
+
+        if response.status_code != 200: return None
+        json_data = response.json()
+        if "data" not in json_data or len(json_data["data"]) == 0: return None
+
+        df = pd.DataFrame(json_data["data"])
+        df["date"] = pd.to_datetime(df["date"])
+        df = df.set_index("date").sort_index()
+        cols = ["open", "high", "low", "close", "volume"]
+        df[cols] = df[cols].astype(float)
+        df.rename(columns={c: c.capitalize() for c in cols}, inplace=True)
+        return df
+    except: return None
+
+
+def fetch_intraday_candles(symbol_id, api_key, timeframe=1):
+    try:
+        url = f"{FUGLE_BASE_URL}/intraday/candles/{symbol_id}?timeframe={timeframe}"
+        headers = { "X-API-KEY": api_key }
+        response = requests.get(url, headers=headers, verify=False)
+        if response.status_code != 200: return None
+        return response.json().get("data") or []
+    except: return None
+
+
+def _candles_to_frame(bars):
+    df = pd.DataFrame(bars)
+    # Fugle 回傳 "2024-05-29T09:00:00.000+08:00"，轉成台北時間的 naive index 與日K一致
+    df["date"] = pd.to_datetime(df["date"]).dt.tz_localize(None)
+    df = df.set_index("date").sort_index()
+    cols = ["open", "high", "low", "close", "volume"]
+    df = df[cols].astype(float)
+    df.columns = [c.capitalize() for c in cols]
+    return df
+
+
+class IntradayBarAggregator:
+    """
+    每檔今日的開高低收與累計成交量，直接由報價 (或逐筆成交) 累積，不額外打 API。
+    報價帶有當日總量 (total.tradeVolume) 時以它為準；成交量只增不減，避免舊報價倒退。
+    """
+
+    def __init__(self):
+        self._bars = {}
+        self._lock = threading.Lock()
+
+    def _bar(self, symbol, day):
+        bar = self._bars.get(symbol)
+        if bar is None or bar["date"] != day:
+            bar = self._bars[symbol] = {"date": day, "open": None, "high": None, "low": None, "close": None, "volume": 0.0}
+        return bar
+
+    def _apply(self, bar, price, high=None, low=None):
+        if bar["open"] is None: bar["open"] = price
+        bar["high"] = max(v for v in (bar["high"], high, price) if v is not None)
+        bar["low"] = min(v for v in (bar["low"], low, price) if v is not None)
+        bar["close"] = price
+
+    def update_quote(self, symbol, data, price):
+        # 報價的日期即交易日 (盤前、休市時是上一個交易日的收盤資料)
+        day = data.get("date") or trading_calendar.session_date().isoformat()
+        total = data.get("total") or {}
+        with self._lock:
+            bar = self._bar(symbol, day)
+            if data.get("openPrice"): bar["open"] = float(data["openPrice"])
+            self._apply(bar, price, data.get("highPrice"), data.get("lowPrice"))
+            if total.get("tradeVolume") is not None:
+                bar["volume"] = max(bar["volume"], float(total["tradeVolume"]) * SHARES_PER_LOT)
+            return dict(bar)
+
+    def add_trade(self, symbol, price, size, day=None):
+        """逐筆成交 (size 以張計)。"""
+        day = day or trading_calendar.session_date().isoformat()
+        with self._lock:
+            bar = self._bar(symbol, day)
+            self._apply(bar, float(price))
+            bar["volume"] += float(size) * SHARES_PER_LOT
+            return dict(bar)
+
+    def get(self, symbol):
+        with self._lock:
+            bar = self._bars.get(symbol)
+            return dict(bar) if bar else None
+
+
+class IntradayCandleCache:
+    """
+    每檔股票一份滾動的 1 分K。重新抓取時只解析「最後一根 (可能仍在成形)」之後的
+    K 棒並接在尾端，不重建整天的資料；超過 max_bars 的舊 K 棒自動捨棄。
+    """
+
+    def __init__(self, max_bars=INTRADAY_MAX_BARS, min_refresh=INTRADAY_REFRESH_SEC):
+        self.max_bars = max_bars
+        self.min_refresh = min_refresh
+        self._frames = {}
+        self._last_key = {}     # 最後一根 K 棒的原始時間字串
+        self._fetched_at = {}
+        self._revision = {}     # 每次 _append 改動 K 棒 (含成形中的最後一根) 就 +1
+        self._resampled = {}    # (symbol, timeframe) -> (revision, frame)
+        self._lock = threading.Lock()
+
+    def get(self, symbol, api_key):
+        with self._lock:
+            frame = self._frames.get(symbol)
+            # 收盤定案後抓過一次就不再重抓，直到下次開盤
+            if frame is not None and (time.time() - self._fetched_at[symbol] < self.min_refresh
+                                      or not trading_calendar.is_stale(self._fetched_at[symbol], "quote")):
+                return frame
+
+        bars = fetch_intraday_candles(symbol, api_key)
+        with self._lock:
+            self._fetched_at[symbol] = time.time()
+            if bars: self._append(symbol, bars)
+            return self._frames.get(symbol)
+
+    def _append(self, symbol, bars):
+        frame = self._frames.get(symbol)
+        last_key = self._last_key.get(symbol)
+
+        # bars 依時間遞增，從尾端往回找到仍需更新的起點 (同格式 ISO 字串可直接比較)
+        start = len(bars)
+        while start > 0 and (last_key is None or bars[start - 1]["date"] >= last_key):
+            start -= 1
+        new_bars = bars[start:]
+        if not new_bars: return
+
+        new_df = _candles_to_frame(new_bars)
+        if frame is not None:
+            frame = pd.concat([frame[frame.index < new_df.index[0]], new_df])
+        else:
+            frame = new_df
+        if len(frame) > self.max_bars: frame = frame.iloc[-self.max_bars:]
+
+        self._frames[symbol] = frame
+        self._last_key[symbol] = new_bars[-1]["date"]
+        self._revision[symbol] = self._revision.get(symbol, 0) + 1
+
+    def get_timeframe(self, symbol, api_key, timeframe):
+        frame = self.get(symbol, api_key)
+        rule = INTRADAY_TIMEFRAMES.get(timeframe)
+        if frame is None or rule is None: return frame
+
+        key = (symbol, timeframe)
+        with self._lock:
+            # 成形中的最後一根被就地更新時 _last_key 不變，改以 revision 判斷是否要重算
+            frame = self._frames.get(symbol)
+            revision = self._revision.get(symbol)
+            cached = self._resampled.get(key)
+            if cached and cached[0] == revision: return cached[1]
+
+            agg_dict = {'Open': 'first', 'High': 'max', 'Low': 'min', 'Close': 'last', 'Volume': 'sum'}
+            df_res = frame.resample(rule).agg(agg_dict).dropna()
+            self._resampled[key] = (revision, df_res)
+            return df_res
+
+
+intraday_bars = IntradayBarAggregator()
+intraday_cache = IntradayCandleCache()
@@ -0,0 +1,192 @@
+import time
+import argparse
+import tracemalloc
+import numpy as np
+import pandas as pd
+import minute_store
+import stock_logic
+
+# --- 🔥 分K 串流回測 (逐塊讀取本地 1 分K，記憶體用量與資料長度無關) ---
+# 每一塊前面接上上一塊最後 WARMUP_BARS 根原始 K 棒再算指標，只對新的 K 棒評分：
+#   - 位階 (250 根高低點)、均線、唐奇安等視窗型指標在接縫處與整段計算完全相同
+#   - RSI / MACD / ADX / ATR 等遞迴平滑指標的起始誤差經過 400 根後衰減到 1e-9 以下
+#   - OBV 只差一個常數，與 OBV 均線比較的結果不變
+# 評分用 stock_logic.score_frame (與 analyze_strategy 技術面規則相同) 一次算完整塊。
+# 部位 (進場價、停損、最高價、持有根數) 跨塊延續；出場規則與 simulate_exits 相同，
+# 但同一時間只持有一筆部位 (持有中出現的訊號不再進場)。
+WARMUP_BARS = 400
+DEFAULT_MAX_HOLD = 60     # 最長持有 60 根 1 分K
+
+TRADE_COLUMNS = ["訊號時間", "買進時間", "買入成本", "出場時間", "出場價", "出場原因", "持有根數", "淨報酬(%)"]
+
+
+class StreamingBacktest:
+    def __init__(self, threshold=5, atr_mult=2.0, trail_mult=None, take_profit=None, max_hold=DEFAULT_MAX_HOLD,
+                 commission=stock_logic.TW_COMMISSION_RATE, commission_discount=1.0, tax=stock_logic.TW_TRANSACTION_TAX):
+        self.threshold = threshold
+        self.atr_mult = atr_mult
+        self.trail_mult = trail_mult
+        self.take_profit = take_profit
+        self.max_hold = max_hold
+        self.fee = commission * commission_discount
+        self.tax = tax
+        self._tail = None         # 上一塊最後 WARMUP_BARS 根原始 K 棒
+        self._pending = None      # 上一塊最後一根出現的訊號，下一塊第一根開盤進場
+        self._last_bar = None     # (時間, 收盤價)，結束時結算持有中的部位
+        self.position = None
+        self.bars = 0
+        self.signals = 0
+
+    def feed(self, chunk):
+        """餵入一塊依時間遞增的 1 分K，回傳這一塊內平倉的交易 (list of dict)。"""
+        if chunk is None or chunk.empty: return []
+        n_new = len(chunk)
+        chunk = chunk[minute_store.BAR_COLUMNS]
+        frame = chunk if self._tail is None else pd.concat([self._tail, chunk])
+        self._tail = frame.iloc[-WARMUP_BARS:]
+
+        df = stock_logic.calculate_indicators(frame)
+        scores = stock_logic.score_frame(df)[-n_new:]
+        df = df.iloc[-n_new:]
+        self.bars += n_new
+        self.signals += int((scores >= self.threshold).sum())
+        self._last_bar = (df.index[-1], float(df['Close'].iloc[-1]))
+        return self._simulate(df, scores)
+
+    def _simulate(self, df, scores):
+        idx = df.index
+        o = df['Open'].to_numpy(dtype=float)
+        h = df['High'].to_numpy(dtype=float)
+        l = df['Low'].to_numpy(dtype=float)
+        c = df['Close'].to_numpy(dtype=float)
+        atr = df['ATR'].to_numpy(dtype=float)
+        n = len(df)
+        trades = []
+        i = 0
+        while i < n:
+            if self._pending is not None:
+                sig_time, sig_close, sig_atr = self._pending
+                self._pending = None
+                entry = o[i]
+                self.position = {
+                    "signal": sig_time, "entry_time": idx[i], "entry": entry,
+                    "stop": sig_close - self.atr_mult * sig_atr, "atr": sig_atr,
+                    "tp": entry * (1 + self.take_profit) if self.take_profit else np.inf,
+                    "high": entry, "held": 0,
+                }
+            if self.position is not None:
+                exit_at = self._scan_exit(i, idx, o, h, l, c, trades)
+                if exit_at is None: break
+                # 出場那根收盤出現的訊號仍可在下一根進場
+                i = exit_at
+            hits = np.flatnonzero((scores[i:] >= self.threshold) & ~np.isnan(atr[i:]))
+            if not len(hits): break
+            k = i + int(hits[0])
+            self._pending = (idx[k], c[k], atr[k])
+            i = k + 1
+        return trades
+
+    def _scan_exit(self, i, idx, o, h, l, c, trades):
+        """從第 i 根開始找部位的出場點；這一塊內沒出場就更新部位狀態並回傳 None。"""
+        p = self.position
+        remaining = self.max_hold - p["held"]
+        end = min(len(o), i + remaining)
+        m = end - i
+        bar_o, bar_h, bar_l, bar_c = o[i:end], h[i:end], l[i:end], c[i:end]
+
+        stop_level = np.full(m, p["stop"])
+        if self.trail_mult:
+            # 第 j 根的移動停損只看到第 j-1 根為止的最高價
+            run_high = np.maximum.accumulate(np.maximum(bar_h, p["high"]))
+            prev_high = np.concatenate([[p["high"]], run_high[:-1]])
+            stop_level = np.maximum(stop_level, prev_high - self.trail_mult * p["atr"])
+        stop_hit = bar_l <= stop_level
+        tp_hit = bar_h >= p["tp"]
+
+        first_stop = int(stop_hit.argmax()) if stop_hit.any() else m
+        first_tp = int(tp_hit.argmax()) if tp_hit.any() else m
+        expire_at = m - 1 if m == remaining else m
+        k = min(first_stop, first_tp, expire_at)
+        if k >= m:
+            p["high"] = max(p["high"], float(bar_h.max()))
+            p["held"] += m
+            return None
+
+        if first_stop == k:
+            exit_price = min(bar_o[k], stop_level[k])
+            reason = "移動停損" if stop_level[k] > p["stop"] else "停損"
+        elif first_tp == k:
+            exit_price = max(bar_o[k], p["tp"])
+            reason = "停利"
+        else:
+            exit_price, reason = bar_c[k], "到期"
+        trades.append(self._trade(p, idx[i + k], exit_price, reason, p["held"] + k + 1))
+        self.position = None
+        return i + k
+
+    def _trade(self, p, exit_time, exit_price, reason, held):
+        cost = p["entry"] * (1 + self.fee)
+        proceeds = exit_price * (1 - self.fee - self.tax)
+        return {
+            "訊號時間": p["signal"].strftime('%Y-%m-%d %H:%M'),
+            "買進時間": p["entry_time"].strftime('%Y-%m-%d %H:%M'),
+            "買入成本": float(p["entry"]),
+            "出場時間": exit_time.strftime('%Y-%m-%d %H:%M'),
+            "出場價": float(exit_price),
+            "出場原因": reason,
+            "持有根數": int(held),
+            "淨報酬(%)": float((proceeds - cost) / cost * 100),
+        }
+
+    def finish(self):
+        """資料結束時仍持有的部位以最後收盤價結算 (出場原因「持有中」)。"""
+        if self.position is None or self._last_bar is None: return []
+        p, self.position = self.position, None
+        return [self._trade(p, self._last_bar[0], self._last_bar[1], "持有中", p["held"])]
+
+    def run(self, chunks):
+        """chunks 為 1 分K 區塊的 iterable (例如 minute_store.iter_chunks)，邊算邊產生交易。"""
+        for chunk in chunks:
+            yield from self.feed(chunk)
+        yield from self.finish()
+
+
+def backtest_symbol(symbol, start=None, end=None, chunk_bars=minute_store.CHUNK_BARS, **rules):
+    bt = StreamingBacktest(**rules)
+    return bt, bt.run(minute_store.iter_chunks(symbol, start, end, chunk_bars))
+
+
+if __name__ == "__main__":
+    parser = argparse.ArgumentParser(description="分K 串流回測 (本地 1 分K 資料庫)")
+    parser.add_argument("symbol")
+    parser.add_argument("--start")
+    parser.add_argument("--end")
+    parser.add_argument("--threshold", type=int, default=5, help="買進門檻 (分)")
+    parser.add_argument("--atr", type=float, default=2.0, help="ATR 停損倍數")
+    parser.add_argument("--trail", type=float, default=0.0, help="移動停損 ATR 倍數 (0=關閉)")
+    parser.add_argument("--tp", type=float, default=0.0, help="停利 %% (0=關閉)")
+    parser.add_argument("--max-hold", type=int, default=DEFAULT_MAX_HOLD, help="最長持有 (K棒)")
+    parser.add_argument("--chunk", type=int, default=minute_store.CHUNK_BARS, help="每塊 K 棒數")
+    parser.add_argument("--quiet", action="store_true", help="不逐筆列出交易")
+    parser.add_argument("--memory", action="store_true", help="量測記憶體峰值 (tracemalloc，會變慢)")
+    args = parser.parse_args()
+
+    if args.memory: tracemalloc.start()
+    t0 = time.time()
+    bt, trades = backtest_symbol(
+        args.symbol, args.start, args.end, args.chunk, threshold=args.threshold, atr_mult=args.atr,
+        trail_mult=args.trail or None, take_profit=(args.tp / 100) or None, max_hold=args.max_hold
+    )
+    returns = []
+    for t in trades:
+        returns.append(t["淨報酬(%)"])
+        if not args.quiet:
+            print(f"{t['買進時間']} → {t['出場時間']} {t['出場原因']:<4} {t['買入成本']:.2f} → {t['出場價']:.2f} {t['淨報酬(%)']:+.2f}%")
+
+    stats = stock_logic.bootstrap_stats(returns)
+    print(f"📊 {args.symbol}：{bt.bars} 根 K 棒，{bt.signals} 次訊號，{stats['trades']} 筆交易，{time.time() - t0:.1f}s")
+    if stats["trades"]:
+        print(f"   勝率 {stats['win_rate']:.1f}% ({stats['win_lo']:.0f}–{stats['win_hi']:.0f}%)，"
+              f"平均淨報酬 {stats['mean']:.3f}% ({stats['mean_lo']:.3f}–{stats['mean_hi']:.3f}%)")
+    if args.memory:
+        print(f"   記憶體峰值 {tracemalloc.get_traced_memory()[1] / 1024 / 1024:.1f} MB")
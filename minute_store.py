@@ -0,0 +1,157 @@
+import os
+import json
+import argparse
+import datetime
+import threading
+import numpy as np
+import pandas as pd
+import trading_calendar
+
+# --- 🔥 本地 1 分K 資料庫 (每檔每月一個 npz，欄式儲存) ---
+# .cache/minute_bars/<代號>/<YYYY-MM>.npz，欄位 ts / Open / High / Low / Close / Volume。
+# 讀取用 iter_chunks 逐月載入、切成固定根數的區塊，多年資料也只佔一個月份的記憶體。
+# 每檔另記一份已保存的交易日 (days.json)；中間漏存的交易日讀取時會警告，回測不會默默把前後接起來。
+MINUTE_DIR = os.path.join(".cache", "minute_bars")
+DAYS_FILE = "days.json"
+MAX_GAP_REPORT = 10       # 缺漏交易日最多列出幾天
+CHUNK_BARS = 20000        # 每個區塊的 K 棒數 (約 74 個交易日的 1 分K)
+BAR_COLUMNS = ["Open", "High", "Low", "Close", "Volume"]
+
+_lock = threading.Lock()
+
+
+def _symbol_dir(symbol):
+    return os.path.join(MINUTE_DIR, symbol)
+
+def _month_path(symbol, month):
+    return os.path.join(_symbol_dir(symbol), f"{month}.npz")
+
+def months(symbol):
+    path = _symbol_dir(symbol)
+    if not os.path.exists(path): return []
+    return sorted(f[:-4] for f in os.listdir(path) if f.endswith(".npz"))
+
+def symbols():
+    if not os.path.exists(MINUTE_DIR): return []
+    return sorted(d for d in os.listdir(MINUTE_DIR) if months(d))
+
+def _load_month(symbol, month):
+    with np.load(_month_path(symbol, month)) as z:
+        return pd.DataFrame({c: z[c] for c in BAR_COLUMNS}, index=pd.DatetimeIndex(z["ts"], name="date"))
+
+def saved_days(symbol):
+    """已保存分K 的交易日 (sorted list of date)；舊資料沒有 days.json 時由 K 棒重建一次。"""
+    path = os.path.join(_symbol_dir(symbol), DAYS_FILE)
+    if os.path.exists(path):
+        with open(path, "r", encoding="utf-8") as f:
+            return [datetime.date.fromisoformat(d) for d in json.load(f)]
+    days = set()
+    for month in months(symbol):
+        days.update(_load_month(symbol, month).index.date)
+    if days: _save_days(symbol, days)
+    return sorted(days)
+
+def _save_days(symbol, days):
+    os.makedirs(_symbol_dir(symbol), exist_ok=True)
+    path = os.path.join(_symbol_dir(symbol), DAYS_FILE)
+    with open(path + ".tmp", "w", encoding="utf-8") as f:
+        json.dump(sorted(d.isoformat() for d in days), f)
+    os.replace(path + ".tmp", path)
+
+def gaps(symbol, start=None, end=None):
+    """start ~ end 之間 (限已保存範圍內) 沒有分K 的交易日。"""
+    days = saved_days(symbol)
+    if not days: return []
+    lo = max(days[0], pd.Timestamp(start).date()) if start else days[0]
+    hi = min(days[-1], pd.Timestamp(end).date()) if end else days[-1]
+    have = set(days)
+    return [d.date() for d in pd.date_range(lo, hi)
+            if d.date() not in have and trading_calendar.is_trading_day(d.date())]
+
+def _save_month(symbol, month, df):
+    os.makedirs(_symbol_dir(symbol), exist_ok=True)
+    path = _month_path(symbol, month)
+    tmp = path + ".tmp"
+    with open(tmp, "wb") as f:
+        np.savez(f, ts=df.index.values.astype("datetime64[m]"),
+                 **{c: df[c].to_numpy(dtype=float) for c in BAR_COLUMNS})
+    os.replace(tmp, path)
+
+def append(symbol, df):
+    """寫入 1 分K (index 為時間)；同一分鐘重複寫入以新的為準，回傳新增的根數。"""
+    if df is None or df.empty: return 0
+    df = df[BAR_COLUMNS].astype(float)
+    if df.index.tz is not None: df = df.tz_convert("Asia/Taipei").tz_localize(None)
+    added = 0
+    with _lock:
+        days = set(saved_days(symbol))
+        days.update(df.index.date)
+        for month, part in df.groupby(df.index.strftime("%Y-%m")):
+            old = _load_month(symbol, month) if os.path.exists(_month_path(symbol, month)) else None
+            merged = part if old is None else pd.concat([old, part])
+            merged = merged[~merged.index.duplicated(keep="last")].sort_index()
+            added += len(merged) - (0 if old is None else len(old))
+            _save_month(symbol, month, merged)
+        _save_days(symbol, days)
+    return added
+
+def _is_date_only(value):
+    if isinstance(value, str): return ":" not in value and "T" not in value
+    return isinstance(value, datetime.date) and not isinstance(value, datetime.datetime)
+
+def iter_chunks(symbol, start=None, end=None, chunk_bars=CHUNK_BARS):
+    """
+    依時間順序逐塊產生 1 分K DataFrame (每塊最多 chunk_bars 根)。
+    end 只給日期 (例如 "2025-06-30") 時包含當天整天。範圍內有漏存的交易日會先印出警告。
+    """
+    start = pd.Timestamp(start) if start else None
+    # 只有日期的 end 視為當天結束 (< 隔天 00:00)
+    end_ts = pd.Timestamp(end) if end else None
+    end_before = end_ts + pd.Timedelta(days=1) if end_ts is not None and _is_date_only(end) else None
+    missing = gaps(symbol, start, end_ts)
+    if missing:
+        shown = "、".join(d.isoformat() for d in missing[:MAX_GAP_REPORT])
+        more = f" 等 {len(missing)} 天" if len(missing) > MAX_GAP_REPORT else ""
+        print(f"⚠️ {symbol} 分K 缺少交易日：{shown}{more}，前後資料會直接相接")
+    buf = []
+    size = 0
+    for month in months(symbol):
+        if start is not None and month < start.strftime("%Y-%m"): continue
+        if end_ts is not None and month > end_ts.strftime("%Y-%m"): break
+        df = _load_month(symbol, month)
+        if start is not None: df = df[df.index >= start]
+        if end_before is not None: df = df[df.index < end_before]
+        elif end_ts is not None: df = df[df.index <= end_ts]
+        while len(df):
+            take = df.iloc[:chunk_bars - size]
+            buf.append(take)
+            size += len(take)
+            df = df.iloc[len(take):]
+            if size >= chunk_bars:
+                yield pd.concat(buf) if len(buf) > 1 else buf[0]
+                buf, size = [], 0
+    if buf: yield pd.concat(buf) if len(buf) > 1 else buf[0]
+
+def import_csv(symbol, path):
+    """匯入外部 1 分K CSV (欄位 date/datetime, open, high, low, close, volume，大小寫不拘)。"""
+    total = 0
+    for part in pd.read_csv(path, chunksize=200000):
+        part.columns = [c.strip().lower() for c in part.columns]
+        ts_col = "datetime" if "datetime" in part.columns else "date"
+        part.index = pd.to_datetime(part.pop(ts_col))
+        part.columns = [c.capitalize() for c in part.columns]
+        total += append(symbol, part)
+    return total
+
+
+if __name__ == "__main__":
+    parser = argparse.ArgumentParser(description="本地 1 分K 資料庫")
+    parser.add_argument("symbol", nargs="?")
+    parser.add_argument("--import-csv", dest="csv", help="匯入 1 分K CSV")
+    args = parser.parse_args()
+
+    if args.symbol and args.csv:
+        print(f"✅ {args.symbol} 新增 {import_csv(args.symbol, args.csv)} 根")
+    for s in ([args.symbol] if args.symbol else symbols()):
+        m = months(s)
+        if m: print(f"{s}: {m[0]} ~ {m[-1]} ({len(m)} 個月，{len(saved_days(s))} 個交易日，缺 {len(gaps(s))} 天)")
@@ -0,0 +1,127 @@
+import threading
+import time
+import numpy as np
+import pandas as pd
+
+# --- 🔥 五檔掛單錄製器 (固定大小 Ring Buffer) ---
+# 每檔股票預先配置固定長度的數值陣列，盤中每次取得報價就取樣一次五檔，
+# 寫滿後從頭覆蓋，記憶體用量與交易時間長短無關。
+BOOK_LEVELS = 5
+SAMPLE_INTERVAL_SEC = 5                    # 同一檔最短取樣間隔
+SESSION_SECONDS = int(4.5 * 3600)          # 09:00 ~ 13:30
+DEFAULT_CAPACITY = SESSION_SECONDS // SAMPLE_INTERVAL_SEC + 1
+TZ_TAIPEI = 'Asia/Taipei'
+
+
+class OrderBookRing:
+    """單一股票的五檔環形緩衝區 (價格/張數皆為 float32)。"""
+
+    def __init__(self, capacity=DEFAULT_CAPACITY, levels=BOOK_LEVELS):
+        self.capacity = capacity
+        self.levels = levels
+        self.ts = np.zeros(capacity, dtype=np.int64)  # epoch 秒
+        self.bid_px = np.full((capacity, levels), np.nan, dtype=np.float32)
+        self.bid_vol = np.zeros((capacity, levels), dtype=np.float32)
+        self.ask_px = np.full((capacity, levels), np.nan, dtype=np.float32)
+        self.ask_vol = np.zeros((capacity, levels), dtype=np.float32)
+        self.head = 0   # 下一筆寫入位置
+        self.size = 0
+        self.day = None  # 目前緩衝區所屬交易日
+
+    @property
+    def nbytes(self):
+        return (self.ts.nbytes + self.bid_px.nbytes + self.bid_vol.nbytes
+                + self.ask_px.nbytes + self.ask_vol.nbytes)
+
+    def last_ts(self):
+        if self.size == 0: return None
+        return int(self.ts[(self.head - 1) % self.capacity])
+
+    def clear(self):
+        self.head = 0
+        self.size = 0
+
+    def push(self, ts, bids, asks):
+        i = self.head
+        self.ts[i] = ts
+        self.bid_px[i] = np.nan
+        self.bid_vol[i] = 0
+        self.ask_px[i] = np.nan
+        self.ask_vol[i] = 0
+        for lvl, b in enumerate(bids[:self.levels]):
+            self.bid_px[i, lvl] = b.get('price', np.nan)
+            self.bid_vol[i, lvl] = b.get('volume', 0)
+        for lvl, a in enumerate(asks[:self.levels]):
+            self.ask_px[i, lvl] = a.get('price', np.nan)
+            self.ask_vol[i, lvl] = a.get('volume', 0)
+        self.head = (i + 1) % self.capacity
+        self.size = min(self.size + 1, self.capacity)
+
+    def order(self):
+        # 依時間先後排列的索引 (最舊 -> 最新)
+        start = (self.head - self.size) % self.capacity
+        return (start + np.arange(self.size)) % self.capacity
+
+
+class OrderBookRecorder:
+    def __init__(self, capacity=DEFAULT_CAPACITY, interval=SAMPLE_INTERVAL_SEC):
+        self.capacity = capacity
+        self.interval = interval
+        self._rings = {}
+        self._lock = threading.Lock()
+
+    def record(self, symbol, bids, asks, ts=None):
+        """
+        寫入一筆五檔快照。ts 可為 Fugle 報價的 lastUpdated (微秒) 或 epoch 秒；
+        距上次取樣不足 interval 秒的快照直接略過。換日時清空該檔緩衝區。
+        """
+        if not bids and not asks: return False
+        if ts is None: ts = time.time()
+        ts = int(ts // 1_000_000) if ts > 1e12 else int(ts)
+        day = pd.Timestamp(ts, unit='s', tz='UTC').tz_convert(TZ_TAIPEI).date()
+
+        with self._lock:
+            ring = self._rings.get(symbol)
+            if ring is None:
+                ring = self._rings[symbol] = OrderBookRing(self.capacity)
+            if ring.day != day:
+                ring.clear()
+                ring.day = day
+            last = ring.last_ts()
+            if last is not None and ts - last < self.interval: return False
+            ring.push(ts, bids, asks)
+        return True
+
+    def snapshot(self, symbol):
+        """回傳 (時間索引, bid_px, bid_vol, ask_px, ask_vol) 的時間序複本。"""
+        with self._lock:
+            ring = self._rings.get(symbol)
+            if ring is None or ring.size == 0: return None
+            idx = ring.order()
+            ts = ring.ts[idx]
+            arrays = (ring.bid_px[idx], ring.bid_vol[idx], ring.ask_px[idx], ring.ask_vol[idx])
+        index = pd.to_datetime(ts, unit='s', utc=True).tz_convert(TZ_TAIPEI)
+        return (index,) + arrays
+
+    def imbalance_series(self, symbol, levels=BOOK_LEVELS):
+        """
+        五檔買賣力道：(委買張數 - 委賣張數) / (委買 + 委賣)，範圍 -1 ~ +1。
+        正值代表買盤掛單較厚。
+        """
+        snap = self.snapshot(symbol)
+        if snap is None: return pd.Series(dtype=float)
+        index, _, bid_vol, _, ask_vol = snap
+        bid_sum = bid_vol[:, :levels].sum(axis=1, dtype=np.float64)
+        ask_sum = ask_vol[:, :levels].sum(axis=1, dtype=np.float64)
+        total = bid_sum + ask_sum
+        with np.errstate(invalid='ignore', divide='ignore'):
+            imb = np.where(total > 0, (bid_sum - ask_sum) / total, np.nan)
+        return pd.Series(imb, index=index, name='Depth_Imbalance')
+
+    def memory_bytes(self):
+        with self._lock:
+            return sum(r.nbytes for r in self._rings.values())
+
+
+# 全域共用 (Streamlit 重跑不會重新 import 模組，跨 session 共享)
+recorder = OrderBookRecorder()
@@ -0,0 +1,280 @@
+import os
+import json
+import time
+import random
+import hashlib
+import argparse
+import threading
+from http.server import ThreadingHTTPServer, BaseHTTPRequestHandler
+from urllib.parse import urlsplit, parse_qsl, urlencode
+
+# --- 🔥 Fugle / FinMind 離線錄製與重播 ---
+# 錄製：設定 API_RECORD_DIR 後，所有經過 requests 的 Fugle / FinMind 回應都會存檔。
+# 重播：設定 API_REPLAY_URL=http://127.0.0.1:8765 後，請求改送到本機替身伺服器，
+#       可加上延遲、錯誤率與限流，方便壓測與重現效能數據。
+RECORD_DIR = os.environ.get("API_RECORD_DIR", "")
+REPLAY_URL = os.environ.get("API_REPLAY_URL", "").rstrip("/")
+DEFAULT_RECORD_DIR = os.path.join(".cache", "recordings")
+
+API_HOSTS = ("api.fugle.tw", "api.finmindtrade.com", "api.web.finmindtrade.com")
+# 日期與金鑰類參數不列入比對，錄一次可以在任何一天重播
+IGNORED_PARAMS = {"from", "to", "start_date", "end_date", "token", "user_id", "password"}
+SECRET_PARAMS = {"token", "user_id", "password"}
+SYMBOL_PARAMS = ("data_id", "stock_id")
+
+_record_lock = threading.Lock()
+
+
+def request_key(method, url):
+    parts = urlsplit(url)
+    params = sorted((k, v) for k, v in parse_qsl(parts.query) if k not in IGNORED_PARAMS)
+    return f"{method.upper()} {parts.netloc}{parts.path}?{urlencode(params)}"
+
+def template_key(method, url):
+    """把股票代號抽出來，回傳 (樣板 key, 代號)；無代號時代號為 None。"""
+    parts = urlsplit(url)
+    params = [(k, v) for k, v in parse_qsl(parts.query) if k not in IGNORED_PARAMS]
+    symbol = None
+    path = parts.path
+    if parts.netloc == "api.fugle.tw" and "/stock/" in path:
+        head, _, symbol = path.rpartition("/")
+        path = head + "/{symbol}"
+    else:
+        for i, (k, v) in enumerate(params):
+            if k in SYMBOL_PARAMS and v:
+                symbol = v
+                params[i] = (k, "{symbol}")
+    return f"{method.upper()} {parts.netloc}{path}?{urlencode(sorted(params))}", symbol
+
+def _sanitize(url):
+    # 帳密類參數不落地
+    parts = urlsplit(url)
+    params = [(k, v) for k, v in parse_qsl(parts.query, keep_blank_values=True) if k not in SECRET_PARAMS]
+    return parts._replace(query=urlencode(params)).geturl()
+
+def _record_path(record_dir, key):
+    host = key.split(" ", 1)[1].split("/", 1)[0]
+    digest = hashlib.sha1(key.encode("utf-8")).hexdigest()[:16]
+    return os.path.join(record_dir, host, f"{digest}.json")
+
+
+# --- 1. 給 requests 的掛勾 (stock_logic 的 Session.request 補丁會呼叫) ---
+def redirect_url(url):
+    if not REPLAY_URL: return url
+    parts = urlsplit(url)
+    if parts.netloc not in API_HOSTS: return url
+    rest = parts.path + (f"?{parts.query}" if parts.query else "")
+    return f"{REPLAY_URL}/{parts.netloc}{rest}"
+
+def maybe_record(method, url, response):
+    if not RECORD_DIR or urlsplit(url).netloc not in API_HOSTS: return
+    if response.status_code != 200: return
+    key = request_key(method, url)
+    path = _record_path(RECORD_DIR, key)
+    record = {
+        "key": key, "url": _sanitize(url), "status": response.status_code,
+        "content_type": response.headers.get("Content-Type", "application/json"),
+        "body": response.text, "recorded_at": time.time(),
+    }
+    with _record_lock:
+        os.makedirs(os.path.dirname(path), exist_ok=True)
+        with open(path, "w", encoding="utf-8") as f:
+            json.dump(record, f, ensure_ascii=False)
+
+
+# --- 2. 替身伺服器 ---
+class RecordingLibrary:
+    def __init__(self, record_dir):
+        self.exact = {}
+        self.by_template = {}
+        for root, _, files in os.walk(record_dir):
+            for name in files:
+                if not name.endswith(".json"): continue
+                with open(os.path.join(root, name), "r", encoding="utf-8") as f:
+                    rec = json.load(f)
+                method = rec["key"].split(" ", 1)[0]
+                self.exact[rec["key"]] = rec
+                tpl, symbol = template_key(method, rec["url"])
+                if symbol: self.by_template.setdefault(tpl, []).append((symbol, rec))
+        for recs in self.by_template.values(): recs.sort(key=lambda r: r[0])
+
+    def lookup(self, method, url):
+        """
+        先找完全相同的請求；找不到時把未錄過的代號對應到同類已錄的代號
+        (依代號雜湊固定挑選)，讓 10 檔的錄音也能撐 1000 檔的壓測。
+        """
+        rec = self.exact.get(request_key(method, url))
+        if rec is not None: return rec, None
+        tpl, symbol = template_key(method, url)
+        recs = self.by_template.get(tpl)
+        if not recs or symbol is None: return None, None
+        src_symbol, rec = recs[int(hashlib.md5(symbol.encode()).hexdigest(), 16) % len(recs)]
+        return rec, (src_symbol, symbol)
+
+
+class TokenBucket:
+    def __init__(self, rate):
+        self.rate = rate
+        self.tokens = rate
+        self.updated = time.monotonic()
+        self.lock = threading.Lock()
+
+    def take(self):
+        with self.lock:
+            now = time.monotonic()
+            self.tokens = min(self.rate, self.tokens + (now - self.updated) * self.rate)
+            self.updated = now
+            if self.tokens < 1: return False
+            self.tokens -= 1
+            return True
+
+
+class ReplayHandler(BaseHTTPRequestHandler):
+    server_version = "StockReplay/1.0"
+
+    def log_message(self, format, *args):
+        if self.server.verbose: super().log_message(format, *args)
+
+    def _send(self, status, body, content_type="application/json"):
+        data = body.encode("utf-8")
+        self.send_response(status)
+        self.send_header("Content-Type", content_type)
+        self.send_header("Content-Length", str(len(data)))
+        self.end_headers()
+        self.wfile.write(data)
+
+    def do_GET(self):
+        self._handle("GET")
+
+    def do_POST(self):
+        self._handle("POST")
+
+    def _handle(self, method):
+        srv = self.server
+        if self.path == "/__stats":
+            with srv.stats_lock: stats = dict(srv.stats)
+            return self._send(200, json.dumps(stats))
+
+        host, _, rest = self.path.lstrip("/").partition("/")
+        url = f"https://{host}/{rest}"
+        srv.count("requests")
+
+        if srv.latency > 0 or srv.jitter > 0:
+            time.sleep(max(0.0, random.gauss(srv.latency, srv.jitter)))
+
+        bucket = srv.buckets.get(host)
+        if bucket is not None and not bucket.take():
+            srv.count("rate_limited")
+            # FinMind 超量回 402，Fugle 回 429，模擬兩邊真實行為
+            if "finmind" in host:
+                return self._send(402, json.dumps({"msg": "Requests reach the upper limit.", "status": 402}))
+            return self._send(429, json.dumps({"statusCode": 429, "message": "Rate limit exceeded"}))
+
+        if srv.error_rate > 0 and random.random() < srv.error_rate:
+            srv.count("injected_errors")
+            return self._send(500, json.dumps({"message": "Injected error"}))
+
+        rec, swap = srv.library.lookup(method, url)
+        if rec is None:
+            if host == "api.web.finmindtrade.com":
+                return self._send(200, json.dumps({"user_count": 0, "api_request_limit": 600}))
+            srv.count("misses")
+            return self._send(404, json.dumps({"message": f"No recording for {url}"}))
+
+        body = rec["body"]
+        if swap:
+            src, dst = swap
+            body = body.replace(f'"{src}"', f'"{dst}"')
+            srv.count("fanout_hits")
+        else:
+            srv.count("hits")
+        self._send(rec.get("status", 200), body, rec.get("content_type", "application/json"))
+
+
+class ReplayServer(ThreadingHTTPServer):
+    daemon_threads = True
+
+    def __init__(self, addr, library, latency=0.0, jitter=0.0, error_rate=0.0, rate_limits=None, verbose=False):
+        super().__init__(addr, ReplayHandler)
+        self.library = library
+        self.latency = latency
+        self.jitter = jitter
+        self.error_rate = error_rate
+        self.buckets = {host: TokenBucket(rate) for host, rate in (rate_limits or {}).items() if rate}
+        self.verbose = verbose
+        self.stats = {}
+        self.stats_lock = threading.Lock()
+
+    def count(self, name):
+        with self.stats_lock:
+            self.stats[name] = self.stats.get(name, 0) + 1
+
+
+# --- 3. 壓測：對替身伺服器跑完整掃描流程 ---
+def run_bench(symbols, workers, api_key="replay"):
+    from concurrent.futures import ThreadPoolExecutor
+    import market_data
+    import stock_logic
+
+    def scan(symbol):
+        t0 = time.perf_counter()
+        df = market_data.fetch_historical_candles(symbol, api_key)
+        quote = market_data.fetch_quote(symbol, api_key)
+        if df is None or len(df) < 30: return "no_data", time.perf_counter() - t0
+        df_final = stock_logic.calculate_indicators(df, symbol)
+        stock_logic.analyze_strategy(df_final)
+        return ("ok" if quote else "no_quote"), time.perf_counter() - t0
+
+    t0 = time.perf_counter()
+    with ThreadPoolExecutor(max_workers=workers) as pool:
+        results = list(pool.map(scan, symbols))
+    elapsed = time.perf_counter() - t0
+
+    latencies = sorted(r[1] for r in results)
+    outcome = {}
+    for status, _ in results: outcome[status] = outcome.get(status, 0) + 1
+    p50 = latencies[len(latencies) // 2]
+    p95 = latencies[min(len(latencies) - 1, int(len(latencies) * 0.95))]
+    print(f"📊 {len(symbols)} 檔 / {workers} 執行緒：總耗時 {elapsed:.2f}s，{len(symbols) / elapsed:.1f} 檔/秒")
+    print(f"   單檔 p50 {p50 * 1000:.0f}ms，p95 {p95 * 1000:.0f}ms，結果 {outcome}")
+
+
+if __name__ == "__main__":
+    parser = argparse.ArgumentParser(description="Fugle / FinMind 離線替身伺服器")
+    sub = parser.add_subparsers(dest="cmd", required=True)
+
+    p_serve = sub.add_parser("serve", help="啟動重播伺服器")
+    p_serve.add_argument("--dir", default=RECORD_DIR or DEFAULT_RECORD_DIR)
+    p_serve.add_argument("--host", default="127.0.0.1")
+    p_serve.add_argument("--port", type=int, default=8765)
+    p_serve.add_argument("--latency", type=float, default=0.0, help="平均延遲 (秒)")
+    p_serve.add_argument("--jitter", type=float, default=0.0, help="延遲標準差 (秒)")
+    p_serve.add_argument("--error-rate", type=float, default=0.0, help="隨機 500 錯誤比例 (0~1)")
+    p_serve.add_argument("--fugle-rps", type=float, default=0.0, help="Fugle 每秒請求上限，超過回 429")
+    p_serve.add_argument("--finmind-rps", type=float, default=0.0, help="FinMind 每秒請求上限，超過回 402")
+    p_serve.add_argument("--verbose", action="store_true")
+
+    p_bench = sub.add_parser("bench", help="對重播伺服器跑掃描壓測 (需先設定 API_REPLAY_URL)")
+    p_bench.add_argument("--symbols", type=int, default=900, help="合成代號數量 (會對應到已錄製的股票)")
+    p_bench.add_argument("--workers", type=int, default=8)
+    p_bench.add_argument("--watchlist", default="watchlist.json", help="真實代號來源，合成代號接在其後")
+
+    args = parser.parse_args()
+    if args.cmd == "serve":
+        library = RecordingLibrary(args.dir)
+        rate_limits = {"api.fugle.tw": args.fugle_rps, "api.finmindtrade.com": args.finmind_rps}
+        server = ReplayServer((args.host, args.port), library, args.latency, args.jitter,
+                              args.error_rate, rate_limits, args.verbose)
+        print(f"🎬 載入 {len(library.exact)} 筆錄音，監聽 http://{args.host}:{args.port}")
+        print(f"   請設定 API_REPLAY_URL=http://{args.host}:{args.port}")
+        try: server.serve_forever()
+        except KeyboardInterrupt: pass
+    else:
+        if not REPLAY_URL:
+            print("❌ 請先設定 API_REPLAY_URL，避免壓測打到真實 API。")
+            raise SystemExit(1)
+        base = []
+        if os.path.exists(args.watchlist):
+            with open(args.watchlist, "r", encoding="utf-8") as f: base = json.load(f)
+        synthetic = [f"9{i:04d}" for i in range(max(0, args.symbols - len(base)))]
+        run_bench((base + synthetic)[:args.symbols], args.workers)
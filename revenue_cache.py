@@ -0,0 +1,104 @@
+import os
+import threading
+import datetime
+import pandas as pd
+import pytz
+
+# --- 🔥 月營收快取 (依公布時程失效) ---
+# 上市櫃公司須在每月 10 日前公布上個月營收，所以一檔股票拿到「上個月」的營收後，
+# 到下個月 1 日之前都不用再問 FinMind；公布期間內還沒拿到就每天最多檢查一次。
+# YoY 在寫入快取時算好，get_real_chip_data 直接使用。
+REVENUE_CACHE_DIR = os.path.join(".cache", "revenue")
+REVENUE_LOOKBACK_DAYS = 400   # 計算 YoY 需要往前多抓的天數
+
+_lock = threading.Lock()
+_symbol_locks = {}
+_memory = {}   # symbol -> (mtime, entry)
+
+
+def _path(symbol):
+    return os.path.join(REVENUE_CACHE_DIR, f"{symbol}.pkl")
+
+def _today():
+    return datetime.datetime.now(pytz.timezone('Asia/Taipei')).date()
+
+def latest_published_month(today=None):
+    """目前最多可能已公布到哪個月份的營收 (上個月)。"""
+    return pd.Period(today or _today(), freq='M') - 1
+
+def _latest_month(revenue):
+    if 'revenue_year' in revenue.columns and 'revenue_month' in revenue.columns:
+        last = revenue.iloc[-1]
+        return pd.Period(year=int(last['revenue_year']), month=int(last['revenue_month']), freq='M')
+    # FinMind 的 date 是次月 1 日
+    return pd.Period(revenue['date'].iloc[-1], freq='M') - 1
+
+def needs_refresh(entry, start, today=None):
+    today = today or _today()
+    if entry is None: return True
+    if pd.Timestamp(start) < entry["start"]: return True
+    if entry["latest_month"] is not None and entry["latest_month"] >= latest_published_month(today):
+        return False
+    # 新的一期還沒拿到：每天最多檢查一次
+    return entry["checked_on"] < today
+
+
+def _prepare(revenue):
+    revenue = revenue.copy()
+    revenue['date'] = pd.to_datetime(revenue['date'])
+    revenue = revenue.sort_values('date').reset_index(drop=True)
+    if 'revenue_year_growth_rate' not in revenue.columns:
+        revenue['revenue'] = pd.to_numeric(revenue['revenue'], errors='coerce')
+        revenue['revenue_year_growth_rate'] = revenue['revenue'].pct_change(periods=12) * 100
+    return revenue
+
+def _load(symbol):
+    path = _path(symbol)
+    if not os.path.exists(path): return None
+    mtime = os.path.getmtime(path)
+    cached = _memory.get(symbol)
+    if cached is None or cached[0] != mtime:
+        try:
+            cached = _memory[symbol] = (mtime, pd.read_pickle(path))
+        except Exception as e:
+            print(f"⚠️ 讀取營收快取失敗 {symbol}: {e}")
+            return None
+    return cached[1]
+
+def _save(symbol, entry):
+    os.makedirs(REVENUE_CACHE_DIR, exist_ok=True)
+    pd.to_pickle(entry, _path(symbol) + ".tmp")
+    os.replace(_path(symbol) + ".tmp", _path(symbol))
+    _memory.pop(symbol, None)
+
+
+def get_revenue(symbol, start, dl):
+    """
+    回傳含 revenue_year_growth_rate 的月營收表 (涵蓋 start 往前 400 天)。
+    只有在新一期營收可能已公布、而快取還沒有時才呼叫 FinMind。
+    """
+    with _lock:
+        symbol_lock = _symbol_locks.setdefault(symbol, threading.Lock())
+
+    with symbol_lock:
+        entry = _load(symbol)
+        if not needs_refresh(entry, start):
+            return entry["revenue"]
+
+        fetch_start = pd.Timestamp(start) - pd.Timedelta(days=REVENUE_LOOKBACK_DAYS)
+        if entry is not None: fetch_start = min(fetch_start, entry["start"])
+        try:
+            revenue = dl.taiwan_stock_month_revenue(stock_id=symbol, start_date=fetch_start.strftime('%Y-%m-%d'))
+        except Exception as e:
+            print(f"❌ 月營收抓取失敗 {symbol}: {e}")
+            return entry["revenue"] if entry else None
+
+        if revenue is None or revenue.empty:
+            revenue = entry["revenue"] if entry else revenue
+            latest = entry["latest_month"] if entry else None
+        else:
+            revenue = _prepare(revenue)
+            latest = _latest_month(revenue)
+
+        _save(symbol, {"revenue": revenue, "start": fetch_start, "latest_month": latest, "checked_on": _today()})
+        return revenue
@@ -0,0 +1,196 @@
+import threading
+import numpy as np
+import pandas as pd
+import trigger_prices
+
+# --- 🔥 關注清單風險矩陣 (滾動相關係數 / 共變異數，逐根 K 棒增量更新) ---
+# 視窗內保留最近 RISK_WINDOW 根日報酬，另外維護 Σr 與 Σ r·rᵀ；
+# 新 K 棒進來只做一次外積加減 (O(N²))，不必每次從整段歷史重算 N×N 矩陣。
+RISK_WINDOW = 60          # 滾動視窗 (交易日)
+MIN_OBSERVATIONS = 20     # 視窗內有效報酬少於此數的股票，相關係數視為未知
+VAR_Z = 1.645             # 單日 95% 風險值
+SHARES_PER_LOT = 1000     # 1 張 = 1000 股
+STALE_SESSIONS = 3        # 最後定案 K 棒落後最新交易日超過此數 (停牌、下市) 的股票不再等它
+
+
+class RollingCovariance:
+    """固定視窗的報酬共變異數；缺資料 (停牌、尚未上市) 當作 0 報酬並另計有效筆數。"""
+
+    def __init__(self, symbols, window=RISK_WINDOW):
+        self.symbols = list(symbols)
+        self.window = window
+        n = len(self.symbols)
+        self._buf = np.zeros((window, n))
+        self._valid = np.zeros((window, n), dtype=bool)
+        self._sum = np.zeros(n)
+        self._outer = np.zeros((n, n))
+        self._nobs = np.zeros(n, dtype=int)
+        self._count = 0
+        self._pos = 0
+        self._updates = 0
+        self.last_date = None
+
+    def push(self, returns, date=None):
+        r = np.asarray(returns, dtype=float)
+        valid = np.isfinite(r)
+        r = np.where(valid, r, 0.0)
+        if self._count == self.window:
+            old = self._buf[self._pos]
+            self._sum -= old
+            self._outer -= np.outer(old, old)
+            self._nobs -= self._valid[self._pos]
+        else:
+            self._count += 1
+        self._buf[self._pos] = r
+        self._valid[self._pos] = valid
+        self._sum += r
+        self._outer += np.outer(r, r)
+        self._nobs += valid
+        self._pos = (self._pos + 1) % self.window
+        # 加減累積的浮點誤差，每滾完一輪視窗從緩衝區重算一次
+        self._updates += 1
+        if self._updates % self.window == 0: self._resync()
+        if date is not None: self.last_date = date
+
+    def _resync(self):
+        rows = self._buf[:self._count]
+        self._sum = rows.sum(axis=0)
+        self._outer = rows.T @ rows
+
+    def cov(self):
+        m = self._count
+        if m < 2: return None
+        mean = self._sum / m
+        return (self._outer - m * np.outer(mean, mean)) / (m - 1)
+
+    def corr(self):
+        c = self.cov()
+        if c is None: return None
+        sd = np.sqrt(np.clip(np.diag(c), 0, None))
+        with np.errstate(divide="ignore", invalid="ignore"):
+            corr = c / np.outer(sd, sd)
+        known = (self._nobs >= MIN_OBSERVATIONS) & (sd > 0)
+        corr[~known, :] = np.nan
+        corr[:, ~known] = np.nan
+        np.fill_diagonal(corr, 1.0)
+        return np.clip(corr, -1.0, 1.0)
+
+    def corr_frame(self):
+        corr = self.corr()
+        if corr is None: return None
+        return pd.DataFrame(corr, index=self.symbols, columns=self.symbols)
+
+
+class RiskTracker:
+    """全行程共用的滾動矩陣；股票組合不變時只推進新收盤的交易日。"""
+
+    def __init__(self, window=RISK_WINDOW):
+        self.window = window
+        self.state = None
+        self.stale = {}           # 代號 -> 最後定案日 (停牌 / 下市，以缺資料計入)
+        self._lock = threading.Lock()
+
+    def update(self, candles):
+        """
+        candles: {代號: 日K DataFrame}；只使用已收盤定案的 K 棒。
+        只推進到「每一檔都已有定案 K 棒」的日期，資料層各檔更新時間不同時，
+        晚到的那一檔不會被當成缺資料寫進視窗；落後超過 STALE_SESSIONS 個交易日的股票
+        (停牌、下市) 不再等它，之後的日期以缺資料 (NaN) 計入，並列在 self.stale。
+        """
+        closes = {}
+        for s, df in candles.items():
+            if df is None or not len(df): continue
+            close = trigger_prices.completed_bars(df)['Close']
+            if len(close) > 1: closes[s] = close
+        symbols = sorted(closes)
+        if not symbols: return None
+        # 以所有股票出現過的日期當交易日序列，算各檔最後定案日落後幾個交易日
+        sessions = pd.DatetimeIndex(sorted(set().union(*(closes[s].index for s in symbols))))
+        lag = {s: len(sessions) - 1 - sessions.get_loc(closes[s].index[-1]) for s in symbols}
+        stale = {s: closes[s].index[-1] for s in symbols if lag[s] > STALE_SESSIONS}
+        frontier = min(closes[s].index[-1] for s in symbols if s not in stale)
+        with self._lock:
+            self.stale = stale
+            state = self.state
+            rebuild = state is None or state.symbols != symbols
+            start = None if rebuild else state.last_date
+            if start is not None and frontier <= start: return state
+            # 各檔在自己的序列上算報酬；停牌 / 尚未上市的日期為 NaN，push 時視為缺資料 (不當成 0 報酬)
+            returns = pd.DataFrame({
+                s: closes[s].pct_change(fill_method=None).loc[:frontier] * 100 for s in symbols
+            }).sort_index()
+            returns = returns.iloc[-self.window:] if start is None else returns.loc[returns.index > start]
+            if rebuild: state = RollingCovariance(symbols, self.window)
+            for date, row in returns.iterrows():
+                state.push(row.to_numpy(), date)
+            self.state = state
+            return state
+
+    def top_pairs(self, k=20):
+        """相關係數最高的 k 組股票。"""
+        state = self.state
+        corr = state.corr() if state else None
+        if corr is None or len(state.symbols) < 2: return pd.DataFrame(columns=["股票A", "股票B", "相關係數"])
+        i, j = np.triu_indices(len(state.symbols), k=1)
+        values = corr[i, j]
+        ok = np.isfinite(values)
+        i, j, values = i[ok], j[ok], values[ok]
+        if len(values) > k:
+            top = np.argpartition(-values, k)[:k]
+            i, j, values = i[top], j[top], values[top]
+        order = np.argsort(-values)
+        syms = np.array(state.symbols)
+        return pd.DataFrame({"股票A": syms[i[order]], "股票B": syms[j[order]], "相關係數": values[order]})
+
+
+def portfolio_risk(holdings, quotes, state):
+    """
+    holdings: {代號: 張數}；quotes: {代號: {"price", "atr", "stop_loss"}}。
+    回傳 (各部位明細 DataFrame, 總計 dict)。相關係數未知時以 1 計 (保守)。
+    """
+    rows = []
+    for symbol, lots in holdings.items():
+        q = quotes.get(symbol) or {}
+        price = q.get("price") or np.nan
+        atr = q.get("atr")
+        stop = q.get("stop_loss")
+        shares = lots * SHARES_PER_LOT
+        rows.append({
+            "代號": symbol, "張數": lots, "現價": price, "市值": shares * price,
+            "ATR": atr if atr is not None else np.nan,
+            "ATR風險": shares * atr if atr is not None else np.nan,
+            "停損價": stop if stop is not None else np.nan,
+            "停損風險": shares * max(price - stop, 0) if stop is not None else np.nan,
+        })
+    df = pd.DataFrame(rows, columns=["代號", "張數", "現價", "市值", "ATR", "ATR風險", "停損價", "停損風險"])
+    if df.empty: return df, {}
+
+    symbols = df["代號"].tolist()
+    corr = np.ones((len(symbols), len(symbols)))
+    cov = None
+    if state is not None:
+        pos = {s: k for k, s in enumerate(state.symbols)}
+        idx = [pos.get(s) for s in symbols]
+        full_corr, full_cov = state.corr(), state.cov()
+        if full_corr is not None:
+            for a, ia in enumerate(idx):
+                for b, ib in enumerate(idx):
+                    if ia is not None and ib is not None and np.isfinite(full_corr[ia, ib]):
+                        corr[a, b] = full_corr[ia, ib]
+            if all(i is not None for i in idx): cov = full_cov[np.ix_(idx, idx)]
+
+    atr_risk = df["ATR風險"].fillna(0).to_numpy()
+    value = df["市值"].fillna(0).to_numpy()
+    totals = {
+        "market_value": float(value.sum()),
+        "stop_risk": float(df["停損風險"].fillna(0).sum()),
+        "atr_risk_sum": float(atr_risk.sum()),
+        # 考慮相關性後的 ATR 風險：sqrt(aᵀ C a)
+        "atr_risk": float(np.sqrt(max(atr_risk @ corr @ atr_risk, 0))),
+        # 報酬以 % 計，共變異數換算回金額要除以 100²
+        "var_95": float(VAR_Z * np.sqrt(max(value @ cov @ value, 0)) / 100) if cov is not None else None,
+    }
+    return df, totals
+
+
+tracker = RiskTracker()
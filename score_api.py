@@ -0,0 +1,182 @@
+import os
+import json
+import time
+import argparse
+import datetime
+import threading
+from http.server import ThreadingHTTPServer, BaseHTTPRequestHandler
+import numpy as np
+import signal_ledger
+import stock_logic
+import watchlist
+
+# --- 🔥 唯讀評分 API (背景預先計算，請求路徑只讀快取) ---
+# GET /scores            全部股票
+# GET /scores/<代號>     單一股票
+# GET /health            快取狀態
+# 請求處理只回傳預先序列化好的 JSON，不會碰 Fugle / FinMind。
+SCORES_FILE = os.path.join(".cache", "scores.json")
+REFRESH_SEC = 300
+
+
+def _json_default(o):
+    if isinstance(o, (np.integer,)): return int(o)
+    if isinstance(o, (np.floating,)): return None if np.isnan(o) else float(o)
+    return str(o)
+
+def compute_symbol_score(symbol, api_key, threshold=watchlist.DEFAULT_THRESHOLD):
+    """戰情計算 (與戰情總覽、預熱共用 watchlist.analyze_watch_symbol 的快取)，回傳可序列化的 dict。"""
+    r = watchlist.analyze_watch_symbol(symbol, api_key, threshold)
+    if r["bar_date"] is None: return None
+    real = r["raw_real"]
+    bt = r["backtest"]
+    return {
+        "symbol": symbol,
+        "name": r["name"],
+        "price": float(r["price"]),
+        "change": r["change"] if real else None,
+        "change_percent": r["pct"] if real else None,
+        "bar_date": r["bar_date"],
+        "score": int(r["score"]),
+        "decision": r["signal"],
+        "stop_loss": r["stop_loss"],
+        "short_signals": r["short_signals"],
+        "score_details": [{"rule": rule, "points": p} for rule, p in r["score_details"]],
+        "backtest": {"threshold": threshold, "days": bt["days"], "trades": bt["trades"], "win_rate_5d": bt["win_rate"],
+                     "win_rate_ci": [bt["win_lo"], bt["win_hi"]], "mean_return_5d": bt["mean"],
+                     "mean_return_ci": [bt["mean_lo"], bt["mean_hi"]], "low_confidence": bt["low_confidence"]},
+    }
+
+
+class ScoreSnapshot:
+    """預先序列化的回應內容；更新時整份替換，讀取不需要上鎖。"""
+
+    def __init__(self, path=SCORES_FILE):
+        self.path = path
+        self.generated_at = None
+        self.by_symbol = {}        # symbol -> bytes
+        self.all_bytes = b'{"generated_at": null, "scores": []}'
+        self.health_bytes = b'{}'
+        self._load()
+
+    def _load(self):
+        if not os.path.exists(self.path): return
+        try:
+            with open(self.path, "r", encoding="utf-8") as f:
+                payload = json.load(f)
+            # 評分定義改過的舊快取不再提供，等背景重新計算
+            if payload.get("scoring_version") != stock_logic.SCORING_VERSION: return
+            self._publish(payload)
+        except Exception as e:
+            print(f"⚠️ 讀取評分快取失敗: {e}")
+
+    def _publish(self, payload):
+        by_symbol = {
+            s["symbol"]: json.dumps(dict(s, generated_at=payload["generated_at"]), ensure_ascii=False, default=_json_default).encode("utf-8")
+            for s in payload["scores"]
+        }
+        all_bytes = json.dumps(payload, ensure_ascii=False, default=_json_default).encode("utf-8")
+        self.by_symbol, self.all_bytes = by_symbol, all_bytes
+        self.generated_at = payload["generated_at"]
+        self.health_bytes = json.dumps({
+            "generated_at": self.generated_at, "symbols": len(by_symbol),
+            "errors": payload.get("errors", []),
+        }).encode("utf-8")
+
+    def update(self, scores, errors):
+        payload = {
+            "generated_at": datetime.datetime.now().astimezone().isoformat(timespec="seconds"),
+            "scores": sorted(scores, key=lambda s: s["score"], reverse=True),
+            "errors": errors,
+            "scoring_version": stock_logic.SCORING_VERSION,
+        }
+        self._publish(payload)
+        os.makedirs(os.path.dirname(self.path), exist_ok=True)
+        with open(self.path + ".tmp", "w", encoding="utf-8") as f:
+            json.dump(payload, f, ensure_ascii=False, default=_json_default)
+        os.replace(self.path + ".tmp", self.path)
+
+
+def refresh_scores(snapshot, api_key, threshold=watchlist.DEFAULT_THRESHOLD, symbols=None):
+    t0 = time.time()
+    scores, errors = [], []
+    for symbol in symbols or watchlist.load_watchlist():
+        try:
+            result = compute_symbol_score(symbol, api_key, threshold)
+            if result: scores.append(result)
+            else: errors.append(symbol)
+        except Exception as e:
+            print(f"Error scoring {symbol}: {e}")
+            errors.append(symbol)
+    snapshot.update(scores, errors)
+    signal_ledger.ledger.maybe_compact()
+    print(f"✅ 評分更新完成：{len(scores)} 檔，{time.time() - t0:.1f}s")
+
+def start_refresher(snapshot, api_key, interval=REFRESH_SEC, threshold=watchlist.DEFAULT_THRESHOLD):
+    def loop():
+        while True:
+            try: refresh_scores(snapshot, api_key, threshold)
+            except Exception as e: print(f"❌ 評分更新失敗: {e}")
+            time.sleep(interval)
+    t = threading.Thread(target=loop, name="score-refresher", daemon=True)
+    t.start()
+    return t
+
+
+class ScoreHandler(BaseHTTPRequestHandler):
+    protocol_version = "HTTP/1.1"   # keep-alive，減少連線成本
+    disable_nagle_algorithm = True  # 標頭與內容分兩次寫出，避免 Nagle 造成 40ms 延遲
+    server_version = "StockScoreAPI/1.0"
+
+    def log_message(self, format, *args):
+        pass
+
+    def _send(self, status, body):
+        self.send_response(status)
+        self.send_header("Content-Type", "application/json; charset=utf-8")
+        self.send_header("Content-Length", str(len(body)))
+        self.send_header("Cache-Control", "max-age=30")
+        self.end_headers()
+        self.wfile.write(body)
+
+    def do_GET(self):
+        snap = self.server.snapshot
+        path = self.path.split("?", 1)[0].rstrip("/")
+        if path == "/scores":
+            return self._send(200, snap.all_bytes)
+        if path.startswith("/scores/"):
+            body = snap.by_symbol.get(path[len("/scores/"):])
+            if body is None: return self._send(404, b'{"error": "symbol not found"}')
+            return self._send(200, body)
+        if path == "/health":
+            return self._send(200, snap.health_bytes)
+        self._send(404, b'{"error": "not found"}')
+
+
+class ScoreServer(ThreadingHTTPServer):
+    daemon_threads = True
+
+    def __init__(self, addr, snapshot):
+        super().__init__(addr, ScoreHandler)
+        self.snapshot = snapshot
+
+
+if __name__ == "__main__":
+    parser = argparse.ArgumentParser(description="戰情總覽評分 JSON API")
+    parser.add_argument("--host", default="127.0.0.1")
+    parser.add_argument("--port", type=int, default=8780)
+    parser.add_argument("--refresh", type=int, default=REFRESH_SEC, help="背景重新計算間隔 (秒)")
+    parser.add_argument("--threshold", type=int, default=watchlist.DEFAULT_THRESHOLD, help="回測買進門檻 (分)")
+    args = parser.parse_args()
+
+    api_key = watchlist.get_secret("FUGLE_API_KEY")
+    if not api_key:
+        print("❌ 錯誤：找不到 FUGLE_API_KEY。")
+        raise SystemExit(1)
+
+    snapshot = ScoreSnapshot()
+    start_refresher(snapshot, api_key, args.refresh, args.threshold)
+    server = ScoreServer((args.host, args.port), snapshot)
+    print(f"🚀 評分 API 啟動：http://{args.host}:{args.port}/scores")
+    try: server.serve_forever()
+    except KeyboardInterrupt: pass
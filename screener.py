@@ -0,0 +1,246 @@
+import os
+import json
+import time
+import argparse
+import threading
+import numpy as np
+import pandas as pd
+import chip_store
+import data_layer
+import stock_logic
+
+# --- 🔥 選股篩選 (全市場最新一根日K 的指標 / 評分快照，欄式查詢) ---
+# 每檔一列、每個指標一欄 (以代號為 index)；篩選條件交給 DataFrame.query 一次向量化算完，
+# 全市場 (~2000 檔) 一次查詢只要幾毫秒。中文別名欄 (投信連三買、位階…) 與各評分規則
+# (低檔金叉、KD金叉…) 在載入快照時就先算好，查詢時不再逐檔判斷。
+SCREENER_DIR = os.path.join(".cache", "screener")
+SNAPSHOT_FILE = os.path.join(SCREENER_DIR, "snapshot.pkl")
+SCREENS_FILE = "screens.json"
+SAVE_INTERVAL = 60       # 盤中暫存的列最多多久寫回磁碟一次 (秒)
+BUILD_BATCH = 50         # 全市場重建時每批並行抓取的檔數
+
+NUMERIC_COLUMNS = [
+    "Close", "Pct", "Volume", "Vol_Ratio", "MA5", "MA20", "MA60", "K", "D", "RSI", "MACD_Hist",
+    "ADX", "BIAS_20", "Price_Position", "Margin_Util_Rate", "Trust_Net", "Foreign_Net",
+    "Trust_Streak", "Foreign_Streak", "Revenue_YoY", "Score",
+]
+
+# 中文別名：數值欄直接對應，條件欄為預先算好的布林欄
+NUMERIC_ALIASES = {
+    "收盤": "Close", "漲跌幅": "Pct", "成交張數": "Volume", "量比": "Vol_Ratio",
+    "位階": "Price_Position", "乖離": "BIAS_20", "融資使用率": "Margin_Util_Rate",
+    "投信買超": "Trust_Net", "外資買超": "Foreign_Net", "營收年增": "Revenue_YoY", "分數": "Score",
+}
+CONDITION_ALIASES = {
+    "投信連三買": "Trust_Streak >= 3",
+    "外資連三買": "Foreign_Streak >= 3",
+    "站上季線": "Close > MA60",
+    "多頭排列": "MA5 > MA20 and MA20 > MA60",
+    "低位階": "Price_Position < 20",
+    "高位階": "Price_Position > 85",
+    "爆量": "Vol_Ratio > 2",
+}
+
+# analyze_strategy (日線) 會產生的規則名稱；沒有任何一檔觸發時也保留欄位，條件才不會找不到名稱
+SCORE_RULES = [
+    "營收成長", "營收衰退", "站上月線", "跌破月線", "月線下彎", "低檔金叉", "均線金叉", "跌破季線",
+    "空頭排列", "爆量長黑", "空頭吞噬", "KD金叉", "KD死叉", "MACD翻紅", "唐奇安突破", "布林突破",
+    "籌碼對立", "融資爆表", "融資警戒", "投信建倉", "投信護盤", "投信連買", "投信起漲", "投信試單",
+    "投信延續", "投信大賣", "投信調節", "散戶接刀", "OBV偏多", "盤整修正", "ADX加速",
+    "乖離極大", "乖離過大", "乖離警戒", "負乖離",
+]
+
+DEFAULT_SCREENS = {
+    "低檔投信連買": "K < 20 and 投信連三買 and 位階 < 20",
+    "強勢多頭": "多頭排列 and 站上月線 and 分數 >= 6",
+    "爆量突破": "爆量 and 唐奇安突破",
+    "營收成長低位階": "營收年增 > 20 and 低位階",
+}
+
+
+def _streak(values):
+    """從最後一天往回數，連續大於 0 的天數。"""
+    positive = np.asarray(values, dtype=float) > 0
+    if not positive.any() or not positive[-1]: return 0
+    if positive.all(): return len(positive)
+    return int(np.argmin(positive[::-1]))
+
+def snapshot_row(symbol, df_final, logic_res, name=None):
+    """calculate_indicators / analyze_strategy 的結果壓成一列。"""
+    curr = df_final.iloc[-1]
+    prev_close = df_final['Close'].iloc[-2] if len(df_final) > 1 else np.nan
+    row = {"symbol": symbol, "name": name or symbol, "date": df_final.index[-1], "decision": logic_res["decision"]}
+    for col in NUMERIC_COLUMNS:
+        value = curr.get(col)
+        row[col] = float(value) if value is not None and pd.notna(value) else np.nan
+    row["Pct"] = (curr['Close'] / prev_close - 1) * 100 if prev_close else np.nan
+    row["Volume"] = curr['Volume'] / 1000
+    vol_ma5 = curr.get('Vol_MA5')
+    row["Vol_Ratio"] = curr['Volume'] / vol_ma5 if vol_ma5 is not None and pd.notna(vol_ma5) and vol_ma5 > 0 else np.nan
+    row["Trust_Streak"] = _streak(df_final['Trust_Net'].iloc[-20:]) if 'Trust_Net' in df_final else 0
+    row["Foreign_Streak"] = _streak(df_final['Foreign_Net'].iloc[-20:]) if 'Foreign_Net' in df_final else 0
+    row["Score"] = logic_res["score"]
+    row["rules"] = [rule for rule, _ in logic_res["score_details"]]
+    return row
+
+
+def _columnar(rows):
+    """列資料 -> 以代號為 index 的欄式表，並展開規則與別名欄。"""
+    df = pd.DataFrame(rows).drop_duplicates("symbol", keep="last").set_index("symbol").sort_index()
+    rules = SCORE_RULES + sorted({r for fired in df["rules"] for r in fired} - set(SCORE_RULES))
+    for rule in rules:
+        df[rule] = [rule in fired for fired in df["rules"]]
+    for alias, col in NUMERIC_ALIASES.items():
+        df[alias] = df[col]
+    for alias, expr in CONDITION_ALIASES.items():
+        if alias not in df: df[alias] = df.eval(expr).fillna(False).astype(bool)
+    return df
+
+
+class ScreenerSnapshot:
+    """
+    全市場快照；其他行程 (CLI 重建) 寫入後依 mtime 自動重新載入。
+    盤中單檔更新先暫存，查詢時才併入，定期寫回磁碟。
+    """
+
+    def __init__(self, path=SNAPSHOT_FILE):
+        self.path = path
+        self._rows = {}        # symbol -> row (原始列，重建欄式表用)
+        self._frame = None
+        self._mtime = None
+        self._pending = {}
+        self._saved_at = 0
+        self._lock = threading.Lock()
+
+    def _reload(self):
+        mtime = os.path.getmtime(self.path) if os.path.exists(self.path) else None
+        if mtime == self._mtime: return
+        try:
+            rows = pd.read_pickle(self.path) if mtime else {}
+        except Exception as e:
+            print(f"⚠️ 讀取選股快照失敗: {e}")
+            rows = {}
+        self._rows, self._mtime, self._frame = rows, mtime, None
+
+    def stage(self, row):
+        with self._lock:
+            self._pending[row["symbol"]] = row
+
+    def upsert(self, rows, save=True):
+        with self._lock:
+            for row in rows: self._pending[row["symbol"]] = row
+            self._merge(force_save=save)
+
+    def flush(self):
+        with self._lock:
+            self._merge(force_save=True)
+
+    def _merge(self, force_save=False):
+        self._reload()
+        if self._pending:
+            self._rows = {**self._rows, **self._pending}
+            self._pending = {}
+            self._frame = None
+            if force_save or time.time() - self._saved_at > SAVE_INTERVAL: self._save()
+        if self._frame is None and self._rows:
+            self._frame = _columnar(list(self._rows.values()))
+
+    def _save(self):
+        os.makedirs(os.path.dirname(self.path), exist_ok=True)
+        tmp = self.path + ".tmp"
+        pd.to_pickle(self._rows, tmp)
+        os.replace(tmp, self.path)
+        self._mtime = os.path.getmtime(self.path)
+        self._saved_at = time.time()
+
+    def frame(self):
+        with self._lock:
+            self._merge()
+            return self._frame
+
+    def query(self, expr, sort_by="Score", ascending=False, limit=None):
+        """
+        expr 為 DataFrame.query 語法 (and / or / not、比較運算)，可直接用中文別名與規則名稱。
+        回傳 (結果 DataFrame (最多 limit 筆), 符合總筆數, 耗時毫秒)；條件有誤時拋出 ValueError。
+        """
+        df = self.frame()
+        if df is None: return pd.DataFrame(), 0, 0.0
+        t0 = time.perf_counter()
+        try:
+            hits = df.query(expr) if expr.strip() else df
+        except Exception as e:
+            raise ValueError(f"篩選條件有誤：{e}")
+        total = len(hits)
+        if sort_by in hits: hits = hits.sort_values(sort_by, ascending=ascending, kind="stable")
+        if limit: hits = hits.iloc[:limit]
+        return hits, total, (time.perf_counter() - t0) * 1000
+
+    def columns(self):
+        df = self.frame()
+        return [] if df is None else [c for c in df.columns if c not in ("rules",)]
+
+
+def load_screens():
+    if os.path.exists(SCREENS_FILE):
+        with open(SCREENS_FILE, "r", encoding="utf-8") as f:
+            return json.load(f)
+    return dict(DEFAULT_SCREENS)
+
+def save_screens(screens):
+    with open(SCREENS_FILE, "w", encoding="utf-8") as f:
+        json.dump(screens, f, ensure_ascii=False, indent=2)
+
+
+def market_symbols():
+    """本地全市場籌碼資料裡的所有代號 (見 chip_store)。"""
+    path = chip_store._symbol_dir()
+    if not os.path.exists(path): return []
+    return sorted(f[:-4] for f in os.listdir(path) if f.endswith(".pkl"))
+
+def build(symbols, api_key, batch=BUILD_BATCH):
+    """全市場重建快照：分批抓日K 與籌碼 (走 SWR 磁碟快取)，算完指標後一次寫入。"""
+    t0 = time.time()
+    rows, errors = [], []
+    for i in range(0, len(symbols), batch):
+        chunk = symbols[i:i + batch]
+        data_layer.warm(chunk, api_key, kinds=("candles", "chips"))
+        for symbol in chunk:
+            try:
+                hist = data_layer.get_candles(symbol, api_key)
+                if hist is None or len(hist) < 3:
+                    errors.append(symbol)
+                    continue
+                chips_entry = data_layer.store.peek(("chips", symbol))
+                df_final = stock_logic.calculate_indicators(hist, symbol, chips_entry.value if chips_entry else None)
+                rows.append(snapshot_row(symbol, df_final, stock_logic.analyze_strategy(df_final)))
+            except Exception as e:
+                print(f"❌ 選股快照失敗 {symbol}: {e}")
+                errors.append(symbol)
+        print(f"⏳ {min(i + batch, len(symbols))}/{len(symbols)}")
+    snapshot.upsert(rows)
+    print(f"✅ 選股快照完成：{len(rows)} 檔，失敗 {len(errors)} 檔，{time.time() - t0:.1f}s")
+    return rows, errors
+
+
+snapshot = ScreenerSnapshot()
+
+
+if __name__ == "__main__":
+    parser = argparse.ArgumentParser(description="全市場選股快照 / 篩選")
+    parser.add_argument("--build", action="store_true", help="重建快照 (預設為本地籌碼資料中的全市場代號)")
+    parser.add_argument("--symbols", help="只重建這些代號 (逗號分隔)")
+    parser.add_argument("--query", help="篩選條件，例如 \"K < 20 and 投信連三買 and 位階 < 20\"")
+    parser.add_argument("--limit", type=int, default=50)
+    args = parser.parse_args()
+
+    if args.build:
+        api_key = os.environ.get("FUGLE_API_KEY")
+        if not api_key:
+            print("❌ 錯誤：找不到 FUGLE_API_KEY。")
+            raise SystemExit(1)
+        symbols = args.symbols.split(",") if args.symbols else market_symbols()
+        build(symbols, api_key)
+    if args.query:
+        hits, total, ms = snapshot.query(args.query, limit=args.limit)
+        print(hits[["name", "Close", "Pct", "Score", "decision"]].to_string() if len(hits) else "(無符合)")
+        print(f"⏱️ 符合 {total} 檔，{ms:.1f} ms")
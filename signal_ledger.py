@@ -0,0 +1,306 @@
+import os
+import json
+import time
+import datetime
+import threading
+import numpy as np
+import pandas as pd
+import stock_logic
+import trading_calendar
+
+try:
+    import fcntl
+except ImportError:     # Windows 沒有 flock，只剩行程內的鎖
+    fcntl = None
+
+# --- 🔥 訊號歷史帳本 (Append-only 欄式儲存) ---
+# 每檔股票每個交易日一列：分數、決策、觸發規則 (bitmask)、停損、開收盤價。
+# 寫入只會新增 segment 檔 (同一天重複寫入以最後一筆為準)；
+# 讀取時依 (代號, 日期) 排序建索引，勝率 / 命中清單 / 規則最後觸發日都是索引查詢。
+LEDGER_DIR = os.path.join(".cache", "signal_ledger")
+RULES_FILE = "rules.json"
+RULES_LOCK = "rules.lock"
+VERSION_FILE = "version.json"
+BACKFILL_DAYS = 250
+RELOAD_SEC = 5   # 檢查其他行程新寫入 segment 的間隔
+COMPACT_SEGMENTS = 64   # segment 檔超過此數時自動合併 (每次 record_frame 會寫一個)
+
+DECISIONS = ["強力買進", "偏多操作", "觀望整理", "建議賣出"]
+COLUMNS = {
+    "symbol": "U8", "date": "datetime64[D]", "seq": np.int64,
+    "score": np.int16, "decision": np.int8, "rules": np.uint64,
+    "stop_loss": np.float32, "open": np.float32, "close": np.float32,
+}
+
+
+class SignalLedger:
+    def __init__(self, path=LEDGER_DIR):
+        self.path = path
+        self._lock = threading.RLock()
+        self._segments = set()
+        self._raw = {k: np.empty(0, dtype=t) for k, t in COLUMNS.items()}
+        self._cols = None         # 去重排序後的欄位
+        self._slices = {}         # symbol -> (start, end)
+        self._by_date = None      # 依日期排序的列索引
+        self._check_version()
+        self._rules = self._load_rules()
+        self._checked_at = 0.0
+
+    # --- 儲存 ---
+    def _check_version(self):
+        """評分定義 (stock_logic.SCORING_VERSION) 改變時清空帳本，之後 record_frame 會依新定義重新回補。"""
+        path = os.path.join(self.path, VERSION_FILE)
+        version = None
+        if os.path.exists(path):
+            with open(path, "r", encoding="utf-8") as f:
+                version = json.load(f).get("scoring_version")
+        if version == stock_logic.SCORING_VERSION: return
+        if os.path.isdir(self.path):
+            for name in os.listdir(self.path):
+                if name.startswith("seg_") or name == RULES_FILE: os.remove(os.path.join(self.path, name))
+            print(f"♻️ 評分定義已更新 (v{version} → v{stock_logic.SCORING_VERSION})，訊號帳本重建")
+        os.makedirs(self.path, exist_ok=True)
+        with open(path + ".tmp", "w", encoding="utf-8") as f:
+            json.dump({"scoring_version": stock_logic.SCORING_VERSION}, f)
+        os.replace(path + ".tmp", path)
+
+    def _load_rules(self):
+        path = os.path.join(self.path, RULES_FILE)
+        if os.path.exists(path):
+            with open(path, "r", encoding="utf-8") as f:
+                return json.load(f)
+        return []
+
+    def _rule_mask(self, names):
+        mask = 0
+        for name in names: mask |= int(self._rule_bit(name))
+        return mask
+
+    def _rule_bit(self, name):
+        if name not in self._rules:
+            os.makedirs(self.path, exist_ok=True)
+            # 跨行程互斥：持檔案鎖重讀 rules.json 再追加，避免兩個行程把不同規則分到同一個 bit
+            with open(os.path.join(self.path, RULES_LOCK), "a") as lock:
+                if fcntl: fcntl.flock(lock, fcntl.LOCK_EX)
+                self._rules = self._load_rules()
+                if name not in self._rules:
+                    if len(self._rules) >= 64: raise ValueError("規則數超過 64 個，bitmask 不足")
+                    self._rules.append(name)
+                    path = os.path.join(self.path, RULES_FILE)
+                    with open(path + ".tmp", "w", encoding="utf-8") as f:
+                        json.dump(self._rules, f, ensure_ascii=False)
+                    os.replace(path + ".tmp", path)
+        return np.uint64(1) << np.uint64(self._rules.index(name))
+
+    def _reload(self, force=False):
+        if not force and time.time() - self._checked_at < RELOAD_SEC: return
+        self._checked_at = time.time()
+        if not os.path.isdir(self.path): return
+        new = sorted(f for f in os.listdir(self.path) if f.startswith("seg_") and f.endswith(".npz") and f not in self._segments)
+        if not new: return
+        self._rules = self._load_rules()
+        parts = {k: [v] for k, v in self._raw.items()}
+        for name in new:
+            try:
+                with np.load(os.path.join(self.path, name)) as seg:
+                    for k in COLUMNS: parts[k].append(seg[k])
+            except FileNotFoundError:
+                continue    # 其他行程剛合併掉，內容已在合併後的 segment 裡
+            self._segments.add(name)
+        self._raw = {k: np.concatenate(v) for k, v in parts.items()}
+        self._cols = None
+
+    def append(self, rows):
+        """rows: [{symbol, date, score, decision, rules(list), stop_loss, open, close}]，寫成一個新 segment。"""
+        if not rows: return 0
+        with self._lock:
+            seq0 = time.time_ns()
+            seg = {
+                "symbol": np.array([r["symbol"] for r in rows], dtype="U8"),
+                "date": np.array([pd.Timestamp(r["date"]).date() for r in rows], dtype="datetime64[D]"),
+                "seq": seq0 + np.arange(len(rows), dtype=np.int64),
+                "score": np.array([r["score"] for r in rows], dtype=np.int16),
+                "decision": np.array([DECISIONS.index(r["decision"]) for r in rows], dtype=np.int8),
+                "rules": np.array([self._rule_mask(r["rules"]) for r in rows], dtype=np.uint64),
+                "stop_loss": np.array([np.nan if r["stop_loss"] is None else r["stop_loss"] for r in rows], dtype=np.float32),
+                "open": np.array([r["open"] for r in rows], dtype=np.float32),
+                "close": np.array([r["close"] for r in rows], dtype=np.float32),
+            }
+            os.makedirs(self.path, exist_ok=True)
+            name = f"seg_{seq0}_{os.getpid()}.npz"
+            tmp = os.path.join(self.path, name + ".tmp")
+            with open(tmp, "wb") as f:
+                np.savez(f, **seg)
+            os.replace(tmp, os.path.join(self.path, name))
+
+            self._reload(force=True)
+        return len(rows)
+
+    def compact(self):
+        """把所有 segment 合併成一個 (保留去重後結果)。"""
+        with self._lock:
+            self._reload(force=True)
+            cols = self._index()
+            if not self._segments: return
+            name = f"seg_{time.time_ns()}_{os.getpid()}.npz"
+            with open(os.path.join(self.path, name + ".tmp"), "wb") as f:
+                np.savez(f, **cols)
+            os.replace(os.path.join(self.path, name + ".tmp"), os.path.join(self.path, name))
+            for old in self._segments:
+                try: os.remove(os.path.join(self.path, old))
+                except FileNotFoundError: pass
+            self._segments = {name}
+            self._raw = {k: v.copy() for k, v in cols.items()}
+
+    def maybe_compact(self, max_segments=COMPACT_SEGMENTS):
+        """segment 數超過 max_segments 才合併，回傳是否有合併 (預熱 / 評分更新結束時呼叫)。"""
+        with self._lock:
+            self._reload(force=True)
+            if len(self._segments) <= max_segments: return False
+            self.compact()
+            return True
+
+    # --- 索引 ---
+    def _index(self):
+        self._reload()
+        if self._cols is not None: return self._cols
+        raw = self._raw
+        order = np.lexsort((raw["seq"], raw["date"], raw["symbol"]))
+        sym, date = raw["symbol"][order], raw["date"][order]
+        # 同一 (代號, 日期) 只保留最後寫入的一筆
+        keep = np.ones(len(order), dtype=bool)
+        keep[:-1] = (sym[:-1] != sym[1:]) | (date[:-1] != date[1:])
+        order = order[keep]
+        cols = {k: v[order] for k, v in raw.items()}
+
+        uniq, starts = np.unique(cols["symbol"], return_index=True)
+        ends = np.append(starts[1:], len(cols["symbol"]))
+        self._slices = {s: (int(a), int(b)) for s, a, b in zip(uniq, starts, ends)}
+        self._by_date = np.argsort(cols["date"], kind="stable")
+        self._cols = cols
+        return cols
+
+    def _symbol_slice(self, symbol, start=None, end=None):
+        cols = self._index()
+        a, b = self._slices.get(symbol, (0, 0))
+        dates = cols["date"][a:b]
+        if start is not None: a += int(np.searchsorted(dates, np.datetime64(pd.Timestamp(start).date(), 'D'), 'left'))
+        if end is not None: b = a + int(np.searchsorted(cols["date"][a:b], np.datetime64(pd.Timestamp(end).date(), 'D'), 'right'))
+        return cols, a, b
+
+    # --- 查詢 ---
+    def dates(self, symbol):
+        with self._lock:
+            cols, a, b = self._symbol_slice(symbol)
+            return cols["date"][a:b]
+
+    def history(self, symbol, start=None, end=None):
+        with self._lock:
+            cols, a, b = self._symbol_slice(symbol, start, end)
+            rules = cols["rules"][a:b]
+            names = list(self._rules)
+        return pd.DataFrame({
+            "score": cols["score"][a:b],
+            "decision": np.array(DECISIONS)[cols["decision"][a:b]],
+            "rules": [[n for i, n in enumerate(names) if int(m) >> i & 1] for m in rules],
+            "stop_loss": cols["stop_loss"][a:b],
+            "close": cols["close"][a:b],
+        }, index=pd.DatetimeIndex(cols["date"][a:b], name="date"))
+
+    def win_rate(self, symbol, threshold, lookback=180, horizon=5):
+        """
+        與 run_backtest 相同定義：訊號隔日開盤買進，持有 horizon 日後以收盤計算報酬。
+        回傳 {"win_rate", "trades", "returns"}；沒有完成的交易時 win_rate 為 None。
+        """
+        with self._lock:
+            cols, a, b = self._symbol_slice(symbol)
+            start = max(a, b - lookback)
+            score = cols["score"][start:b]
+            pos = start + np.flatnonzero(score >= threshold)
+            pos = pos[pos + 1 + horizon < b]
+            buy = cols["open"][pos + 1].astype(float)
+            sell = cols["close"][pos + 1 + horizon].astype(float)
+        returns = (sell - buy) / buy * 100
+        win_rate = float((returns > 0).mean() * 100) if len(returns) else None
+        return {"win_rate": win_rate, "trades": len(returns), "returns": returns}
+
+    def hits(self, date, threshold):
+        """某一天分數 >= threshold 的股票 (依分數排序)。"""
+        with self._lock:
+            cols = self._index()
+            d = np.datetime64(pd.Timestamp(date).date(), 'D')
+            sorted_dates = cols["date"][self._by_date]
+            lo, hi = np.searchsorted(sorted_dates, d, 'left'), np.searchsorted(sorted_dates, d, 'right')
+            rows = self._by_date[lo:hi]
+            rows = rows[cols["score"][rows] >= threshold]
+            rows = rows[np.argsort(-cols["score"][rows], kind="stable")]
+            return pd.DataFrame({
+                "symbol": cols["symbol"][rows], "score": cols["score"][rows],
+                "decision": np.array(DECISIONS)[cols["decision"][rows]], "stop_loss": cols["stop_loss"][rows],
+            })
+
+    def last_fired(self, symbol, rule=None):
+        """規則最後一次觸發的日期；rule=None 時回傳所有規則的 {規則: 日期}。"""
+        with self._lock:
+            cols, a, b = self._symbol_slice(symbol)
+            masks = cols["rules"][a:b]
+            dates = cols["date"][a:b]
+            names = [rule] if rule else list(self._rules)
+            result = {}
+            for name in names:
+                if name not in self._rules: continue
+                bit = np.uint64(1) << np.uint64(self._rules.index(name))
+                hit = np.flatnonzero(masks & bit)
+                if len(hit): result[name] = pd.Timestamp(dates[hit[-1]])
+        if rule: return result.get(rule)
+        return result
+
+    # --- 寫入 (回補) ---
+    @staticmethod
+    def _is_settled(bar_date, fetched=None):
+        if not trading_calendar.is_bar_complete(bar_date, kind="chips"): return False
+        return all(
+            trading_calendar.is_bar_complete(bar_date, datetime.datetime.fromtimestamp(t, trading_calendar.TZ), kind)
+            for kind, t in (fetched or {}).items()
+        )
+
+    def record_frame(self, symbol, df_final, backfill_days=BACKFILL_DAYS, include_today=False, fetched=None):
+        """
+        把 df_final (已算好指標) 中帳本還沒有的交易日補進來。第一次會回放
+        backfill_days 天的 analyze_strategy，之後每天只多算一列。
+        評分含籌碼面，當天的 K 棒要等籌碼定案 (21:30) 後才寫入，避免存到暫時結果；
+        fetched 為 {資料類別: 抓取時間 (epoch 秒)}，定案前抓到的資料算出的那天同樣不寫入。
+        """
+        with self._lock:
+            existing = set(self.dates(symbol).tolist())
+            n = len(df_final)
+            if not include_today:
+                while n > 0 and not self._is_settled(df_final.index[n - 1], fetched): n -= 1
+            rows = []
+            for i in range(max(2, n - backfill_days), n):
+                date = df_final.index[i].date()
+                if date in existing: continue
+                res = stock_logic.analyze_strategy(df_final.iloc[:i+1])
+                rows.append({
+                    "symbol": symbol, "date": date, "score": res["score"], "decision": res["decision"],
+                    "rules": [name for name, _ in res["score_details"]], "stop_loss": res["stop_loss"],
+                    "open": df_final['Open'].iloc[i], "close": df_final['Close'].iloc[i],
+                })
+            return self.append(rows)
+
+
+ledger = SignalLedger()
+
+
+if __name__ == "__main__":
+    import argparse
+    parser = argparse.ArgumentParser(description="訊號歷史帳本工具")
+    parser.add_argument("--compact", action="store_true", help="合併所有 segment")
+    parser.add_argument("--hits", help="列出某日高分股 YYYY-MM-DD")
+    parser.add_argument("--threshold", type=int, default=5)
+    args = parser.parse_args()
+    if args.compact:
+        ledger.compact()
+        print(f"✅ 已合併，共 {len(ledger._index()['symbol'])} 列")
+    if args.hits:
+        print(ledger.hits(args.hits, args.threshold).to_string(index=False))
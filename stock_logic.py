@@ -6,31 +6,77 @@ import requests
 import urllib3
 import functools
 import datetime
+import statistics
+import pytz
+import chip_store
+import replay_server
+import revenue_cache
+import trading_calendar
+import cache_manager
 
 # --- 🔥 核彈級防火牆破解 ---
 urllib3.disable_warnings(urllib3.exceptions.InsecureRequestWarning)
 original_request = requests.Session.request
 def patched_request(self, method, url, *args, **kwargs):
     kwargs['verify'] = False
-    return original_request(self, method, url, *args, **kwargs)
+    # 離線錄製 / 重播 (API_RECORD_DIR / API_REPLAY_URL 未設定時不影響)
+    url = replay_server.redirect_url(url)
+    response = original_request(self, method, url, *args, **kwargs)
+    replay_server.maybe_record(method, response.url, response)
+    return response
 requests.Session.request = patched_request
 
 # --- 🔥 真實籌碼與基本面資料抓取 (v10.1) ---
-def get_real_chip_data(df, symbol):
-    try:
-        dl = DataLoader()
-        start_date = df.index[0].strftime('%Y-%m-%d')
-        
-        # 1. 三大法人 & 融資融券
+def fetch_chip_data(symbol, start):
+    # 只負責抓取原始資料 (可在背景執行緒呼叫)，失敗時拋出例外
+    dl = DataLoader()
+    start = pd.Timestamp(start)
+    start_date = start.strftime('%Y-%m-%d')
+
+    # 1. 三大法人 & 融資融券 (本地全市場資料涵蓋時直接讀取，不打 API)
+    stored = chip_store.load_symbol(symbol, start) if chip_store.covers(start) else None
+    if stored is not None:
+        chip_data = margin_data = None
+        # 全市場資料還沒匯入到最近的籌碼定案日：只補抓這一檔缺的最後幾天，避免新的交易日被當成 0 買賣超
+        missing = chip_store.missing_days()
+        if missing:
+            tail_start = missing[0].strftime('%Y-%m-%d')
+            tail = chip_store.to_store_frame(
+                dl.taiwan_stock_institutional_investors(stock_id=symbol, start_date=tail_start),
+                dl.taiwan_stock_margin_purchase_short_sale(stock_id=symbol, start_date=tail_start))
+            if tail is not None:
+                tail = tail.droplevel('stock_id')
+                stored = pd.concat([stored[~stored.index.isin(tail.index)], tail]).sort_index()
+    else:
         chip_data = dl.taiwan_stock_institutional_investors(stock_id=symbol, start_date=start_date)
         margin_data = dl.taiwan_stock_margin_purchase_short_sale(stock_id=symbol, start_date=start_date)
-        
-        # 2. 抓取月營收 (範圍拉長以確保能計算 YoY)
-        rev_start_date = (df.index[0] - pd.Timedelta(days=400)).strftime('%Y-%m-%d')
-        revenue_data = dl.taiwan_stock_month_revenue(stock_id=symbol, start_date=rev_start_date)
+
+    # 2. 月營收 (每月公布一次，走快取；YoY 已預先算好)
+    revenue_data = revenue_cache.get_revenue(symbol, start, dl)
+
+    return {"institutional": chip_data, "margin": margin_data, "revenue": revenue_data, "stored": stored}
+
+def get_real_chip_data(df, symbol, chips=None):
+    try:
+        if chips is None: chips = fetch_chip_data(symbol, df.index[0])
+        # 複製一份再處理，避免改到快取中的原始資料
+        chip_data, margin_data, revenue_data = (
+            d.copy() if d is not None else None
+            for d in (chips["institutional"], chips["margin"], chips["revenue"])
+        )
+
+        stored = chips.get("stored")
 
         # 處理法人
-        if chip_data is not None and not chip_data.empty:
+        if stored is not None and not stored.empty:
+            trust_net = stored['Trust_Net']
+            foreign_net = stored['Foreign_Net']
+
+            df['Trust_Net'] = trust_net.reindex(df.index).fillna(0.0)
+            df['Foreign_Net'] = foreign_net.reindex(df.index).fillna(0.0)
+            df['Trust_Cum'] = df['Trust_Net'].cumsum()
+            df['Foreign_Cum'] = df['Foreign_Net'].cumsum()
+        elif chip_data is not None and not chip_data.empty:
             chip_data['date'] = pd.to_datetime(chip_data['date'])
             chip_data['net'] = (chip_data['buy'] - chip_data['sell']) / 1000 
             pivot_df = chip_data.pivot(index='date', columns='name', values='net').fillna(0)
@@ -49,7 +95,10 @@ def get_real_chip_data(df, symbol):
             df['Foreign_Cum'] = 0.0
 
         # 處理融資 & 限額
-        if margin_data is not None and not margin_data.empty:
+        if stored is not None and not stored.empty:
+            df['Margin_Balance'] = stored['Margin_Balance'].reindex(df.index).ffill()
+            df['Margin_Limit'] = stored['Margin_Limit'].reindex(df.index).ffill()
+        elif margin_data is not None and not margin_data.empty:
             margin_data['date'] = pd.to_datetime(margin_data['date'])
             margin_data['Margin_Balance'] = margin_data['MarginPurchaseTodayBalance'] / 1000
             
@@ -92,10 +141,60 @@ def get_real_chip_data(df, symbol):
         df['Revenue_YoY'] = np.nan
         return df
 
+# 0. 盤中即時價併入日K
+# 每檔快取一份「歷史日K + 今日空白 K 棒」的範本 (同一份歷史只 concat 一次)；
+# 範本本身不改寫，每次報價複製一份再填入今日開高低收量，回傳的 DataFrame 各呼叫端獨立持有。
+BAR_COLUMNS = ["Open", "High", "Low", "Close", "Volume"]
+live_bars = cache_manager.manager.cache("live_bars")
+
+def merge_realtime_data(df, realtime_data):
+    if df is None or realtime_data is None: return df
+    
+    last_date = df.index[-1]
+    
+    # 最近一個已開盤的交易日；盤前、週末與休市日不產生新的 K 棒
+    session_day = trading_calendar.session_date()
+    today_ts = pd.Timestamp(session_day) 
+    
+    current_price = realtime_data['price']
+    
+    if last_date.date() >= session_day and session_day != trading_calendar.now().date():
+        return df
+
+    symbol = realtime_data.get("symbol")
+    cached = live_bars.get(symbol) if symbol else None
+    if cached is not None and cached["source"] is df and cached["date"] == session_day:
+        df_merged, base = cached["frame"].copy(), cached["base"]
+    else:
+        if last_date.date() < session_day:
+            new_row = pd.DataFrame({c: [np.nan] for c in BAR_COLUMNS}, index=[today_ts])
+            df_merged = pd.concat([df, new_row])
+            base = None
+        else:
+            # 日K API 已經有今天 (尚未定案) 的 K 棒，以它為底
+            df_merged = df
+            base = df_merged.loc[df_merged.index[-1], BAR_COLUMNS].astype(float).to_dict()
+        if symbol: live_bars.put(symbol, {"source": df, "date": session_day, "frame": df_merged, "base": base})
+        df_merged = df_merged.copy()
+
+    # 今日開高低量：報價累積的 (market_data.intraday_bars) 與日K 的取較完整者
+    bar = realtime_data.get("bar") or {}
+    if bar.get("date") != session_day.isoformat(): bar = {}
+    base = base or {}
+    opens = [v for v in (base.get("Open"), bar.get("open")) if v is not None and not pd.isna(v)]
+    highs = [v for v in (base.get("High"), bar.get("high"), current_price) if v is not None and not pd.isna(v)]
+    lows = [v for v in (base.get("Low"), bar.get("low"), current_price) if v is not None and not pd.isna(v)]
+    volumes = [v for v in (base.get("Volume"), bar.get("volume")) if v is not None and not pd.isna(v)]
+
+    values = [opens[0] if opens else current_price, max(highs), min(lows), current_price, max(volumes, default=0.0)]
+    df_merged.iloc[-1, df_merged.columns.get_indexer(BAR_COLUMNS)] = values
+            
+    return df_merged
+
 # 1. 計算技術指標
-def calculate_indicators(df, symbol=None):
+def calculate_indicators(df, symbol=None, chips=None):
     df = df.copy()
-    if symbol: df = get_real_chip_data(df, symbol)
+    if symbol: df = get_real_chip_data(df, symbol, chips)
     else:
         df['Trust_Net'] = 0.0
         df['Foreign_Net'] = 0.0
@@ -120,8 +219,9 @@ def calculate_indicators(df, symbol=None):
     if macd is not None: df['MACD_Hist'] = macd[macd.columns[1]]
     bbands = ta.bbands(df['Close'], length=20, std=2)
     if bbands is not None:
-        df['BB_Upper'] = bbands[bbands.columns[0]]
-        df['BB_Lower'] = bbands[bbands.columns[2]]
+        # pandas_ta 欄位順序為 BBL, BBM, BBU, ...，依名稱取上下軌
+        df['BB_Upper'] = bbands[[c for c in bbands.columns if c.startswith('BBU')][0]]
+        df['BB_Lower'] = bbands[[c for c in bbands.columns if c.startswith('BBL')][0]]
     if 'MA20' in df.columns:
         df['BIAS_20'] = ((df['Close'] - df['MA20']) / df['MA20']) * 100
     df['Donchian_High'] = df['High'].rolling(window=20).max().shift(1)
@@ -148,7 +248,17 @@ def calculate_indicators(df, symbol=None):
 
     return df
 
+# 評分定義版本：規則或指標改動會讓歷史分數不同時 +1，訊號帳本與評分快取會整份重建
+# v2: 布林上下軌改依欄名取值 (原本依位置取到下軌，布林突破實際比較的是下軌)
+SCORING_VERSION = 2
+
 # 2. 策略邏輯與評分 (v10.1 波段抄底特化版)
+def decision_for(score):
+    if score >= 6: return "強力買進", "#FF0000"
+    elif score >= 2: return "偏多操作", "#FFA500"
+    elif score <= -3: return "建議賣出", "#008000"
+    else: return "觀望整理", "#808080"
+
 def analyze_strategy(df, timeframe_label="日線"):
     curr = df.iloc[-1]
     prev = df.iloc[-2]
@@ -411,10 +521,7 @@ def analyze_strategy(df, timeframe_label="日線"):
     stop_loss = curr['Close'] - (2 * curr['ATR']) if pd.notna(curr.get('ATR')) else None
     if stop_loss: report_list.append(f"🛡️ **ATR 停損**：{stop_loss:.2f}")
 
-    if score >= 6: decision, color = "強力買進", "#FF0000"
-    elif score >= 2: decision, color = "偏多操作", "#FFA500"
-    elif score <= -3: decision, color = "建議賣出", "#008000"
-    else: decision, color = "觀望整理", "#808080"
+    decision, color = decision_for(score)
 
     return {
         "score": score, "decision": decision, "color": color,
@@ -422,30 +529,223 @@ def analyze_strategy(df, timeframe_label="日線"):
         "stop_loss": stop_loss, "short_signals": short_signals
     }
 
+# 2b. 向量化評分 (只含技術面規則，供分K 長期回測一次算完整段)
+def score_frame(df):
+    """
+    與 analyze_strategy 相同的技術面評分，一次算出每一根 K 棒的分數 (numpy 陣列)。
+    用於沒有籌碼 / 營收資料的分K (calculate_indicators 不帶 symbol)，籌碼規則一律不成立。
+    """
+    def col(name):
+        if name not in df.columns: return np.full(len(df), np.nan)
+        return pd.to_numeric(df[name], errors='coerce').to_numpy(dtype=float)
+    def prev(a):
+        return np.concatenate([[np.nan], a[:-1]])
+
+    o, c, v = col('Open'), col('Close'), col('Volume')
+    ma5, ma20, ma60 = col('MA5'), col('MA20'), col('MA60')
+    k, d, hist, adx, bias = col('K'), col('D'), col('MACD_Hist'), col('ADX'), col('BIAS_20')
+    donchian, bb_upper, vol_ma5 = col('Donchian_High'), col('BB_Upper'), col('Vol_MA5')
+    obv, obv_ma20 = col('OBV'), col('OBV_MA20')
+    pos = np.where(np.isnan(col('Price_Position')), 50.0, col('Price_Position'))
+    p_c, p_o, p_ma5, p_ma20 = prev(c), prev(o), prev(ma5), prev(ma20)
+    p_k, p_d, p_hist, p_donchian, p_adx = prev(k), prev(d), prev(hist), prev(donchian), prev(adx)
+    is_low, is_high = pos < 20, pos > 85
+
+    with np.errstate(invalid='ignore', divide='ignore'):
+        score = np.zeros(len(df))
+        # 趨勢
+        score += np.where(~np.isnan(ma20), np.where(c > ma20, 2, -2), 0)
+        score -= ~np.isnan(ma20) & (ma20 < p_ma20)
+        cross = ~np.isnan(ma5) & ~np.isnan(ma20) & (ma5 > ma20) & (p_ma5 <= p_ma20)
+        score += np.where(cross, np.where(is_low, 4, 3), 0)
+        score -= np.where(c < ma60, np.where(is_low, 1, 3), 0)
+        score -= 3 * (~np.isnan(ma60) & (ma5 < ma20) & (ma20 < ma60))
+        # 型態
+        pct = (c - p_c) / p_c * 100
+        score -= 4 * (~np.isnan(vol_ma5) & (pct < -3) & (v > vol_ma5 * 2))
+        score -= 2 * ((p_c > p_o) & (c < o) & (o >= p_c) & (c <= p_o))
+        # 動能
+        is_bearish = ~np.isnan(ma60) & (ma20 < ma60)
+        kd_up = (k > d) & (p_k <= p_d) & (k < 50)
+        kd_down = ~kd_up & (k < d) & (p_k >= p_d) & (k > 80)
+        score += np.where(kd_up, np.where(is_bearish & ~is_low, 1, 2), 0)
+        score -= 2 * kd_down
+        score += 2 * ((hist > 0) & (p_hist <= 0))
+        # 突破
+        breakout = (c > donchian) & (p_c <= p_donchian)
+        score += np.where(breakout, np.where(is_high, 2, 3), 0)
+        score += 2 * (c >= bb_upper)
+        # 風險
+        score += (obv > obv_ma20)
+        score = np.where(adx < 20, np.maximum(0, score - 2), score)
+        is_strong = adx > 30
+        score += is_strong & (adx > p_adx)
+        score -= 3 * (bias > 18)
+        score -= 2 * ((bias > 12) & (bias <= 18) & ~is_strong)
+        score -= (bias > 8) & (bias <= 12) & ~is_strong
+        score += bias < -12
+    return score.astype(int)
+
 # --- 回測 (v10.2: 提高門檻版) ---
-def run_backtest(df, days_to_test=60, threshold=5):
+def find_signal_days(df, days_to_test=60, threshold=5):
+    # 回測共用的訊號判定 (run_backtest / run_exit_backtest)，回傳訊號日的位置索引與分數
+    idx, scores = [], []
+    if len(df) < days_to_test + 22: return np.array(idx, dtype=int), np.array(scores, dtype=int)
+    for i in range(len(df) - days_to_test, len(df) - 1):
+        res = analyze_strategy(df.iloc[:i+1])
+        if res['score'] >= threshold:
+            idx.append(i)
+            scores.append(res['score'])
+    return np.array(idx, dtype=int), np.array(scores, dtype=int)
+
+def run_backtest(df, days_to_test=60, threshold=5, signals=None):
     """
     threshold=4 : 只統計 AI總分 >= 4 的高品質交易
     這樣能過濾掉只是「稍微站上月線(2分)」的弱勢訊號
+    signals: find_signal_days 的結果；與出場模擬共用同一組訊號時傳入，不必再逐日重放一次
     """
     backtest_logs = []
     if len(df) < days_to_test + 22: return []
-    for i in range(len(df) - days_to_test, len(df) - 1):
-        current_slice = df.iloc[:i+1]
-        res = analyze_strategy(current_slice)
-        
-        # 🔥 關鍵修改：門檻從 2 提高到 threshold (預設 4)
-        if res['score'] >= threshold:
-            if i + 1 >= len(df): continue
-            buy_p = df.iloc[i+1]['Open']
-            buy_d = df.index[i+1]
-            r5 = ((df.iloc[i+6]['Close'] - buy_p)/buy_p*100) if i+6 < len(df) else None
-            r10 = ((df.iloc[i+11]['Close'] - buy_p)/buy_p*100) if i+11 < len(df) else None
-            r20 = ((df.iloc[i+21]['Close'] - buy_p)/buy_p*100) if i+21 < len(df) else None
-            backtest_logs.append({
-                "訊號日期": current_slice.index[-1].strftime('%Y-%m-%d'),
-                "買進日期": buy_d.strftime('%Y-%m-%d'), "買入成本": buy_p,
-                "AI總分": res['score'], "訊號": res['decision'],
-                "後5日漲幅": r5, "後10日漲幅": r10, "後20日漲幅": r20
-            })
-    return backtest_logs
\ No newline at end of file
+    signal_idx, scores = signals if signals is not None else find_signal_days(df, days_to_test, threshold)
+    for i, score in zip(signal_idx, scores):
+        buy_p = df.iloc[i+1]['Open']
+        buy_d = df.index[i+1]
+        r5 = ((df.iloc[i+6]['Close'] - buy_p)/buy_p*100) if i+6 < len(df) else None
+        r10 = ((df.iloc[i+11]['Close'] - buy_p)/buy_p*100) if i+11 < len(df) else None
+        r20 = ((df.iloc[i+21]['Close'] - buy_p)/buy_p*100) if i+21 < len(df) else None
+        backtest_logs.append({
+            "訊號日期": df.index[i].strftime('%Y-%m-%d'),
+            "買進日期": buy_d.strftime('%Y-%m-%d'), "買入成本": buy_p,
+            "AI總分": int(score), "訊號": decision_for(score)[0],
+            "後5日漲幅": r5, "後10日漲幅": r10, "後20日漲幅": r20
+        })
+    return backtest_logs
+
+# --- 回測信賴區間 (勝率用 Wilson 區間；平均報酬用 Bootstrap，一次抽出整個 n_boot × n 的樣本矩陣) ---
+# 勝率不用 bootstrap 百分位：全勝 / 全敗時每個重抽樣本都一樣，區間寬度為 0 反而被當成很有把握。
+BOOTSTRAP_SAMPLES = 2000
+BOOTSTRAP_CI = 0.9
+# 勝率接近 0 / 100% 時 Wilson 區間本來就窄 (8 戰全勝約 75–100%)，筆數下限另外把關
+MIN_CONFIDENT_TRADES = 15
+MAX_CONFIDENT_WIDTH = 40   # 勝率區間寬度超過 40 個百分點視為信心不足 (勝率 50% 時 15 筆約 39)
+
+def wilson_interval(wins, n, ci=BOOTSTRAP_CI):
+    """二項比例的 Wilson score 區間 (%)；n = 0 時回傳 (0, 100)。"""
+    if n == 0: return 0.0, 100.0
+    z = statistics.NormalDist().inv_cdf((1 + ci) / 2)
+    p = wins / n
+    center = (p + z * z / (2 * n)) / (1 + z * z / n)
+    half = z * np.sqrt(p * (1 - p) / n + z * z / (4 * n * n)) / (1 + z * z / n)
+    return float(max(center - half, 0.0) * 100), float(min(center + half, 1.0) * 100)
+
+def bootstrap_stats(returns, n_boot=BOOTSTRAP_SAMPLES, ci=BOOTSTRAP_CI, seed=0):
+    """
+    returns: 每筆交易報酬 (%)。回傳勝率與平均報酬的點估計及 ci 信賴區間；
+    固定 seed，同一組交易每次重繪結果相同。
+    """
+    returns = np.asarray([r for r in returns if r is not None and not pd.isna(r)], dtype=float)
+    n = len(returns)
+    if n == 0:
+        return {"trades": 0, "win_rate": None, "win_lo": None, "win_hi": None,
+                "mean": None, "mean_lo": None, "mean_hi": None, "low_confidence": True}
+
+    wins = int((returns > 0).sum())
+    win_lo, win_hi = wilson_interval(wins, n, ci)
+    rng = np.random.default_rng(seed)
+    means = returns[rng.integers(0, n, size=(n_boot, n))].mean(axis=1)
+    mean_lo, mean_hi = np.percentile(means, [(1 - ci) / 2 * 100, (1 + ci) / 2 * 100])
+    return {
+        "trades": n, "win_rate": wins / n * 100,
+        "win_lo": win_lo, "win_hi": win_hi,
+        "mean": float(returns.mean()), "mean_lo": float(mean_lo), "mean_hi": float(mean_hi),
+        "low_confidence": bool(n < MIN_CONFIDENT_TRADES or win_hi - win_lo > MAX_CONFIDENT_WIDTH),
+    }
+
+# --- 出場模擬 (v10.3: ATR 停損 / 移動停損 / 停利 / 最長持有 + 交易成本) ---
+TW_COMMISSION_RATE = 0.001425  # 券商手續費 (買、賣各收一次)
+TW_TRANSACTION_TAX = 0.003     # 證券交易稅 (賣出時收)
+
+def simulate_exits(df, signal_idx, atr_mult=2.0, trail_mult=None, take_profit=None, max_hold=20,
+                   commission=TW_COMMISSION_RATE, commission_discount=1.0, tax=TW_TRANSACTION_TAX):
+    """
+    訊號日隔日開盤進場，依序檢查出場條件 (同一根 K 棒停損優先於停利，保守估計)：
+    - ATR 停損：訊號日收盤 - atr_mult × ATR (即 analyze_strategy 的 stop_loss)
+    - 移動停損：進場後前一根為止的最高價 - trail_mult × ATR
+    - 停利：進場價 × (1 + take_profit)
+    - 最長持有 max_hold 根 K 棒，到期以收盤價出場
+    所有交易展開成 (交易數 × max_hold) 矩陣，用 argmax 一次找出第一根觸發出場的 K 棒。
+    """
+    columns = ["訊號日期", "買進日期", "買入成本", "出場日期", "出場價", "出場原因", "持有天數", "淨報酬(%)"]
+    o = df['Open'].to_numpy(dtype=float)
+    h = df['High'].to_numpy(dtype=float)
+    l = df['Low'].to_numpy(dtype=float)
+    c = df['Close'].to_numpy(dtype=float)
+    atr = df['ATR'].to_numpy(dtype=float) if 'ATR' in df.columns else np.full(len(df), np.nan)
+    n = len(df)
+
+    sig = np.asarray(signal_idx, dtype=int)
+    sig = sig[(sig + 1 < n) & ~np.isnan(atr[sig])] if len(sig) else sig
+    if len(sig) == 0: return pd.DataFrame(columns=columns)
+
+    ent = sig + 1
+    entry_price = o[ent]
+    pos = ent[:, None] + np.arange(max_hold)[None, :]
+    valid = pos < n
+    pos = np.minimum(pos, n - 1)
+    bar_o, bar_h, bar_l, bar_c = o[pos], h[pos], l[pos], c[pos]
+
+    stop_level = np.repeat((c[sig] - atr_mult * atr[sig])[:, None], max_hold, axis=1)
+    if trail_mult:
+        # 第 j 根的移動停損只看到第 j-1 根為止的最高價，避免偷看當根
+        run_high = np.maximum.accumulate(np.where(valid, bar_h, -np.inf), axis=1)
+        prev_high = np.concatenate([entry_price[:, None], run_high[:, :-1]], axis=1)
+        prev_high = np.maximum(prev_high, entry_price[:, None])
+        stop_level = np.maximum(stop_level, prev_high - trail_mult * atr[sig][:, None])
+    stop_hit = valid & (bar_l <= stop_level)
+
+    if take_profit:
+        tp_price = entry_price * (1 + take_profit)
+        tp_hit = valid & (bar_h >= tp_price[:, None])
+    else:
+        tp_price = np.full(len(sig), np.inf)
+        tp_hit = np.zeros_like(stop_hit)
+
+    rows = np.arange(len(sig))
+    last_bar = valid.sum(axis=1) - 1
+    any_stop = stop_hit.any(axis=1)
+    any_tp = tp_hit.any(axis=1)
+    first_stop = np.where(any_stop, stop_hit.argmax(axis=1), max_hold)
+    first_tp = np.where(any_tp, tp_hit.argmax(axis=1), max_hold)
+    exit_bar = np.minimum(np.minimum(first_stop, first_tp), last_bar)
+
+    is_stop = any_stop & (first_stop <= first_tp) & (first_stop == exit_bar)
+    is_tp = any_tp & ~is_stop & (first_tp == exit_bar)
+    # 跳空穿越時以開盤價成交
+    stop_fill = np.minimum(bar_o[rows, exit_bar], stop_level[rows, exit_bar])
+    tp_fill = np.maximum(bar_o[rows, exit_bar], tp_price)
+    exit_price = np.where(is_stop, stop_fill, np.where(is_tp, tp_fill, bar_c[rows, exit_bar]))
+
+    reason = np.where(is_stop, "停損", np.where(is_tp, "停利", np.where(exit_bar >= max_hold - 1, "到期", "持有中")))
+    if trail_mult:
+        reason = np.where(is_stop & (stop_level[rows, exit_bar] > c[sig] - atr_mult * atr[sig]), "移動停損", reason)
+
+    fee = commission * commission_discount
+    cost = entry_price * (1 + fee)
+    proceeds = exit_price * (1 - fee - tax)
+    net_ret = (proceeds - cost) / cost * 100
+
+    exit_pos = ent + exit_bar
+    return pd.DataFrame({
+        "訊號日期": df.index[sig].strftime('%Y-%m-%d'),
+        "買進日期": df.index[ent].strftime('%Y-%m-%d'),
+        "買入成本": entry_price,
+        "出場日期": df.index[exit_pos].strftime('%Y-%m-%d'),
+        "出場價": exit_price,
+        "出場原因": reason,
+        "持有天數": exit_bar + 1,
+        "淨報酬(%)": net_ret,
+    }, columns=columns)
+
+def run_exit_backtest(df, days_to_test=60, threshold=5, signals=None, **exit_rules):
+    signal_idx, _ = signals if signals is not None else find_signal_days(df, days_to_test, threshold)
+    return simulate_exits(df, signal_idx, **exit_rules)
@@ -0,0 +1,58 @@
+import datetime
+import numpy as np
+import pandas as pd
+import pytest
+import signal_ledger
+import stock_logic
+import trading_calendar
+
+TODAY = datetime.date(2026, 10, 19)   # 週一，交易日
+
+
+def _frame(days=300, seed=0):
+    dates = pd.bdate_range(end=TODAY, periods=days)
+    rng = np.random.default_rng(seed)
+    close = 100 * np.exp(np.cumsum(rng.normal(0, 0.01, days)))
+    df = pd.DataFrame({
+        "Open": close * (1 + rng.normal(0, 0.003, days)),
+        "High": close * 1.01, "Low": close * 0.99, "Close": close,
+        "Volume": rng.integers(1000, 5000, days).astype(float),
+    }, index=dates)
+    return stock_logic.calculate_indicators(df)
+
+
+def _pin_clock(monkeypatch, hour, minute=0):
+    at = trading_calendar._at(TODAY, datetime.time(hour, minute))
+    monkeypatch.setattr(trading_calendar, "now", lambda: at)
+    return at
+
+
+@pytest.fixture
+def ledger(tmp_path):
+    return signal_ledger.SignalLedger(str(tmp_path / "ledger"))
+
+
+def test_today_waits_for_chips_settle(ledger, monkeypatch):
+    df = _frame()
+    _pin_clock(monkeypatch, 14, 0)
+    ledger.record_frame("2330", df, backfill_days=5)
+    dates = ledger.dates("2330").tolist()
+    assert TODAY not in dates
+    assert dates[-1] == trading_calendar.previous_trading_day(TODAY)
+
+    _pin_clock(monkeypatch, 22, 0)
+    ledger.record_frame("2330", df, backfill_days=5)
+    assert ledger.dates("2330").tolist()[-1] == TODAY
+
+
+def test_data_fetched_before_settle_is_not_final(ledger, monkeypatch):
+    df = _frame()
+    at = _pin_clock(monkeypatch, 22, 0)
+    early = trading_calendar._at(TODAY, datetime.time(13, 0)).timestamp()   # 盤中報價
+    ledger.record_frame("2330", df, backfill_days=5,
+                        fetched={"quote": early, "candles": at.timestamp(), "chips": at.timestamp()})
+    assert TODAY not in ledger.dates("2330").tolist()
+
+    ledger.record_frame("2330", df, backfill_days=5,
+                        fetched={"quote": at.timestamp(), "candles": at.timestamp(), "chips": at.timestamp()})
+    assert ledger.dates("2330").tolist()[-1] == TODAY
@@ -0,0 +1,42 @@
+import numpy as np
+import pandas as pd
+import stock_logic
+import trigger_prices
+
+# 門檻表涵蓋的價格型規則 (analyze_strategy 的 score_details 名稱)
+PRICE_RULES = {
+    "站上月線", "跌破月線", "月線下彎", "均線金叉", "低檔金叉", "跌破季線", "空頭排列",
+    "唐奇安突破", "布林突破", "乖離警戒", "乖離過大", "乖離極大", "負乖離", "MACD翻紅",
+}
+
+
+def _falling(days=300, seed=1):
+    dates = pd.bdate_range(end="2026-10-16", periods=days)
+    rng = np.random.default_rng(seed)
+    close = 200 * np.exp(np.cumsum(rng.normal(-0.003, 0.012, days)))
+    return pd.DataFrame({
+        "Open": close * (1 + rng.normal(0, 0.003, days)),
+        "High": close * 1.01, "Low": close * 0.99, "Close": close,
+        "Volume": rng.integers(1000, 5000, days).astype(float),
+    }, index=dates)
+
+
+def _price_score(raw, price):
+    today = pd.DataFrame({"Open": price, "High": price, "Low": price, "Close": price, "Volume": 3000.0},
+                         index=[pd.Timestamp("2026-10-19")])
+    df = stock_logic.calculate_indicators(pd.concat([raw, today]))
+    res = stock_logic.analyze_strategy(df)
+    return sum(int(pts) for name, pts in res["score_details"] if name in PRICE_RULES)
+
+
+def test_points_match_analyze_strategy_on_falling_series():
+    raw = _falling()
+    hist = stock_logic.calculate_indicators(raw)
+    assert hist["MA5"].iloc[-1] < hist["MA20"].iloc[-1] < hist["MA60"].iloc[-1]
+
+    table = trigger_prices.TriggerTable(trigger_prices.solve_triggers(hist))
+    assert "空頭排列" in {r["rule"] for r in table.rows}
+    last = raw["Close"].iloc[-1]
+    for price in last * np.linspace(0.85, 1.25, 81):
+        if np.any(np.abs(table.prices / price - 1) < 1e-6): continue
+        assert table.points(price) == _price_score(raw, price), price
@@ -0,0 +1,117 @@
+import os
+import json
+import datetime
+import pytz
+
+# --- 🔥 台股交易日曆 ---
+# 交易時段 09:00–13:30 (台北時間)，週末與下列休市日不交易。
+# 休市日依證交所公告，每年底更新；臨時休市 (颱風假等) 可寫進 TRADING_HOLIDAYS_FILE。
+TZ = pytz.timezone('Asia/Taipei')
+SESSION_OPEN = datetime.time(9, 0)
+SESSION_CLOSE = datetime.time(13, 30)
+TRADING_HOLIDAYS_FILE = "holidays.json"
+
+# 各類資料收盤後「定案」的時間：之後抓到的資料到下個交易時段前都不會再變
+SETTLE_TIME = {
+    "quote": datetime.time(13, 45),
+    "candles": datetime.time(14, 30),
+    "chips": datetime.time(21, 30),
+}
+
+HOLIDAYS = {
+    # 2025
+    "2025-01-01", "2025-01-23", "2025-01-24", "2025-01-27", "2025-01-28", "2025-01-29",
+    "2025-01-30", "2025-01-31", "2025-02-28", "2025-04-03", "2025-04-04", "2025-05-01",
+    "2025-05-30", "2025-09-29", "2025-10-06", "2025-10-10", "2025-10-24", "2025-12-25",
+    # 2026
+    "2026-01-01", "2026-02-12", "2026-02-13", "2026-02-16", "2026-02-17", "2026-02-18",
+    "2026-02-19", "2026-02-20", "2026-02-27", "2026-04-03", "2026-04-06", "2026-05-01",
+    "2026-06-19", "2026-09-25", "2026-09-28", "2026-10-09", "2026-10-26", "2026-12-25",
+}
+
+
+def _load_extra_holidays():
+    if os.path.exists(TRADING_HOLIDAYS_FILE):
+        try:
+            with open(TRADING_HOLIDAYS_FILE, "r", encoding="utf-8") as f:
+                return set(json.load(f))
+        except Exception as e:
+            print(f"⚠️ 讀取休市日檔案失敗: {e}")
+    return set()
+
+_holidays = HOLIDAYS | _load_extra_holidays()
+
+
+def now():
+    return datetime.datetime.now(TZ)
+
+def _as_date(d):
+    # datetime / pd.Timestamp 取日期部分 (有時區的先轉成台北時間)
+    if isinstance(d, datetime.datetime): return d.astimezone(TZ).date() if d.tzinfo else d.date()
+    return d
+
+def is_trading_day(d):
+    d = _as_date(d)
+    return d.weekday() < 5 and d.isoformat() not in _holidays
+
+def previous_trading_day(d):
+    d = _as_date(d) - datetime.timedelta(days=1)
+    while not is_trading_day(d): d -= datetime.timedelta(days=1)
+    return d
+
+def next_trading_day(d):
+    d = _as_date(d) + datetime.timedelta(days=1)
+    while not is_trading_day(d): d += datetime.timedelta(days=1)
+    return d
+
+def _at(d, t):
+    return TZ.localize(datetime.datetime.combine(d, t))
+
+def is_session_open(at=None):
+    at = at or now()
+    return is_trading_day(at) and SESSION_OPEN <= at.time() < SESSION_CLOSE
+
+def session_date(at=None):
+    """最近一個已開盤的交易日 (盤中即今天；盤前、休市日為上一個交易日)。"""
+    at = at or now()
+    today = at.date()
+    if is_trading_day(today) and at.time() >= SESSION_OPEN: return today
+    return previous_trading_day(today)
+
+def is_bar_complete(bar_date, at=None, kind="quote"):
+    """日K 是否已收盤定案 (當天要過了 kind 類資料的定案時間)。"""
+    at = at or now()
+    bar_date = _as_date(bar_date)
+    if bar_date < at.date(): return True
+    return bar_date == at.date() and at >= _at(bar_date, SETTLE_TIME[kind])
+
+def last_settled_at(kind="quote", at=None):
+    """最近一次 kind 類資料定案的時間點。"""
+    at = at or now()
+    d = at.date()
+    if not (is_trading_day(d) and at >= _at(d, SETTLE_TIME[kind])):
+        d = previous_trading_day(d)
+    return _at(d, SETTLE_TIME[kind])
+
+def is_stale(fetched_at, kind="quote", at=None):
+    """
+    fetched_at (epoch 秒) 抓到的資料現在是否可能已經變了。
+    盤中的報價 / K 線一律視為會變；其他時間只有在最近一次定案之前抓的才需要更新。
+    """
+    at = at or now()
+    if kind in ("quote", "candles") and is_trading_day(at) and _at(at.date(), SESSION_OPEN) <= at < _at(at.date(), SETTLE_TIME[kind]):
+        return True
+    return fetched_at < last_settled_at(kind, at).timestamp()
+
+def seconds_until_open(at=None):
+    at = at or now()
+    d = at.date()
+    if not (is_trading_day(d) and at.time() < SESSION_OPEN): d = next_trading_day(d)
+    return max((_at(d, SESSION_OPEN) - at).total_seconds(), 0)
+
+def market_state(at=None):
+    at = at or now()
+    if not is_trading_day(at): return "休市"
+    if at.time() < SESSION_OPEN: return "盤前"
+    if at.time() < SESSION_CLOSE: return "盤中"
+    return "盤後"
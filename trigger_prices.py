@@ -0,0 +1,178 @@
+import numpy as np
+import pandas as pd
+import pandas_ta as ta
+import trading_calendar
+
+# --- 🔥 盤中關鍵價位 (收盤後預先解出，盤中只做價格比較) ---
+# 只依賴「今日收盤價 P」的規則，都可以用昨日為止的資料解出翻轉價位：
+#   站上月線      P > S19 / 19
+#   月線下彎      P < 20 天前收盤
+#   均線金叉      P > (S19 - 4*S4) / 3           (昨日 MA5 <= MA20 才成立)
+#   跌破季線      P < S59 / 59
+#   空頭排列      P < min((S19 - 4*S4) / 3, (S59 - 3*S19) / 2)   (MA5 < MA20 且 MA20 < MA60)
+#   唐奇安突破    P > 前 20 日最高價              (昨日未突破才成立)
+#   布林突破      a*P^2 + b*P + c >= 0 的較大根，a=(n-1)(n-5), b=-2S(n-5), c=5S^2-4nQ
+#   乖離 k%       P > S19 * (1+k) / (19-k)
+#   MACD 翻紅     MACD 為 P 的線性函數，P > 使柱狀體為 0 的價格 (昨日柱狀體 <= 0 才成立)
+# 其中 Sk / Q 為最近 k 日 (不含今日) 收盤價的總和 / 平方和。
+#   低檔 / 高檔   P < L + 0.2(H-L) / P > L + 0.85(H-L)，H/L 為近 249 日高低點
+# KD、ADX、OBV、量能與籌碼規則不是單純的價格門檻，仍以完整重算為準；
+# ADX 強勢判斷 (影響乖離扣分) 沿用昨日數值。
+BB_LENGTH = 20
+BIAS_TIERS = [(0.08, "乖離警戒", -1), (0.12, "乖離過大", -2), (0.18, "乖離極大", -3)]
+NEGATIVE_BIAS = -0.12
+
+
+def completed_bars(df):
+    """去掉尚未收盤定案的 K 棒，只留已收盤的日K。"""
+    n = len(df)
+    while n > 0 and not trading_calendar.is_bar_complete(df.index[n - 1]): n -= 1
+    return df.iloc[:n]
+
+def _row(price, rule, above_pts=0, below_pts=0, above=None, below=None, group=None):
+    return {"price": float(price), "rule": rule, "above_pts": above_pts, "below_pts": below_pts,
+            "above": above, "below": below, "group": group or rule}
+
+def solve_triggers(df):
+    """
+    df: calculate_indicators 算好的日K，最後一列為昨日收盤。
+    回傳各規則的翻轉價位 (list of dict)，P 高於 price 時套用 above_pts，否則 below_pts。
+    """
+    close = df['Close'].astype(float).to_numpy()
+    n = len(close)
+    if n < BB_LENGTH: return []
+    prev = df.iloc[-1]
+    is_strong = pd.notna(prev.get('ADX')) and prev['ADX'] > 30
+
+    # 位階門檻 (今日 K 棒也算進 250 日高低點)
+    if n >= 59:
+        hi, lo = df['High'].iloc[-249:].max(), df['Low'].iloc[-249:].min()
+        low_price, high_price = lo + 0.2 * (hi - lo), lo + 0.85 * (hi - lo)
+    else:
+        low_price, high_price = -np.inf, np.inf
+
+    s19, s4 = close[-19:].sum(), close[-4:].sum()
+    q19 = (close[-19:] ** 2).sum()
+    rows = [
+        _row(s19 / 19, "月線", 2, -2, "站上月線", "跌破月線"),
+        _row(close[-20], "月線方向", 0, -1, None, "月線下彎"),
+    ]
+
+    if pd.notna(prev.get('MA5')) and pd.notna(prev.get('MA20')) and prev['MA5'] <= prev['MA20']:
+        cross = (s19 - 4 * s4) / 3
+        if cross < low_price:
+            rows.append(_row(cross, "均線金叉", 4, 0, "低檔金叉"))
+            rows.append(_row(low_price, "均線金叉(離開低檔)", -1, 0, "均線金叉", group="均線金叉"))
+        else:
+            rows.append(_row(cross, "均線金叉", 3, 0, "均線金叉"))
+
+    if n >= 59 and pd.notna(prev.get('MA60')):
+        s59 = close[-59:].sum()
+        ma60 = s59 / 59
+        if low_price < ma60:
+            rows.append(_row(ma60, "季線", 0, -3, None, "跌破季線"))
+            rows.append(_row(low_price, "季線(低檔)", 0, 2, None, "跌破季線", group="季線"))
+        else:
+            # 季線在低檔區內：跌破季線時一定是低位階，只扣 1 分
+            rows.append(_row(ma60, "季線", 0, -1, None, "跌破季線"))
+        rows.append(_row(min((s19 - 4 * s4) / 3, (s59 - 3 * s19) / 2), "空頭排列", 0, -3, None, "空頭排列"))
+
+    donchian = df['High'].iloc[-20:].max()
+    if pd.isna(prev.get('Donchian_High')) or prev['Close'] <= prev['Donchian_High']:
+        if donchian < high_price:
+            rows.append(_row(donchian, "唐奇安", 3, 0, "唐奇安突破"))
+            rows.append(_row(high_price, "唐奇安(高檔)", -1, 0, "唐奇安突破", group="唐奇安"))
+        else:
+            rows.append(_row(donchian, "唐奇安", 2, 0, "唐奇安突破"))
+
+    # 布林上軌 (母體標準差)：((n-1)P - S)^2 >= 4[n(Q+P^2) - (S+P)^2]
+    nb = BB_LENGTH
+    a = (nb - 1) * (nb - 5)
+    b = -2 * s19 * (nb - 5)
+    c = 5 * s19 ** 2 - 4 * nb * q19
+    disc = max(b * b - 4 * a * c, 0.0)
+    rows.append(_row((-b + np.sqrt(disc)) / (2 * a), "布林上軌", 2, 0, "布林突破"))
+
+    last_pts = 0
+    for k, label, pts in BIAS_TIERS:
+        tier_pts = pts if (k == BIAS_TIERS[-1][0] or not is_strong) else 0
+        if tier_pts != last_pts:
+            rows.append(_row(s19 * (1 + k) / (19 - k), f"乖離 {k:.0%}", tier_pts - last_pts, 0, label, group="正乖離"))
+            last_pts = tier_pts
+    k = NEGATIVE_BIAS
+    rows.append(_row(s19 * (1 + k) / (19 - k), f"乖離 {k:.0%}", 0, 1, None, "負乖離"))
+
+    if pd.notna(prev.get('MACD_Hist')) and prev['MACD_Hist'] <= 0:
+        macd = ta.macd(df['Close'], fast=12, slow=26, signal=9)
+        e12, e26 = ta.ema(df['Close'], length=12).iloc[-1], ta.ema(df['Close'], length=26).iloc[-1]
+        if macd is not None and pd.notna(e26):
+            signal_prev = macd[macd.columns[2]].iloc[-1]
+            a12, a26 = 2 / 13, 2 / 27
+            # MACD(P) = (a12 - a26) P + (1-a12) e12 - (1-a26) e26，柱狀體 > 0 ⇔ MACD(P) > 昨日訊號線
+            price = (signal_prev - (1 - a12) * e12 + (1 - a26) * e26) / (a12 - a26)
+            rows.append(_row(price, "MACD", 2, 0, "MACD翻紅"))
+
+    return [r for r in rows if np.isfinite(r["price"]) and r["price"] > 0]
+
+
+class TriggerTable:
+    """依價格排序的門檻表；盤中只需 searchsorted 一次就能得到所有價格型規則的狀態。"""
+
+    def __init__(self, rows):
+        rows = sorted(rows, key=lambda r: r["price"])
+        self.rows = rows
+        self.prices = np.array([r["price"] for r in rows], dtype=float)
+        above = np.array([r["above_pts"] for r in rows], dtype=float)
+        below = np.array([r["below_pts"] for r in rows], dtype=float)
+        # 價格落在第 k 格時：前 k 個門檻取 above，其餘取 below
+        self._cum_above = np.concatenate([[0.0], np.cumsum(above)])
+        self._cum_below = np.concatenate([[0.0], np.cumsum(below)])
+
+    @classmethod
+    def from_frame(cls, df):
+        return cls(solve_triggers(completed_bars(df)))
+
+    def bucket(self, price):
+        return int(np.searchsorted(self.prices, price, 'left'))
+
+    def points(self, price):
+        """價格型規則在此價位的合計分數 (其他規則不變時，兩個價位的分差)。"""
+        k = self.bucket(price)
+        return self._cum_above[k] + self._cum_below[-1] - self._cum_below[k]
+
+    def active(self, price):
+        # 同一組 (乖離分級) 只保留最高的一級
+        k = self.bucket(price)
+        labels = {}
+        for i, r in enumerate(self.rows):
+            label = r["above"] if i < k else r["below"]
+            if label: labels[r["group"]] = label
+        return list(labels.values())
+
+    def to_frame(self, price=None):
+        df = pd.DataFrame(self.rows, columns=["price", "rule", "above", "above_pts", "below", "below_pts"])
+        if price is not None: df["distance"] = (df["price"] / price - 1) * 100
+        return df
+
+
+class TriggerBook:
+    """多檔股票的門檻表；update 只回報這次報價跨過的門檻。"""
+
+    def __init__(self):
+        self.tables = {}
+        self._buckets = {}
+
+    def set_table(self, symbol, table, price=None):
+        self.tables[symbol] = table
+        self._buckets[symbol] = table.bucket(price) if price is not None else None
+
+    def update(self, symbol, price):
+        table = self.tables.get(symbol)
+        if table is None: return []
+        k = table.bucket(price)
+        last = self._buckets.get(symbol)
+        self._buckets[symbol] = k
+        if last is None or last == k: return []
+        if k > last:
+            return [(r["rule"], r["above"] or f"脫離{r['below']}", r["price"]) for r in table.rows[last:k]]
+        return [(r["rule"], r["below"] or f"失去{r['above']}", r["price"]) for r in table.rows[k:last]]
@@ -0,0 +1,162 @@
+import time
+import argparse
+import datetime
+import threading
+import chip_store
+import data_layer
+import market_data
+import minute_store
+import risk_matrix
+import screener
+import signal_ledger
+import trading_calendar
+import watchlist
+
+# --- 🔥 快取預熱 (開盤前 / 收盤定案後，把關注清單整份算好) ---
+# 匯入全市場籌碼 → 抓行情、籌碼 → 算指標與評分 → 補訊號帳本 (半年回測) → 勝率信賴區間 → 風險矩陣 / 選股快照
+# → 收盤後保存當天 1 分K。
+# 單檔計算用 watchlist.analyze_watch_symbol (與戰情總覽、評分 API 共用同一個 indicators 快取)，
+# 第一個使用者開頁時直接命中，不走冷路徑。
+
+# 每個交易日的預熱時間：開盤前、日K 定案後、籌碼定案後
+WARMUP_SCHEDULE = [
+    ("開盤前", datetime.time(8, 30)),
+    ("收盤後", datetime.time(14, 40)),
+    ("籌碼更新", datetime.time(21, 40)),
+]
+
+
+def next_run(at=None, schedule=WARMUP_SCHEDULE):
+    """下一個預熱時間點 (只排在交易日)，回傳 (名稱, datetime)。"""
+    at = at or trading_calendar.now()
+    d = at.date()
+    while True:
+        if trading_calendar.is_trading_day(d):
+            for label, t in schedule:
+                run_at = trading_calendar.TZ.localize(datetime.datetime.combine(d, t))
+                if run_at > at: return label, run_at
+        d += datetime.timedelta(days=1)
+
+
+class WarmupWorker:
+    """背景預熱執行緒；status 供側邊欄顯示進度與耗時。"""
+
+    def __init__(self, api_key, threshold=watchlist.DEFAULT_THRESHOLD):
+        self.api_key = api_key
+        self.threshold = threshold
+        self.status = {
+            "state": "idle", "phase": None, "step": None, "done": 0, "total": 0,
+            "started_at": None, "finished_at": None, "duration": None,
+            "errors": [], "next_label": None, "next_run": None,
+        }
+        self._wake = threading.Event()
+        self._run_lock = threading.Lock()
+        self._thread = None
+
+    def run_once(self, phase="手動"):
+        # 已經在跑就不重複執行
+        if not self._run_lock.acquire(blocking=False): return False
+        try:
+            symbols = watchlist.load_watchlist()
+            t0 = time.time()
+            self.status.update(state="running", phase=phase, step="抓取資料", done=0, total=len(symbols),
+                               started_at=trading_calendar.now(), errors=[])
+
+            # 全市場籌碼補到最近一個定案日 (之後抓籌碼直接讀本地，不必逐檔補抓)
+            if chip_store.missing_days():
+                self.status["step"] = "匯入全市場籌碼"
+                try:
+                    chip_store.ingest_latest()
+                except Exception as e:
+                    print(f"❌ 全市場籌碼匯入失敗: {e}")
+
+            self.status["step"] = "抓取資料"
+            failed = data_layer.warm(symbols, self.api_key)
+            errors = sorted({symbol for _, symbol in failed})
+
+            self.status["step"] = "計算指標與回測"
+            for symbol in symbols:
+                try:
+                    result = watchlist.analyze_watch_symbol(symbol, self.api_key, self.threshold)
+                    if result["signal"] == "資料不足" and symbol not in errors: errors.append(symbol)
+                except Exception as e:
+                    print(f"❌ 預熱失敗 {symbol}: {e}")
+                    if symbol not in errors: errors.append(symbol)
+                self.status["done"] += 1
+
+            self.status["step"] = "風險矩陣"
+            risk_matrix.tracker.update({s: data_layer.get_candles(s, self.api_key) for s in symbols})
+            screener.snapshot.flush()
+            signal_ledger.ledger.maybe_compact()
+
+            # 收盤後把當天的 1 分K 存進本地分K 資料庫 (分K 回測用)；
+            # 已經在存的代號移出關注清單後也繼續存，避免留下缺漏
+            if not trading_calendar.is_session_open():
+                self.status["step"] = "保存分K"
+                for symbol in sorted(set(symbols) | set(minute_store.symbols())):
+                    try:
+                        minute_store.append(symbol, market_data.intraday_cache.get(symbol, self.api_key))
+                    except Exception as e:
+                        print(f"❌ 分K 保存失敗 {symbol}: {e}")
+
+            duration = time.time() - t0
+            self.status.update(state="idle", step=None, finished_at=trading_calendar.now(), duration=duration, errors=errors)
+            print(f"🔥 預熱完成 ({phase})：{len(symbols)} 檔，{duration:.1f}s，失敗 {len(errors)} 檔")
+            return True
+        except Exception as e:
+            self.status.update(state="idle", step=None, finished_at=trading_calendar.now())
+            print(f"❌ 預熱失敗: {e}")
+            return False
+        finally:
+            self._run_lock.release()
+
+    def run_now(self):
+        self._wake.set()
+
+    def _loop(self):
+        # 行程剛啟動時快取是冷的，先跑一次
+        self.run_once("啟動")
+        while True:
+            label, run_at = next_run()
+            self.status.update(next_label=label, next_run=run_at)
+            woke = self._wake.wait(timeout=max((run_at - trading_calendar.now()).total_seconds(), 0))
+            self._wake.clear()
+            self.run_once("手動" if woke else label)
+
+    def start(self):
+        if self._thread is None:
+            self._thread = threading.Thread(target=self._loop, name="warmup", daemon=True)
+            self._thread.start()
+        return self
+
+
+_worker = None
+_worker_lock = threading.Lock()
+
+def start(api_key, threshold=watchlist.DEFAULT_THRESHOLD):
+    """啟動全行程唯一的預熱執行緒 (重複呼叫只回傳同一個)。"""
+    global _worker
+    with _worker_lock:
+        if _worker is None: _worker = WarmupWorker(api_key, threshold).start()
+        return _worker
+
+
+if __name__ == "__main__":
+    parser = argparse.ArgumentParser(description="關注清單快取預熱")
+    parser.add_argument("--daemon", action="store_true", help="常駐，依交易日排程預熱")
+    parser.add_argument("--threshold", type=int, default=watchlist.DEFAULT_THRESHOLD, help="回測買進門檻 (分)")
+    args = parser.parse_args()
+
+    api_key = watchlist.get_secret("FUGLE_API_KEY")
+    if not api_key:
+        print("❌ 錯誤：找不到 FUGLE_API_KEY。")
+        raise SystemExit(1)
+
+    if args.daemon:
+        worker = start(api_key, args.threshold)
+        try:
+            while True: time.sleep(3600)
+        except KeyboardInterrupt: pass
+    else:
+        # 單次執行：行情 / 籌碼 / 營收快取與訊號帳本寫到磁碟，下次啟動直接讀取
+        WarmupWorker(api_key, args.threshold).run_once("單次")
@@ -0,0 +1,142 @@
+import os
+import json
+import pandas as pd
+import cache_manager
+import data_layer
+import screener
+import signal_ledger
+import stock_logic
+
+# --- 🔥 關注清單與單檔戰情計算 (戰情總覽 / 評分 API / 背景預熱共用) ---
+# analyze_watch_symbol 的結果放在同一個 indicators 快取，任何一個入口算過，
+# 其他入口在資料版本不變時直接命中。
+WATCHLIST_FILE = "watchlist.json"
+DEFAULT_WATCHLIST = ["2330", "2408", "2454", "1519"]
+DEFAULT_THRESHOLD = 5
+BACKTEST_DAYS = 180
+
+stock_names = cache_manager.manager.cache("stock_names")
+indicator_cache = cache_manager.manager.cache("indicators")
+
+
+def get_secret(key_name):
+    try:
+        import streamlit as st
+        if key_name in st.secrets: return st.secrets[key_name]
+    except Exception:
+        pass
+    return os.environ.get(key_name)
+
+def load_watchlist(default=None):
+    if os.path.exists(WATCHLIST_FILE):
+        with open(WATCHLIST_FILE, "r", encoding="utf-8") as f:
+            return json.load(f)
+    return list(default or [])
+
+def save_watchlist(watchlist):
+    with open(WATCHLIST_FILE, "w", encoding="utf-8") as f:
+        json.dump(watchlist, f)
+
+
+def analyze_watch_symbol(symbol, api_key, threshold=DEFAULT_THRESHOLD):
+    """
+    單檔戰情結果，以 (代號, 資料版本) 快取在 indicator_cache (各 session 與預熱共用)；
+    資料更新時把已收盤的交易日寫入訊號帳本，勝率直接查帳本。
+    """
+    entries = data_layer.get_symbol_data(symbol, api_key)
+    version = data_layer.data_version(symbol)
+    cached = indicator_cache.get(symbol)
+
+    if cached is None or cached["version"] != version:
+        real_data = entries["quote"].value if entries["quote"] else None
+        hist_data = entries["candles"].value if entries["candles"] else None
+        chips = entries["chips"].value if entries["chips"] else None
+
+        stock_result = {
+            "symbol": symbol,
+            "name": stock_names.get(symbol, symbol, count=False),
+            "price": 0.0,
+            "change": 0.0,
+            "pct": 0.0,
+            "score": 0,
+            "signal": "資料不足",
+            "color": "#888",
+            "stop_loss": None,
+            "atr": None,
+            "raw_real": None,
+            "bar_date": None,
+            "score_details": [],
+            "short_signals": [],
+            "win_rate": 0.0
+        }
+        df_final = None
+
+        if real_data:
+            stock_names.put(symbol, real_data['name'])
+            stock_result["name"] = real_data['name']
+            stock_result["price"] = real_data['price']
+            stock_result["change"] = real_data['change']
+            stock_result["pct"] = real_data['change_percent']
+            stock_result["raw_real"] = real_data
+
+        # 沒有即時報價時 (盤前、報價抓取失敗) 仍以日K 評分，價格取最後收盤
+        if hist_data is not None:
+            try:
+                df_merged = stock_logic.merge_realtime_data(hist_data, real_data)
+                df_final = stock_logic.calculate_indicators(df_merged, symbol, chips)
+                logic_res = stock_logic.analyze_strategy(df_final)
+
+                stock_result["score"] = logic_res["score"]
+                stock_result["signal"] = logic_res["decision"]
+                stock_result["color"] = logic_res["color"]
+                stock_result["stop_loss"] = logic_res["stop_loss"]
+                stock_result["score_details"] = logic_res["score_details"]
+                stock_result["short_signals"] = logic_res["short_signals"]
+                stock_result["bar_date"] = df_final.index[-1].strftime('%Y-%m-%d')
+                if not real_data: stock_result["price"] = float(df_final['Close'].iloc[-1])
+                atr = df_final['ATR'].iloc[-1]
+                stock_result["atr"] = float(atr) if pd.notna(atr) else None
+                screener.snapshot.stage(screener.snapshot_row(symbol, df_final, logic_res, stock_result["name"]))
+            except Exception as e:
+                df_final = None
+                print(f"Error analyzing {symbol}: {e}")
+
+        if df_final is not None:
+            try:
+                fetched = {kind: e.fetched_at for kind, e in entries.items() if e is not None}
+                signal_ledger.ledger.record_frame(symbol, df_final, fetched=fetched)
+            except Exception as e:
+                print(f"❌ 訊號帳本寫入失敗 {symbol}: {e}")
+
+        cached = {"version": version, "result": stock_result, "df_final": df_final}
+        indicator_cache.put(symbol, cached)
+
+    # --- 🔥 回測勝率 (訊號帳本查詢 + 信賴區間) ---
+    bt = stock_logic.bootstrap_stats([])
+    stats = None
+    if cached["df_final"] is not None:
+        try:
+            stats = signal_ledger.ledger.win_rate(symbol, threshold, lookback=BACKTEST_DAYS)
+        except Exception as e:
+            print(f"❌ 訊號帳本查詢失敗 {symbol}: {e}")
+    if stats is not None:
+        # 同一組交易的區間只算一次 (交易沒變就沿用)
+        bt_key = (threshold, tuple(stats["returns"]))
+        if cached.get("bt_key") == bt_key:
+            bt = cached["bt"]
+        else:
+            bt = stock_logic.bootstrap_stats(stats["returns"])
+            # 快取中的 dict 其他 session / 預熱執行緒可能正在讀，換一份新的放回去而不就地改寫
+            if indicator_cache.get(symbol, count=False) is cached:
+                indicator_cache.put(symbol, dict(cached, bt_key=bt_key, bt=bt))
+
+    stock_result = dict(cached["result"])
+    stock_result["win_rate"] = bt["win_rate"] or 0.0
+    stock_result["backtest"] = dict(bt, threshold=threshold, days=BACKTEST_DAYS)
+    stock_result["win_lo"] = bt["win_lo"]
+    stock_result["win_hi"] = bt["win_hi"]
+    stock_result["trades"] = bt["trades"]
+    stock_result["low_confidence"] = bt["low_confidence"]
+    stock_result["version"] = cached["version"]
+    stock_result["freshness"] = data_layer.staleness_badge(entries, data_layer.is_refreshing(symbol))
+    return stock_result